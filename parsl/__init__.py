@@ -33,7 +33,9 @@ from parsl.version import VERSION
 from parsl.app.app import App
 from parsl.executors.threads import ThreadPoolExecutor
 from parsl.executors.ipp import IPyParallelExecutor
+from parsl.executors.zmq_executor import ZMQExecutor
 from parsl.data_provider.files import File
+from parsl.app.capture import CAPTURE
 import parsl.execution_provider
 
 from parsl.dataflow.dflow import DataFlowKernel
@@ -44,7 +46,7 @@ APP_FACTORY_FACTORY = AppFactoryFactory('central')
 __author__ = 'Yadu Nand Babuji'
 __version__ = VERSION
 
-__all__ = ['App', 'DataFlowKernel', 'ThreadPoolExecutor', 'IPyParallelExecutor']
+__all__ = ['App', 'DataFlowKernel', 'ThreadPoolExecutor', 'IPyParallelExecutor', 'ZMQExecutor']
 
 def set_stream_logger(name='parsl', level=logging.DEBUG, format_string=None):
     '''
@@ -29,7 +29,7 @@ class AppBase (object):
 
     """
 
-    def __init__ (self, func, executor, walltime=60, sites='all', exec_type="bash"):
+    def __init__ (self, func, executor, walltime=None, sites='all', exec_type="bash"):
         ''' Constructor for the APP object.
 
         Args:
@@ -37,7 +37,8 @@ class AppBase (object):
              - executor (executor): Executor for the execution resource
 
         Kwargs:
-             - walltime (int) : Walltime in seconds for the app execution
+             - walltime (int) : Walltime in seconds for the app execution. A walltime kwarg
+               in the function's signature or in the call overrides it. Default: None, no limit
              - sites (str|list) : List of site names that this app could execute over. default is 'all'
              - exec_type (string) : App type (bash|python)
 
@@ -51,11 +52,13 @@ class AppBase (object):
         self.exec_type  = exec_type
         self.status     = 'created'
         self.sites      = sites
+        self.walltime   = walltime
 
-        sig = signature(func)
+        # Inspected once per app, the call path only reads these
+        sig = self.sig  = signature(func)
         self.kwargs     = {}
         for s in sig.parameters:
-            if sig.parameters[s].default != Parameter.empty:
+            if sig.parameters[s].default is not Parameter.empty:
                 self.kwargs[s] = sig.parameters[s].default
 
         self.stdout  = sig.parameters['stdout'].default  if 'stdout'  in sig.parameters else None
@@ -79,7 +82,7 @@ def app_wrapper (func):
 
     return wrapper
 
-def App(apptype, executor, walltime=60, sites='all'):
+def App(apptype, executor, walltime=None, sites='all', **kwargs):
     ''' The App decorator function
 
     Args:
@@ -87,10 +90,18 @@ def App(apptype, executor, walltime=60, sites='all'):
         executor (Executor) : Executor object wrapping threads/process pools etc.
 
     Kwargs:
-        walltime (int) : Walltime for app in seconds,
-             default=60
+        walltime (int) : Walltime for app in seconds, past which the app is killed and
+             fails with AppTimeout. A walltime kwarg of the app overrides it,
+             default=None, no limit
         sites (str|List) : List of site names on which the app could execute
              default='all'
+        persistent_shell (Bool) : Bash apps only. Run the commandline in a bash shell
+             kept by the worker rather than starting bash for each call,
+             default=False
+        skip_if_fresh (Bool|str) : Bash apps only. Resolve to 0 without running the app
+             if all its outputs exist and are newer than its inputs. 'checksum' also skips
+             it if its files match the checksums recorded when it last ran,
+             default=False
 
     Returns:
          An AppFactory object, which when called runs the apps through the executor.
@@ -99,6 +110,6 @@ def App(apptype, executor, walltime=60, sites='all'):
     from parsl import APP_FACTORY_FACTORY
 
     def Exec(f):
-        return APP_FACTORY_FACTORY.make(apptype, executor, f, sites=sites, walltime=walltime)
+        return APP_FACTORY_FACTORY.make(apptype, executor, f, sites=sites, walltime=walltime, **kwargs)
 
     return Exec
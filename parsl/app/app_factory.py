@@ -4,7 +4,6 @@ Centralize app object creation.
 
 '''
 import logging
-from inspect import signature
 from parsl.app.bash_app import BashApp
 from parsl.app.python_app import PythonApp
 from parsl.app.errors import InvalidAppTypeError
@@ -15,7 +14,7 @@ class AppFactory(object):
     ''' AppFactory streamlines creation of apps
     '''
 
-    def __init__(self, app_class, executor, func, sites='all', walltime=60):
+    def __init__(self, app_class, executor, func, sites='all', walltime=None, **app_kwargs):
         ''' Construct an AppFactory for a particular app_class
 
         Args:
@@ -24,8 +23,9 @@ class AppFactory(object):
             - func(Function) : The function to execute
 
         Kwargs:
-            - walltime(int) : Walltime in seconds, default=60
+            - walltime(int) : Walltime in seconds, default=None
             - sites (str|list) : List of site names that this app could execute over. default is 'all'
+            - app_kwargs : Options for the app_class, eg. persistent_shell for bash apps
 
         Returns:
             An AppFactory Object
@@ -37,11 +37,13 @@ class AppFactory(object):
         self.status = 'created'
         self.walltime = walltime
         self.sites = sites
-        self.sig = signature(func)
+        self.app_kwargs = app_kwargs
+        # Apps keep no per call state, one object serves every call
+        self.app_obj = app_class(func, executor, sites=sites, walltime=walltime, **app_kwargs)
+        self.sig = self.app_obj.sig
 
     def __call__(self, *args, **kwargs):
-        ''' Create a new object of app_class with the args,
-        execute the app_object and return the futures
+        ''' Execute the app object with the args and return the futures
 
         Args:
              Arbitrary args to the decorated function
@@ -54,12 +56,7 @@ class AppFactory(object):
 
         The call is mostly pass through
         '''
-        # Create and call the new App object
-        app_obj = self.app_class(self.func,
-                                 self.executor,
-                                 sites=self.sites,
-                                 walltime=self.walltime)
-        return app_obj(*args, **kwargs)
+        return self.app_obj(*args, **kwargs)
 
     def __repr__(self):
         return self.__str__()
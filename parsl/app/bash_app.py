@@ -1,4 +1,8 @@
+import os
+import socket
 import logging
+import threading
+import logging.handlers
 from functools import partial
 
 from concurrent.futures import Future
@@ -9,20 +13,85 @@ from parsl.app.app import AppBase
 
 logger = logging.getLogger(__name__)
 
-def remote_side_bash_executor(func, *args, **kwargs):
+# Worker side logging of bash apps goes to this logger, and so to the worker's own
+# log handlers if it has any. Setting PARSL_BASH_LOG on the worker adds a buffered,
+# size rotated log file, see worker_log.
+worker_logger = logging.getLogger(__name__ + ".worker")
+
+BASH_LOG_ENV = "PARSL_BASH_LOG"
+BASH_LOG_LEVEL_ENV = "PARSL_BASH_LOG_LEVEL"
+BASH_LOG_MAX_BYTES = 10*1024*1024
+BASH_LOG_BACKUPS = 3
+# Records held in memory before they are written, errors are written at once
+BASH_LOG_BUFFER = 1024
+
+_worker_log_lock = threading.Lock()
+_worker_log_pid = None
+_worker_log_handler = None
+
+
+def worker_log():
+    ''' Return the logger for the worker side of bash apps. The first call in a
+    worker process reads the environment:
+
+        - PARSL_BASH_LOG : Log file, may contain {pid} and {host}. Default: no file
+        - PARSL_BASH_LOG_LEVEL : Level of the records written to it. Default: DEBUG
+
+    With no log file the logger is left as it is, so a disabled debug call costs a
+    level check.
+    '''
+    global _worker_log_pid, _worker_log_handler
+
+    if _worker_log_pid == os.getpid():
+        return worker_logger
+
+    with _worker_log_lock:
+        if _worker_log_pid != os.getpid():
+            # A handler inherited over fork writes to the parent's file
+            if _worker_log_handler:
+                worker_logger.removeHandler(_worker_log_handler)
+                _worker_log_handler = None
+
+            filename = os.environ.get(BASH_LOG_ENV)
+            if filename:
+                filename = filename.format(pid=os.getpid(), host=socket.gethostname())
+                target = logging.handlers.RotatingFileHandler(filename, maxBytes=BASH_LOG_MAX_BYTES,
+                                                              backupCount=BASH_LOG_BACKUPS)
+                target.setFormatter(logging.Formatter("%(asctime)s %(name)s [%(levelname)s] %(message)s"))
+                _worker_log_handler = logging.handlers.MemoryHandler(BASH_LOG_BUFFER, flushLevel=logging.ERROR,
+                                                                     target=target)
+                worker_logger.addHandler(_worker_log_handler)
+                worker_logger.setLevel(os.environ.get(BASH_LOG_LEVEL_ENV, "DEBUG").upper())
+
+            _worker_log_pid = os.getpid()
+
+    return worker_logger
+
+
+def remote_side_bash_executor(func, *args, parsl_persistent_shell=False, parsl_walltime=None, **kwargs):
     ''' The callable fn for external apps.
     This is the function that executes the bash app type function that returns
     the commandline string. This string is reformatted with the *args, and **kwargs
     from call time.
+
+    With parsl_persistent_shell set, the commandline runs in the worker's persistent
+    bash shell rather than in a new bash process, see parsl.app.shell.
+
+    With stdout or stderr set to CAPTURE, the stream is returned with the exit code
+    rather than written to a file, see parsl.app.capture.
+
+    The commandline is killed with everything it started once it runs past the walltime
+    kwarg, else past parsl_walltime, the walltime the app was made with.
     '''
 
     import os
     import time
     import subprocess
-    import logging
     import parsl.app.errors as pe
+    from parsl.app import rusage
+    from parsl.app.capture import CAPTURE
 
-    logging.basicConfig(filename='/tmp/bashexec.{0}.log'.format(time.time()), level=logging.DEBUG)
+    log = worker_log()
 
     start_t = time.time()
 
@@ -46,67 +115,136 @@ def remote_side_bash_executor(func, *args, **kwargs):
         raise pe.AppBadFormatting("[{}] AppFormatting failed during cmd_line resolution {}".format(func_name,
                                                                                                 e), None)
     except Exception as e:
-        logging.error("[{}] Caught exception during cmd_line resolution : {}".format(func_name,
-                                                                                     e))
+        log.error("[%s] Caught exception during cmd_line resolution : %s", func_name, e)
         raise e
 
     # Updating stdout, stderr if values passed at call time.
     stdout = kwargs.get('stdout', None)
     stderr = kwargs.get('stderr', None)
-    timeout = kwargs.get('walltime', None)
-    logging.debug("Stdout  : %s", stdout)
-    logging.debug("Stderr  : %s", stderr)
+    timeout = kwargs.get('walltime', parsl_walltime)
+    log.debug("[%s] Stdout : %s Stderr : %s", func_name, stdout, stderr)
+
+    capture_out = stdout is CAPTURE
+    capture_err = stderr is CAPTURE
 
     try :
-        std_out = open(stdout, 'w') if stdout else None
-        std_err = open(stderr, 'w') if stderr else None
+        std_out = subprocess.PIPE if capture_out else open(stdout, 'w') if stdout else None
+        std_err = subprocess.PIPE if capture_err else open(stderr, 'w') if stderr else None
     except Exception as e:
         raise pe.BadStdStreamFile([stdout, stderr], e)
 
     start_time = time.time()
 
     returncode = None
+    captured = (None, None)
+    usage = None
     try :
-        proc = subprocess.Popen(executable, stdout=std_out, stderr=std_err, shell=True, executable='/bin/bash')
-        proc.wait(timeout=timeout)
-        returncode = proc.returncode
+        if parsl_persistent_shell:
+            from parsl.app.shell import run_in_shell
+            from parsl.app.capture import capture_file, read_capture_file
+            # The shell opens the files itself, they were opened here to check them
+            for f in (std_out, std_err):
+                if f and f is not subprocess.PIPE:
+                    f.close()
+            shell_out = capture_file('stdout') if capture_out else stdout
+            shell_err = capture_file('stderr') if capture_err else stderr
+            try:
+                returncode = run_in_shell(executable, stdout=shell_out, stderr=shell_err, timeout=timeout)
+                # The shell reaps the command, only the wall time is known
+                usage = dict.fromkeys(rusage.FIELDS)
+            finally:
+                captured = (read_capture_file('stdout', shell_out) if capture_out else None,
+                            read_capture_file('stderr', shell_err) if capture_err else None)
+        else:
+            # In a session of its own, so a timeout kills what the commandline started too
+            proc = subprocess.Popen(executable, stdout=std_out, stderr=std_err, shell=True, executable='/bin/bash',
+                                    start_new_session=True)
+            try:
+                if capture_out or capture_err:
+                    from parsl.app.capture import communicate
+                    *captured, usage = communicate(proc, timeout=timeout)
+                else:
+                    usage = rusage.wait(proc, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                import signal
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                proc.wait()
+                raise
+            returncode = proc.returncode
+        usage['wall_time'] = time.time() - start_time
 
     except subprocess.TimeoutExpired as e:
-        print("Timeout")
+        log.warning("[%s] App exceeded walltime : %s", func_name, timeout)
         status = 'failed'
         raise pe.AppTimeout("[{}] App exceeded walltime: {}".format(func_name, timeout), e)
 
     except Exception as e:
-        print ("Caught exception : ", e)
+        log.error("[%s] App caught exception : %s", func_name, e)
         error = e
         status = 'failed'
-        raise pe.AppException("[{}] App caught exception : {}".format(func_name, proc.returncode), e)
+        raise pe.AppException("[{}] App caught exception : {}".format(func_name, returncode), e)
 
     if returncode != 0:
-        raise pe.AppFailure("[{}] App Failed exit code: {}".format(func_name, proc.returncode), proc.returncode)
-
-    # TODO : Add support for globs here
+        error = pe.AppFailure("[{}] App Failed exit code: {}".format(func_name, returncode), returncode)
+        # What the app printed is most wanted when it failed
+        error.stdout_data, error.stderr_data = captured
+        error.usage = usage
+        raise error
 
-    missing = []
-    for outputfile in kwargs.get('outputs', []):
-        fpath = outputfile
-        if type(outputfile) != str:
-            fpath = outputfile.filepath
+    # Outputs may be glob patterns or directories, see parsl.data_provider.outputs
+    from parsl.data_provider.outputs import verify_outputs, is_pattern
 
-        if not os.path.exists(fpath):
-            missing.extend([outputfile])
+    outputs = kwargs.get('outputs', [])
+    paths = [o if isinstance(o, str) else o.filepath for o in outputs]
+    matched, missing, scans = verify_outputs(paths)
+    log.debug("[%s] Verified %s outputs, %s directories listed", func_name, len(paths), scans)
 
     if missing:
-        raise pe.MissingOutputs("[{}] Missing outputs".format(func_name), missing)
+        raise pe.MissingOutputs("[{}] Missing outputs".format(func_name), [outputs[i] for i in missing])
 
     exec_duration = time.time() - start_t
-    return returncode
+    log.debug("[%s] App completed in %.3fs", func_name, exec_duration)
+    patterns = any(is_pattern(path) for path in paths)
+    # The client turns the matched paths into DataFutures
+    return ExitCode(returncode, outputs=matched if patterns else None,
+                    stdout_data=captured[0], stderr_data=captured[1], usage=usage)
+
+
+class ExitCode(int):
+    ''' Exit code of a bash app, with what the client needs besides it:
+
+        - outputs : For each output, the list of paths it matched if it is a glob or
+          directory, else None. None if no output is a pattern
+        - stdout_data, stderr_data : Captured stream, if it was captured
+        - usage : Resource usage of the command, see parsl.app.rusage
+    '''
+
+    def __new__ (cls, returncode, outputs=None, stdout_data=None, stderr_data=None, usage=None):
+        code = super().__new__(cls, returncode)
+        code.outputs = outputs
+        code.stdout_data = stdout_data
+        code.stderr_data = stderr_data
+        code.usage = usage
+        return code
 
 
 class BashApp(AppBase):
 
-    def __init__ (self, func, executor, walltime=60, sites='all'):
-        super().__init__ (func, executor, walltime=60, sites=sites, exec_type="bash")
+    def __init__ (self, func, executor, walltime=None, sites='all', persistent_shell=False, skip_if_fresh=False):
+        super().__init__ (func, executor, walltime=walltime, sites=sites, exec_type="bash")
+        self.persistent_shell = persistent_shell
+        self.skip_if_fresh = skip_if_fresh
+
+        # Keyword arguments every call starts from, copied and never modified so
+        # the app can be called from several threads at once
+        self._defaults = dict(self.kwargs)
+        if walltime is not None:
+            self._defaults['parsl_walltime'] = walltime
+        if persistent_shell:
+            self._defaults['parsl_persistent_shell'] = True
 
 
     def __call__(self, *args, **kwargs):
@@ -125,19 +263,20 @@ class BashApp(AppBase):
                    App_fut
 
         '''
-        trace_method = False
+        # Kwargs in the app definition, updated with the ones passed in at calltime
+        call_kwargs = self._defaults.copy()
+        call_kwargs.update(kwargs)
 
-        # Update kwargs in the app definition with one's passed in at calltime
-        self.kwargs.update(kwargs)
+        if self.skip_if_fresh:
+            call_kwargs['parsl_skip_if_fresh'] = self.skip_if_fresh
 
         app_fut = self.executor.submit(remote_side_bash_executor, self.func, *args,
                                        parsl_sites=self.sites,
-                                       **self.kwargs)
+                                       **call_kwargs)
 
-        logger.debug("App[%s] assigned Task_id:[%s]" % (self.func.__name__,
-                                                        app_fut.tid) )
-        out_futs = [DataFuture(app_fut, o, parent=app_fut, tid=app_fut.tid)
-                    for o in kwargs.get('outputs', []) ]
-        app_fut._outputs = out_futs
+        logger.debug("App[%s] assigned Task_id:[%s]", self.__name__, app_fut.tid)
+        outputs = kwargs.get('outputs')
+        app_fut._outputs = [DataFuture(app_fut, o, parent=app_fut, tid=app_fut.tid)
+                            for o in outputs] if outputs else []
 
         return app_fut
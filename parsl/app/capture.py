@@ -0,0 +1,182 @@
+''' Capturing the stdout and stderr of bash apps in memory.
+
+With stdout=parsl.CAPTURE or stderr=parsl.CAPTURE, a bash app's stream is read
+through a pipe rather than written to a file, and comes back with the app's result
+as AppFuture.stdout_data or stderr_data. Tasks whose output is a few bytes then do
+not create two files each on a shared filesystem.
+
+Up to CAPTURE_MAX_BYTES of a stream are kept in memory. A longer stream is written
+to a file instead, in the directory named by PARSL_CAPTURE_DIR on the worker, else
+the worker's current directory, and stdout_data reads that file. The client has to
+see that directory then.
+
+A persistent shell cannot be handed new pipes, so there the captured streams go to
+files in the worker's temporary directory, which is usually on a local disk, and
+are read back and removed once the command is done.
+'''
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+import selectors
+import subprocess
+
+from parsl.app import rusage
+
+logger = logging.getLogger(__name__)
+
+# Bytes of a stream kept in memory before it is written to a file
+CAPTURE_MAX_BYTES = 1024*1024
+
+CAPTURE_DIR_ENV = "PARSL_CAPTURE_DIR"
+
+
+class _Capture(object):
+    ''' Type of CAPTURE. It unpickles to the same object, so it can be compared with is
+    on the worker.
+    '''
+
+    def __repr__ (self):
+        return "CAPTURE"
+
+    def __reduce__ (self):
+        return "CAPTURE"
+
+
+CAPTURE = _Capture()
+
+
+class Captured(object):
+    ''' A captured stream: its bytes, or the file it was written to if it was too long
+    '''
+
+    def __init__ (self, data=b'', path=None):
+        self.data = data
+        self.path = path
+
+    def __repr__ (self):
+        if self.path:
+            return "<Captured in {0}>".format(self.path)
+        return "<Captured {0} bytes>".format(len(self.data))
+
+    def text(self):
+        ''' The stream decoded as utf-8
+        '''
+        data = self.data
+        if self.path:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        return data.decode('utf-8', errors='replace')
+
+
+def _spill_file(name):
+    ''' Open a new file for a stream too long to keep in memory
+    '''
+    dirname = os.environ.get(CAPTURE_DIR_ENV, os.getcwd())
+    fd, path = tempfile.mkstemp(prefix="parsl.{0}.".format(name), suffix=".txt", dir=dirname)
+    return os.fdopen(fd, 'wb'), path
+
+
+class _Sink(object):
+    ''' Collects one stream, in memory till it passes max_bytes
+    '''
+
+    def __init__ (self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.size = 0
+        self.file = None
+        self.path = None
+
+    def write(self, data):
+        if self.file:
+            self.file.write(data)
+            return
+        self.chunks.append(data)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.file, self.path = _spill_file(self.name)
+            self.file.write(b''.join(self.chunks))
+            self.chunks = None
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            return Captured(path=self.path)
+        return Captured(b''.join(self.chunks))
+
+
+def communicate(proc, timeout=None):
+    ''' Read the stdout and stderr pipes of proc, those that are pipes, till both are
+    closed and proc has exited
+
+    KWargs:
+         - timeout (float) : Seconds to wait. Default: None, no limit
+
+    Returns:
+         - (stdout, stderr, usage) : Captured for each stream that was a pipe, else None,
+           and the resource usage of proc, see parsl.app.rusage
+
+    Raises:
+         - subprocess.TimeoutExpired : If proc ran past timeout. The pipes are closed
+    '''
+
+    deadline = None if timeout is None else time.time() + timeout
+    sinks = {}
+    selector = selectors.DefaultSelector()
+    for name, pipe in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+        if pipe:
+            sinks[name] = _Sink(name, CAPTURE_MAX_BYTES)
+            selector.register(pipe, selectors.EVENT_READ, sinks[name])
+
+    try:
+        while selector.get_map():
+            wait = None if deadline is None else deadline - time.time()
+            if wait is not None and wait <= 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            for key, events in selector.select(wait):
+                data = os.read(key.fd, 65536)
+                if data:
+                    key.data.write(data)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+
+        wait = None if deadline is None else max(0, deadline - time.time())
+        usage = rusage.wait(proc, timeout=wait)
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        captured = {name : sink.close() for name, sink in sinks.items()}
+
+    return captured.get('stdout'), captured.get('stderr'), usage
+
+
+def capture_file(name):
+    ''' A file on the worker's local disk for a captured stream of a command run in a
+    persistent shell
+    '''
+    fd, path = tempfile.mkstemp(prefix="parsl.{0}.".format(name))
+    os.close(fd)
+    return path
+
+
+def read_capture_file(name, path):
+    ''' The Captured of a stream written to path by capture_file, path is removed or
+    moved to the spill directory
+    '''
+    try:
+        if os.path.getsize(path) <= CAPTURE_MAX_BYTES:
+            with open(path, 'rb') as f:
+                return Captured(f.read())
+        f, spilled = _spill_file(name)
+        f.close()
+        shutil.move(path, spilled)
+        return Captured(path=spilled)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
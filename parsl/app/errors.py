@@ -56,7 +56,7 @@ class AppFailure(AppException):
     '''
 
     def __init__(self, reason, exitcode, retries=None):
-        super().__init__()
+        super().__init__(reason, exitcode, retries)
         self.reason = reason
         self.exitcode = exitcode
         self.retries = retries
@@ -71,7 +71,8 @@ class AppTimeout(AppException):
     '''
 
     def __init__(self, reason, exitcode, retries=None):
-        super().__init__()
+        # The args are kept so the error unpickles when it comes back from a worker
+        super().__init__(reason, exitcode, retries)
         self.reason = reason
         self.exitcode = -55
         self.retries = retries
@@ -112,6 +113,25 @@ class MissingOutputs(ParslError):
     def __str__(self):
         return "Reason:{0} Missing:{1}".format(self.reason, self.outputs)
 
+class FileStagingError(ParslError):
+    ''' Error raised when files could not be staged in or out for a task
+
+    Contains:
+    reason(string)
+    files(List of File objects)
+    '''
+
+    def __init__(self, reason, files):
+        super().__init__()
+        self.reason = reason
+        self.files = files
+
+    def __repr__(self):
+        return "File staging failed: {0}, Reason:{1}".format(self.files, self.reason)
+
+    def __str__(self):
+        return self.__repr__()
+
 class BadStdStreamFile(ParslError):
     ''' Error raised due to bad filepaths specified for STDOUT/ STDERR
 
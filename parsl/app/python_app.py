@@ -6,6 +6,7 @@ from parsl.app.futures import DataFuture
 from parsl.app.errors import *
 from parsl.dataflow.dflow import DataFlowKernel
 from parsl.app.app import AppBase
+from parsl.app.rusage import MeasuredCall
 
 logger = logging.getLogger(__name__)
 
@@ -13,10 +14,13 @@ class PythonApp(AppBase):
     """ Extends AppBase to cover the Python App
 
     """
-    def __init__ (self, func, executor, walltime=60, sites='all'):
+    def __init__ (self, func, executor, walltime=None, sites='all'):
         ''' Initialize the super. This bit is the same for both bash & python apps.
         '''
         super().__init__ (func, executor, walltime=walltime, sites=sites, exec_type="python")
+        # Returns the result with the call's resource usage, see parsl.app.rusage, and
+        # runs it in a child process that is killed past its walltime, if it has one
+        self._measured = MeasuredCall(func, walltime=self.kwargs.get('walltime', self.walltime))
 
 
     def __call__(self, *args, **kwargs):
@@ -34,14 +38,13 @@ class PythonApp(AppBase):
                    App_fut
 
         '''
-        app_fut = self.executor.submit(self.func, *args,
+        app_fut = self.executor.submit(self._measured, *args,
                                        parsl_sites=self.sites,
                                        **kwargs)
 
-        logger.debug("App[%s] assigned Task_id:[%s]" % (self.func.__name__,
-                                                        app_fut.tid) )
-        out_futs = [DataFuture(app_fut, o, parent=app_fut, tid=app_fut.tid)
-                    for o in kwargs.get('outputs', []) ]
-        app_fut._outputs = out_futs
+        logger.debug("App[%s] assigned Task_id:[%s]", self.__name__, app_fut.tid)
+        outputs = kwargs.get('outputs')
+        app_fut._outputs = [DataFuture(app_fut, o, parent=app_fut, tid=app_fut.tid)
+                            for o in outputs] if outputs else []
 
         return app_fut
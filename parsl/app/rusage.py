@@ -0,0 +1,189 @@
+''' Resource usage of tasks.
+
+Each task measures what it used on the worker and returns it with its result:
+
+    - wall_time : Seconds the task ran for
+    - user_time, system_time : CPU seconds
+    - max_rss : Peak resident memory, in bytes
+    - read_blocks, write_blocks : Blocks read from and written to disk
+
+A bash app waits for its command with os.wait4, which returns the usage of that
+command and the processes it waited for, whatever else the worker runs at the same
+time. A command run in a persistent shell is reaped by the shell, so only its
+wall_time is known.
+
+A python app is run by a wrapper made once per app, which measures the calling
+thread where the OS supports it (RUSAGE_THREAD on Linux), else the whole worker
+process. max_rss of a python app is the peak of the worker process so far. A python
+app with a walltime runs in a child process on process based executors, whose usage
+is then returned.
+
+The DataFlowKernel keeps the usage of each task in its task record, as ``usage``,
+and AppFuture.usage returns it. :class:`UsageStats` aggregates it per app.
+'''
+
+import os
+import time
+import logging
+import resource
+import functools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Measures the calling thread only, where the OS has it
+RUSAGE_TASK = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+
+# ru_maxrss is in kilobytes on Linux, bytes on macOS
+MAXRSS_UNIT = 1 if os.uname().sysname == 'Darwin' else 1024
+
+FIELDS = ('wall_time', 'user_time', 'system_time', 'max_rss', 'read_blocks', 'write_blocks')
+
+
+def from_rusage(ru, wall_time):
+    ''' Usage dict of a resource.struct_rusage
+    '''
+    return {'wall_time' : wall_time,
+            'user_time' : ru.ru_utime,
+            'system_time' : ru.ru_stime,
+            'max_rss' : ru.ru_maxrss * MAXRSS_UNIT,
+            'read_blocks' : ru.ru_inblock,
+            'write_blocks' : ru.ru_oublock}
+
+
+def wait(proc, timeout=None):
+    ''' Wait for a subprocess.Popen to exit, like proc.wait, and return its usage
+
+    Raises:
+         - subprocess.TimeoutExpired : If proc ran past timeout
+    '''
+    import subprocess
+
+    start = time.time()
+    deadline = None if timeout is None else start + timeout
+    delay = 0.0005
+    while True:
+        pid, status, ru = os.wait4(proc.pid, os.WNOHANG)
+        if pid == proc.pid:
+            break
+        if deadline is not None and time.time() + delay > deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        # Same back off as Popen.wait with a timeout
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return from_rusage(ru, time.time() - start)
+
+
+class Measured(object):
+    ''' Result of a python app with the usage of the call that returned it. The
+    AppFuture hands out the result only.
+    '''
+
+    def __init__ (self, result, usage):
+        self.result = result
+        self.usage = usage
+
+
+class MeasuredCall(object):
+    ''' Calls func and returns a Measured. Made once per app, it keeps func's name,
+    which the DataFlowKernel logs and counts tasks by.
+
+    This is an object rather than a closure so that the function registry of an
+    executor serializes it once per app, see parsl.executors.function_registry.
+    It pickles with func canned by code, as ipyparallel sends plain functions, so
+    functions defined in __main__ reach the workers too.
+
+    With a walltime, or a walltime kwarg in the call, func runs in a child process
+    that is killed once the walltime has passed, see parsl.app.walltime. The usage is
+    then the child's.
+    '''
+
+    def __init__ (self, func, walltime=None):
+        self.func = func
+        self.walltime = walltime
+        functools.update_wrapper(self, func)
+
+    def __reduce__ (self):
+        from ipyparallel.serialize import can
+        return (_rebuild_measured_call, (can(self.func), self.walltime))
+
+    def __call__ (self, *args, **kwargs):
+        timeout = kwargs.get('walltime', self.walltime)
+        if timeout is not None:
+            from parsl.app import walltime
+            if walltime.enforced():
+                return Measured(*walltime.run(self.func, args, kwargs, timeout))
+
+        start = time.time()
+        before = from_rusage(resource.getrusage(RUSAGE_TASK), 0)
+        result = self.func(*args, **kwargs)
+        usage = from_rusage(resource.getrusage(RUSAGE_TASK), time.time() - start)
+        for field in ('user_time', 'system_time', 'read_blocks', 'write_blocks'):
+            usage[field] -= before[field]
+        usage['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_UNIT
+        return Measured(result, usage)
+
+
+def _rebuild_measured_call(canned, walltime):
+    import builtins
+    from ipyparallel.serialize import uncan
+    return MeasuredCall(uncan(canned, {'__builtins__' : builtins}), walltime)
+
+
+def unwrap(result):
+    ''' (result, usage) of what an executor returned, usage is None if it was not measured
+    '''
+    if isinstance(result, Measured):
+        return result.result, result.usage
+    return result, getattr(result, 'usage', None)
+
+
+class UsageStats(object):
+    ''' Usage of tasks aggregated per app
+    '''
+
+    def __init__ (self):
+        self._apps = {}
+        self._lock = threading.Lock()
+
+    def add(self, app, usage):
+        with self._lock:
+            self._add(app, usage)
+
+    def _add(self, app, usage):
+        stats = self._apps.get(app)
+        if stats is None:
+            stats = self._apps[app] = {'count' : 0, 'max_rss' : 0, 'max_wall_time' : 0.0}
+            for field in FIELDS:
+                if field != 'max_rss':
+                    stats[field] = 0
+        stats['count'] += 1
+        for field in FIELDS:
+            value = usage.get(field)
+            if value is None:
+                continue
+            if field == 'max_rss':
+                stats['max_rss'] = max(stats['max_rss'], value)
+            else:
+                stats[field] += value
+        stats['max_wall_time'] = max(stats['max_wall_time'], usage.get('wall_time') or 0)
+
+    def summary(self):
+        ''' {app name : totals of the time and block fields, their means per task as
+        mean_<field>, count, max_wall_time and max_rss (the largest seen)}
+        '''
+        summary = {}
+        with self._lock:
+            apps = {app : dict(stats) for app, stats in self._apps.items()}
+        for app, stats in apps.items():
+            app_summary = dict(stats)
+            for field in FIELDS:
+                if field != 'max_rss':
+                    app_summary['mean_' + field] = stats[field] / stats['count']
+            summary[app] = app_summary
+        return summary
@@ -0,0 +1,154 @@
+''' Persistent bash shells for bash apps.
+
+Starting /bin/bash for each bash app costs more than a tiny command such as echo
+takes to run. With persistent_shell set on a bash app, each worker thread keeps
+one bash process running and writes the apps' commandlines to it instead.
+
+Each command runs in a subshell, ( ... ), which bash forks without starting a
+new bash. Changes a command makes to variables, functions, options or the
+working directory are therefore gone once it ends. The subshell starts in the
+worker's current directory, reads from /dev/null and writes to the app's stdout
+and stderr files. Its exit code goes back on a pipe that only the worker reads.
+
+When a command runs past its walltime, the shell and everything started from it
+are killed, and the next command starts a new shell. The shell's environment is
+the worker's environment at the time the shell was started.
+'''
+
+import os
+import time
+import shlex
+import select
+import signal
+import logging
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class ShellDied(Exception):
+    ''' The persistent shell exited while running a command
+    '''
+
+    def __init__(self, returncode):
+        super().__init__("Persistent shell exited with {0}".format(returncode))
+        self.returncode = returncode
+
+
+class PersistentShell(object):
+    ''' A bash process that runs one command at a time in a subshell.
+    '''
+
+    def __init__ (self):
+        self.pid = os.getpid()
+        self._status_r, status_w = os.pipe()
+        self.proc = subprocess.Popen(['/bin/bash', '--noprofile', '--norc'],
+                                     stdin=subprocess.PIPE,
+                                     pass_fds=(status_w,),
+                                     start_new_session=True)
+        os.close(status_w)
+        # The shell writes exit codes to the pipe under the same fd number
+        self._status_fd = status_w
+        self._buffer = b''
+        self.commands = 0
+        logger.debug("Started persistent shell pid:%s", self.proc.pid)
+
+    def _script(self, executable, stdout, stderr):
+        redirects = "< /dev/null"
+        if stdout:
+            redirects += " > {0}".format(shlex.quote(stdout))
+        if stderr:
+            redirects += " 2> {0}".format(shlex.quote(stderr))
+
+        # eval keeps a syntax error in the command from breaking the wrapper
+        return "( cd {0} && eval {1} ) {2}\necho $? >&{3}\n".format(shlex.quote(os.getcwd()),
+                                                                   shlex.quote(executable),
+                                                                   redirects, self._status_fd)
+
+    def run(self, executable, stdout=None, stderr=None, timeout=None):
+        ''' Run the commandline and wait for it to finish
+
+        Args:
+             - executable (string) : Bash commandline
+
+        KWargs:
+             - stdout (string) : File to write stdout to. Default: the worker's stdout
+             - stderr (string) : File to write stderr to. Default: the worker's stderr
+             - timeout (float) : Seconds to wait for the command. Default: None, no limit
+
+        Returns:
+             - The command's exit code
+
+        Raises:
+             - subprocess.TimeoutExpired : If the command ran past timeout. The shell is killed
+             - ShellDied : If the shell exited, eg. because the command killed it
+        '''
+
+        self.commands += 1
+        try:
+            self.proc.stdin.write(self._script(executable, stdout, stderr).encode())
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            raise ShellDied(self.proc.wait())
+
+        deadline = None if timeout is None else time.time() + timeout
+        while b'\n' not in self._buffer:
+            wait = None if deadline is None else max(0, deadline - time.time())
+            ready, _, _ = select.select([self._status_r], [], [], wait)
+            if not ready:
+                self.kill()
+                raise subprocess.TimeoutExpired(executable, timeout)
+            data = os.read(self._status_r, 4096)
+            if not data:
+                raise ShellDied(self.proc.wait())
+            self._buffer += data
+
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return int(line)
+
+    def alive(self):
+        return self.pid == os.getpid() and self.proc.poll() is None
+
+    def kill(self):
+        ''' Kill the shell and every process started from it
+        '''
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+        os.close(self._status_r)
+
+
+def run_in_shell(executable, stdout=None, stderr=None, timeout=None):
+    ''' Run a commandline in the calling thread's persistent shell, starting the
+    shell first if there is none or the last one died. Same arguments as
+    PersistentShell.run.
+    '''
+
+    shell = getattr(_local, 'shell', None)
+    if shell is None or not shell.alive():
+        # A shell inherited over fork belongs to the parent
+        if shell is not None and shell.pid == os.getpid():
+            shell.close()
+        shell = _local.shell = PersistentShell()
+
+    try:
+        return shell.run(executable, stdout=stdout, stderr=stderr, timeout=timeout)
+    except ShellDied:
+        shell.close()
+        _local.shell = None
+        raise
+    except subprocess.TimeoutExpired:
+        _local.shell = None
+        raise
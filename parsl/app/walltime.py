@@ -0,0 +1,158 @@
+''' Enforcing the walltime of python apps.
+
+A thread cannot be stopped from outside, so a python app that hangs would keep its
+worker slot forever. On a process based executor (ZMQ and IPP workers, the Turbine
+runner) a python app with a walltime is instead run in a child forked from the
+worker, in a session of its own. The worker waits for the child's result on a
+pipe, and once the walltime has passed it kills the child with everything the child
+started, and the task fails with AppTimeout. The worker's slot is then free for the
+next task.
+
+The walltime of python apps is not enforced on the ThreadPoolExecutor. Its apps run
+in the process of the DataFlowKernel, whose other threads may hold locks, eg. of
+logging, at the time of a fork, which would deadlock the child. A warning is logged
+instead, once.
+
+The child is a copy of the worker, so changes the app makes to the worker's memory,
+eg. to module globals, are lost. Its result and exceptions come back pickled.
+Python apps without a walltime run in the worker itself, as before.
+'''
+
+import os
+import time
+import pickle
+import signal
+import select
+import logging
+
+from parsl.app import rusage
+
+logger = logging.getLogger(__name__)
+
+# Process of the DataFlowKernel, where apps run on threads, see mark_client
+_client_pid = None
+_warned = False
+
+
+def mark_client():
+    ''' Record that this process runs a DataFlowKernel. Apps called in it run on
+    threads and their walltime is not enforced.
+    '''
+    global _client_pid
+    _client_pid = os.getpid()
+
+
+def enforced():
+    ''' Whether the walltime of an app called in this process is enforced, that is
+    whether this is a worker process rather than the process of the DataFlowKernel
+    '''
+    global _warned
+    if os.getpid() != _client_pid:
+        return True
+    if not _warned:
+        _warned = True
+        logger.warning("Walltime of python apps is not enforced on threads, "
+                       "use a process based executor to have hung apps killed")
+    return False
+
+
+def _child(func, args, kwargs, write_fd):
+    ''' Run func in the forked child and write (ok, result or exception) to write_fd.
+    Never returns.
+    '''
+    code = 0
+    try:
+        os.setsid()
+        try:
+            message = (True, func(*args, **kwargs))
+        except BaseException as e:
+            message = (False, e)
+        try:
+            data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            data = pickle.dumps((False, TypeError("Result could not be pickled : {0}".format(e))),
+                                pickle.HIGHEST_PROTOCOL)
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(data)
+    except BaseException:
+        code = 1
+    finally:
+        os._exit(code)
+
+
+def _kill(pid):
+    ''' Kill the child's session and reap the child
+    '''
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    os.waitpid(pid, 0)
+
+
+def run(func, args, kwargs, walltime, name=None):
+    ''' Call func(*args, **kwargs) in a forked child, allowing it walltime seconds
+
+    Args:
+         - func (callable) : The app's function
+         - args (tuple), kwargs (dict) : Its arguments
+         - walltime (float) : Seconds the call may take
+
+    KWargs:
+         - name (string) : Name of the app, for messages. Default: func's name
+
+    Returns:
+         - (result, usage) : What func returned, and the resource usage of the child,
+           see parsl.app.rusage
+
+    Raises:
+         - AppTimeout : If the call ran past walltime
+         - AppFailure : If the child died without a result
+         - Whatever func raised
+    '''
+    import parsl.app.errors as pe
+
+    name = name or getattr(func, '__name__', 'app')
+    read_fd, write_fd = os.pipe()
+    start = time.time()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _child(func, args, kwargs, write_fd)
+    os.close(write_fd)
+
+    deadline = start + walltime
+    chunks = []
+    try:
+        while True:
+            wait = deadline - time.time()
+            if wait <= 0 or not select.select([read_fd], [], [], wait)[0]:
+                _kill(pid)
+                logger.warning("[%s] App exceeded walltime : %s", name, walltime)
+                raise pe.AppTimeout("[{}] App exceeded walltime: {}".format(name, walltime), None)
+            data = os.read(read_fd, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        os.close(read_fd)
+
+    # The child has written its result, what it left running goes with it
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+    pid, status, ru = os.wait4(pid, 0)
+    usage = rusage.from_rusage(ru, time.time() - start)
+
+    if not chunks:
+        raise pe.AppFailure("[{}] App died without a result, wait status : {}".format(name, status), status)
+
+    ok, value = pickle.loads(b''.join(chunks))
+    if not ok:
+        try:
+            value.usage = usage
+        except AttributeError:
+            pass
+        raise value
+    return value, usage
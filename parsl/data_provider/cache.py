@@ -0,0 +1,225 @@
+''' Cache of staged input files.
+
+Staged input files created with ``File(url, cache=True, caching_dir=...)`` are kept
+in caching_dir/parsl_cache after they are first fetched, and later stage ins of the same file
+are served from there. An entry is keyed by the file's url and the fields the
+staging handler's stat returns: the size and validators that change with each
+version of the file, eg. the modification time and inode of a local file, or an
+ETag. A changed file is then fetched again. Files whose handler returns no
+validator, or only some of its fields, are not cached, since versions of the same
+size would share an entry. A validator is only as good as its source, eg. a
+server's Last-Modified header.
+
+Entries are materialized into the task's directory as hard links, or as reflinks
+or copies where a hard link is not possible. Entries are made read only, since a
+task writing to a hard linked input would change the cached copy.
+
+Several processes on a node may share a caching_dir. Fetches of an entry are
+serialized by a lock file per entry, and the entry is written to a temporary file
+and renamed into place. Each use touches the entry's lock file, and once the
+cache is larger than max_bytes the entries used least recently are removed.
+'''
+
+import os
+import fcntl
+import errno
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Size the cache is trimmed to, in bytes
+CACHE_MAX_BYTES = 10*1024*1024*1024
+
+# ioctl that clones a file's extents, on filesystems that support reflinks
+FICLONE = 0x40049409
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(caching_dir):
+    ''' The cache in caching_dir, one object per directory in each process
+    '''
+    caching_dir = os.path.abspath(caching_dir)
+    with _caches_lock:
+        if caching_dir not in _caches:
+            _caches[caching_dir] = FileCache(caching_dir)
+        return _caches[caching_dir]
+
+
+def set_max_bytes(max_bytes):
+    ''' Set the size of the caches made from now on and of those already made
+    '''
+    global CACHE_MAX_BYTES
+    CACHE_MAX_BYTES = max_bytes
+    with _caches_lock:
+        for cache in _caches.values():
+            cache.max_bytes = max_bytes
+
+
+def validated(stat):
+    ''' Whether the stat fields of a handler tell versions of a file apart, that is
+    a size and at least one validator, with none of them missing
+    '''
+    return stat is not None and len(stat) >= 2 and all(field not in (None, '') for field in stat)
+
+
+def materialize(src, dst):
+    ''' Make dst a hard link to src, else a reflink, else a copy
+
+    Returns:
+         - 'link', 'reflink' or 'copy'
+    '''
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return 'reflink'
+        except OSError:
+            shutil.copyfileobj(s, d)
+            return 'copy'
+
+
+class FileCache(object):
+    ''' Cache of staged input files in one directory.
+    '''
+
+    def __init__ (self, caching_dir, max_bytes=None):
+        ''' Open the cache, creating caching_dir if needed
+
+        Args:
+             - caching_dir (string) : Directory of the cache
+
+        KWargs:
+             - max_bytes (int) : Size the cache is trimmed to. Default: CACHE_MAX_BYTES
+        '''
+
+        self.caching_dir = os.path.abspath(caching_dir)
+        self.root = os.path.join(self.caching_dir, "parsl_cache")
+        self.max_bytes = max_bytes or CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        # Bytes served from the cache rather than fetched
+        self.hit_bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        # Estimate of the cache size, corrected on each trim
+        self._bytes = self._entries_size()
+
+    @staticmethod
+    def key(url, *stat):
+        ''' Key of the file at url with the stat fields from its handler
+        '''
+        fields = [url] + [str(field) for field in stat]
+        return hashlib.sha256("\0".join(fields).encode()).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _entries(self):
+        ''' (path, size, last use) of each entry, by scanning the cache directory
+        '''
+        entries = []
+        for bucket in os.scandir(self.root):
+            if not bucket.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith('.lock') or entry.name.startswith('.'):
+                    continue
+                try:
+                    size = entry.stat().st_size
+                    used = os.stat(entry.path + '.lock').st_mtime
+                except OSError:
+                    continue
+                entries.append((entry.path, size, used))
+        return entries
+
+    def _entries_size(self):
+        return sum(size for path, size, used in self._entries())
+
+    def stage_in(self, file_obj, local_path, handler):
+        ''' Put the file behind file_obj at local_path, from the cache if it holds
+        the file, else by fetching it with the handler and keeping a copy.
+
+        Returns:
+             - Bytes moved by the handler, 0 on a hit
+        '''
+
+        stat = handler.stat(file_obj)
+        if not validated(stat):
+            return handler.stage_in(file_obj, local_path)
+
+        entry = self._entry(self.key(file_obj.url, *stat))
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+        with open(entry + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Marks the entry as used for the LRU order
+                os.utime(entry + '.lock')
+                if os.path.exists(entry):
+                    size = os.path.getsize(entry)
+                    materialize(entry, local_path)
+                    with self._lock:
+                        self.hits += 1
+                        self.hit_bytes += size
+                    return 0
+
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), prefix='.fetch.')
+                os.close(fd)
+                try:
+                    nbytes = handler.stage_in(file_obj, tmp)
+                    os.chmod(tmp, 0o444)
+                    os.rename(tmp, entry)
+                except Exception:
+                    os.unlink(tmp)
+                    raise
+                materialize(entry, local_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        with self._lock:
+            self.misses += 1
+            self._bytes += nbytes
+            over = self._bytes > self.max_bytes
+        if over:
+            self.trim()
+        return nbytes
+
+    def trim(self):
+        ''' Remove the entries used least recently till the cache fits in max_bytes
+        '''
+
+        with open(os.path.join(self.root, '.trim.lock'), 'a') as trim_lock:
+            fcntl.flock(trim_lock, fcntl.LOCK_EX)
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for path, size, used in entries)
+            for path, size, used in entries:
+                if total <= self.max_bytes:
+                    break
+                with open(path + '.lock', 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        continue
+                    finally:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+                total -= size
+                with self._lock:
+                    self.evictions += 1
+                logger.debug("Evicted %s from the cache, %s bytes", path, size)
+
+        with self._lock:
+            self._bytes = total
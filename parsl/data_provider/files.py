@@ -17,6 +17,14 @@ class File(object):
 
         Args:
              - url (string) : url string of the file eg.
+
+        KWargs:
+             - cache (Bool) : Keep a copy of the file in caching_dir when it is staged in,
+               and stage it in from there while it is unchanged. Default: False
+             - caching_dir (string) : Directory of the cache. Default: '.'
+             - staging (string) : 'direct' to use the file where it is. Any other mode, eg.
+               'copy', has the file staged in to, or out of, a directory for the task
+               by the handler for its protocol. Default: 'direct'
         '''
 
         self.url = url
@@ -27,6 +35,8 @@ class File(object):
         self.cache = cache
         self.caching_dir = caching_dir
         self.staging = staging
+        # Where the task sees the file once it is staged, None if it is not
+        self.local_path = None
 
     def __str__(self):
         return self.url
@@ -34,6 +44,12 @@ class File(object):
     def __repr__(self):
         return self.__str__()
 
+    def __format__(self, format_spec):
+        ''' Files in the command line of a bash app stand for their filepath, which is
+        the staged copy when the file is staged
+        '''
+        return format(self.filepath, format_spec)
+
     @property
     def filepath(self):
         ''' Returns the resolved filepath on the side where it is called from.
@@ -46,24 +62,54 @@ class File(object):
              - filepath (string)
 
         '''
-        if 'exec_site' not in globals() or self.staging == 'direct':
+        if self.local_path:
+            return self.local_path
+        elif 'exec_site' not in globals() or self.staging == 'direct':
             # Assume local and direct
             return self.path
         else:
             # Return self.path for now
             return self.path
 
-    def stage_in(self):
+    @property
+    def staged(self):
+        ''' Whether the file is moved for the task rather than used where it is
+        '''
+        return self.staging != 'direct'
+
+    def stage_in(self, local_path=None):
         ''' The stage_in call transports the file from the side of origin
         to the local side
+
+        KWargs:
+             - local_path (string) : Where to put the file, filepath returns it after.
+               Default: the local_path already set
+
+        Returns:
+             - Bytes moved
         '''
-        pass
+        from parsl.data_provider.staging import get_handler
+
+        if local_path:
+            self.local_path = local_path
+        handler = get_handler(self.protocol)
+        if self.cache:
+            from parsl.data_provider.cache import get_cache
+            return get_cache(self.caching_dir).stage_in(self, self.local_path, handler)
+        return handler.stage_in(self, self.local_path)
 
     def stage_out(self):
         ''' The stage_out call transports the file from local filesystem
         to the origin side
+
+        Returns:
+             - Bytes moved, 0 if the file was never staged
         '''
-        pass
+        from parsl.data_provider.staging import get_handler
+
+        if not self.local_path:
+            return 0
+        return get_handler(self.protocol).stage_out(self, self.local_path)
 
 
 if __name__ == '__main__' :
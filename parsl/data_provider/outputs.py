@@ -0,0 +1,131 @@
+''' Verification of app outputs.
+
+Besides files, an app's outputs may hold:
+
+    - Glob patterns, eg. 'results/*.csv', which must match at least one entry
+    - Directories, written with a trailing '/', eg. 'results/', which must exist.
+      They stand for the files directly in the directory
+
+Files in a directory holding SCAN_THRESHOLD or more of the outputs are checked with
+one os.scandir of the directory rather than a stat per file, which matters on
+filesystems like Lustre or GPFS where each stat is a round trip to a metadata
+server. Fewer files are stat'ed, so one output does not cost a listing of a large
+directory. Patterns with wildcards in their directory part fall back to glob.glob.
+
+As with glob, wildcards do not match names starting with '.', and the hidden files
+of a directory output are left out.
+'''
+
+import os
+import glob
+import fnmatch
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Outputs in one directory from which it is listed rather than stat'ed per file
+SCAN_THRESHOLD = 8
+
+
+def is_pattern(path):
+    ''' Whether the output path stands for a set of files rather than one file
+    '''
+    # Same characters as glob.has_magic, without a regex search per output
+    return path.endswith('/') or '*' in path or '?' in path or '[' in path
+
+
+class _Listings(object):
+    ''' Directory listings, each directory is scanned at most once
+    '''
+
+    def __init__ (self):
+        self._listings = {}
+        self.scans = 0
+
+    def listing(self, dirname):
+        ''' (names, names of links, names of files) in dirname, None if it cannot be listed
+        '''
+        if dirname not in self._listings:
+            self.scans += 1
+            names, links, files = set(), set(), set()
+            try:
+                with os.scandir(dirname) as it:
+                    for entry in it:
+                        names.add(entry.name)
+                        # The entry types come with the listing, only links are stat'ed
+                        if entry.is_symlink():
+                            links.add(entry.name)
+                        if entry.is_file():
+                            files.add(entry.name)
+            except OSError:
+                self._listings[dirname] = None
+            else:
+                self._listings[dirname] = (names, links, files)
+        return self._listings[dirname]
+
+    def missing(self, dirname, names, paths):
+        ''' Indices of the paths that do not exist, of (index, name) pairs in names
+        '''
+        listing = self.listing(dirname)
+        if listing is None:
+            # eg. a directory that can be searched but not listed
+            return [i for i, name in names if not os.path.exists(paths[i])]
+        found, links, files = listing
+        # A broken link does not count, like with os.path.exists
+        return [i for i, name in names
+                if name not in found or (name in links and not os.path.exists(paths[i]))]
+
+    def match(self, pattern):
+        ''' Sorted paths matching a glob pattern or in a directory, None if there are none
+        '''
+        if pattern.endswith('/'):
+            dirname = pattern.rstrip('/') or '/'
+            listing = self.listing(dirname)
+            if listing is None:
+                return None
+            return sorted(os.path.join(dirname, name) for name in listing[2] if not name.startswith('.'))
+
+        dirname, name = os.path.split(pattern)
+        if glob.has_magic(dirname):
+            return sorted(glob.glob(pattern)) or None
+
+        names = (self.listing(dirname or '.') or [[]])[0]
+        names = [n for n in fnmatch.filter(names, name) if not n.startswith('.') or name.startswith('.')]
+        return sorted(os.path.join(dirname, n) for n in names) or None
+
+
+def verify_outputs(paths):
+    ''' Check the output paths of an app
+
+    Args:
+         - paths (list) : Paths of the outputs, which may be patterns or directories
+
+    Returns:
+         - (matched, missing, scans) : matched holds, for each path, the list of paths it
+           matched if it is a pattern, else None. missing holds the indices of the paths
+           that do not exist or match nothing. scans is the count of directories listed
+    '''
+
+    listings = _Listings()
+    matched = [None] * len(paths)
+    missing = []
+
+    # Plain files grouped by directory, as (index, name)
+    dirs = {}
+    for i, path in enumerate(paths):
+        if is_pattern(path):
+            files = listings.match(path)
+            matched[i] = files or []
+            if files is None:
+                missing.append(i)
+            continue
+        dirname, sep, name = path.rpartition('/')
+        dirs.setdefault(dirname or sep or '.', []).append((i, name))
+
+    for dirname, names in dirs.items():
+        if len(names) >= SCAN_THRESHOLD:
+            missing.extend(listings.missing(dirname, names, paths))
+        else:
+            missing.extend(i for i, name in names if not os.path.exists(paths[i]))
+
+    return matched, sorted(missing), listings.scans
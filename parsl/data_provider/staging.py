@@ -0,0 +1,323 @@
+''' Staging of File objects around task launch.
+
+Files passed in a task's inputs or outputs with a staging mode other than
+'direct' are staged by the DataFlowKernel's :class:`StagingEngine`. Before the
+task is submitted, its input files are fetched from their urls into a directory
+for the task. Once the task has finished, its output files are sent from that
+directory back to their urls. The task gets copies of the File objects whose
+filepath is the file in the task's directory, under a directory of its own per
+file so that files with the same name do not clash. A bash app's command line
+fills them in with that path. The user's File objects are left as they are.
+
+Transfers run on a bounded pool of threads shared by all tasks, and the files of
+a task are transferred in parallel. A task is submitted to its executor as soon
+as its own inputs are in place, so staging overlaps with other tasks running.
+
+Files are moved by the handler registered for their protocol:
+
+    - file : :class:`FileHandler`, copies within the local filesystem
+    - :class:`ChannelHandler` : moves files through a libsubmit channel. It can be
+      registered for any protocol, and with a LocalChannel it stands in for a
+      remote site in tests.
+
+Input files with cache set are served from the file cache in their caching_dir,
+see :mod:`parsl.data_provider.cache`. Bytes moved and transfer times are kept for
+each task in ``metrics``, a cache hit moves no bytes.
+'''
+
+import os
+import time
+import copy
+import shlex
+import shutil
+import logging
+import threading
+import concurrent.futures as cf
+
+from parsl.app.errors import FileStagingError
+
+logger = logging.getLogger(__name__)
+
+# Transfers run at once across all tasks
+STAGING_THREADS = 8
+
+
+class StagingHandler(object):
+    ''' Moves files of one protocol between their url and a local path.
+    '''
+
+    def stage_in(self, file_obj, local_path):
+        ''' Fetch the file behind file_obj to local_path
+
+        Returns:
+             - Bytes moved
+        '''
+        raise NotImplementedError
+
+    def stage_out(self, file_obj, local_path):
+        ''' Send the file at local_path to the url of file_obj
+
+        Returns:
+             - Bytes moved
+        '''
+        raise NotImplementedError
+
+    def stat(self, file_obj):
+        ''' Fields that change when the file behind file_obj changes, for the file
+        cache: its size followed by at least one validator that changes with each
+        version of the file, eg. (size, mtime, inode) or (size, etag). The size
+        alone does not tell versions apart. None if the handler has no reliable
+        validator, eg. an HTTP server without ETag or Last-Modified, and the file
+        is then not cached. See :mod:`parsl.data_provider.cache`.
+        '''
+        return None
+
+
+class FileHandler(StagingHandler):
+    ''' Handler for file:// urls, the file is copied.
+    '''
+
+    def stage_in(self, file_obj, local_path):
+        shutil.copyfile(file_obj.path, local_path)
+        return os.path.getsize(local_path)
+
+    def stage_out(self, file_obj, local_path):
+        dirname = os.path.dirname(file_obj.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        shutil.copyfile(local_path, file_obj.path)
+        return os.path.getsize(local_path)
+
+    def stat(self, file_obj):
+        try:
+            st = os.stat(file_obj.path)
+        except OSError:
+            return None
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class ChannelHandler(StagingHandler):
+    ''' Handler that reaches the file's path through a libsubmit channel, eg. on the
+    login node of a remote site. Channels without pull_file, like LocalChannel, are
+    on this host, and the file is pushed to the local directory instead.
+    '''
+
+    def __init__ (self, channel):
+        self.channel = channel
+
+    def _rename(self, path, local_path):
+        if path != local_path:
+            os.replace(path, local_path)
+
+    def stage_in(self, file_obj, local_path):
+        local_dir = os.path.dirname(local_path)
+        if hasattr(self.channel, 'pull_file'):
+            path = self.channel.pull_file(file_obj.path, local_dir)
+        else:
+            path = self.channel.push_file(file_obj.path, local_dir)
+        self._rename(path, local_path)
+        return os.path.getsize(local_path)
+
+    def stage_out(self, file_obj, local_path):
+        # Channels copy the file under its own name, which is the url's basename
+        self.channel.push_file(local_path, os.path.dirname(file_obj.path))
+        return os.path.getsize(local_path)
+
+    def stat(self, file_obj):
+        retcode, stdout, stderr = self.channel.execute_wait("stat -L -c '%s %Y %i' {0}".format(
+            shlex.quote(file_obj.path)), 10)
+        fields = tuple(stdout.split())
+        if retcode != 0 or len(fields) != 3:
+            return None
+        return fields
+
+
+_handlers = {'file' : FileHandler()}
+
+
+def register_handler(protocol, handler):
+    ''' Use handler for the files of protocol, replacing any handler registered before
+    '''
+    _handlers[protocol] = handler
+
+
+def get_handler(protocol):
+    ''' Handler registered for protocol
+
+    Raises:
+         - FileStagingError : If there is none
+    '''
+    try:
+        return _handlers[protocol]
+    except KeyError:
+        raise FileStagingError("No staging handler for protocol {0}".format(protocol), [])
+
+
+def _staged_files(files):
+    return [f for f in files if getattr(f, 'staged', False)]
+
+
+def needs_staging(kwargs):
+    ''' Whether any of the files in the task's inputs or outputs are staged
+    '''
+    return bool(_staged_files(kwargs.get('inputs', [])) or _staged_files(kwargs.get('outputs', [])))
+
+
+def _gather(futs, callback):
+    ''' Call callback once all of futs are done, at once if futs is empty
+    '''
+    if not futs:
+        callback()
+        return
+
+    remaining = [len(futs)]
+    lock = threading.Lock()
+
+    def done(fut):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            callback()
+
+    for fut in futs:
+        fut.add_done_callback(done)
+
+
+class StagingEngine(object):
+    ''' Stages the files of tasks in and out on a pool of transfer threads.
+    '''
+
+    def __init__ (self, staging_dir, threads=STAGING_THREADS):
+        ''' Create the engine, the transfer threads start on first use
+
+        Args:
+             - staging_dir (string) : Directory the tasks' directories are made in
+
+        KWargs:
+             - threads (int) : Transfers run at once. Default: 8
+        '''
+
+        self.staging_dir = os.path.abspath(staging_dir)
+        self.threads = threads
+        # task_id -> {'bytes_in', 'bytes_out', 'stage_in_time', 'stage_out_time'}
+        self.metrics = {}
+        self.bytes_moved = 0
+        self.transfer_time = 0.0
+        self._lock = threading.Lock()
+        self._pool = cf.ThreadPoolExecutor(max_workers=threads)
+
+    def _task_dir(self, task_id):
+        return os.path.join(self.staging_dir, "task_{0}".format(task_id))
+
+    def _transfer(self, task_id, fn, file_obj, key):
+        start = time.time()
+        try:
+            nbytes = fn()
+        except FileStagingError:
+            raise
+        except Exception as e:
+            raise FileStagingError("Staging {0} failed : {1}".format(file_obj.url, e), [file_obj])
+
+        with self._lock:
+            self.metrics[task_id][key] += nbytes
+            self.bytes_moved += nbytes
+            self.transfer_time += time.time() - start
+        return nbytes
+
+    def _phase(self, task_id, files, stage, key, then):
+        ''' Transfer files in parallel, then call then(error) once all are done
+        '''
+        start = time.time()
+        futs = [self._pool.submit(self._transfer, task_id, stage(f), f, 'bytes_' + key) for f in files]
+
+        def finished():
+            with self._lock:
+                self.metrics[task_id]['stage_{0}_time'.format(key)] = time.time() - start
+            errors = [fut.exception() for fut in futs if fut.exception()]
+            then(errors[0] if errors else None)
+
+        _gather(futs, finished)
+
+    def launch(self, task_id, submit, args, kwargs):
+        ''' Stage in the task's files, submit the task and stage out its outputs
+
+        Args:
+             - task_id : Id of the task
+             - submit (callable) : Called with args and the kwargs holding the task's copies
+               of the files, returns the executor's future
+             - args (list) : Positional args of the task
+             - kwargs (dict) : Kwargs of the task, with the inputs and outputs lists
+
+        Returns:
+             - Future, done once the outputs are staged out, with the executor future's
+               result or exception, or a FileStagingError
+        '''
+
+        fut = cf.Future()
+        task_dir = self._task_dir(task_id)
+        with self._lock:
+            self.metrics[task_id] = {'bytes_in' : 0, 'bytes_out' : 0,
+                                     'stage_in_time' : 0.0, 'stage_out_time' : 0.0}
+
+        # The task gets its own File objects, others may hold the user's. Each file
+        # keeps its name in a directory of its own, files may share a basename
+        def localize(key, files):
+            local = []
+            for i, f in enumerate(files):
+                if getattr(f, 'staged', False):
+                    f = copy.copy(f)
+                    f.local_path = os.path.join(task_dir, key, str(i), os.path.basename(f.path))
+                local.append(f)
+            return local
+
+        kwargs = dict(kwargs)
+        inputs = localize('inputs', kwargs.get('inputs', []))
+        outputs = localize('outputs', kwargs.get('outputs', []))
+        for key, files in (('inputs', inputs), ('outputs', outputs)):
+            if key in kwargs:
+                kwargs[key] = files
+        try:
+            for f in _staged_files(inputs) + _staged_files(outputs):
+                os.makedirs(os.path.dirname(f.local_path), exist_ok=True)
+        except OSError as e:
+            fut.set_exception(FileStagingError("Cannot create {0} : {1}".format(task_dir, e), []))
+            return fut
+
+        def finish(result=None, error=None):
+            shutil.rmtree(task_dir, ignore_errors=True)
+            metrics = self.metrics[task_id]
+            logger.debug("Task[%s] staged in %s bytes in %.3fs, out %s bytes in %.3fs", task_id,
+                         metrics['bytes_in'], metrics['stage_in_time'],
+                         metrics['bytes_out'], metrics['stage_out_time'])
+            if error:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+        def ran(exec_fu):
+            if exec_fu.exception():
+                finish(error=exec_fu.exception())
+                return
+            result = exec_fu.result()
+            self._phase(task_id, _staged_files(outputs), lambda f: f.stage_out, 'out',
+                        lambda error: finish(result, error))
+
+        def staged_in(error):
+            if error:
+                finish(error=error)
+                return
+            try:
+                exec_fu = submit(*args, **kwargs)
+            except Exception as e:
+                finish(error=e)
+                return
+            exec_fu.add_done_callback(ran)
+
+        self._phase(task_id, _staged_files(inputs), lambda f: f.stage_in, 'in', staged_in)
+        return fut
+
+    def shutdown(self):
+        ''' Stop the transfer threads once the queued transfers are done
+        '''
+        self._pool.shutdown(wait=False)
@@ -58,7 +58,10 @@ def update_config (config, rundir):
                     "globals" : {
                         "lazyErrors" : False,
                         "usageTracking" : True,
-                        "strategy" : "simple"
+                        "strategy" : "simple",
+                        "siteThreads" : 8,
+                        "stagingThreads" : 8,
+                        "cacheMaxBytes" : 10*1024*1024*1024
                     },
                     "controller" : {
                         "mode" : "auto"
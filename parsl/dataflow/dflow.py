@@ -18,12 +18,15 @@ Here's a simplified diagram of what happens internally::
                      |        Ex_Fu<------+----|
 '''
 
+import os
 import copy
+import time
 import uuid
 import logging
 import atexit
 import signal
 import random
+import threading
 from inspect import signature
 from concurrent.futures import Future
 from functools import partial
@@ -36,6 +39,12 @@ from parsl.dataflow.flow_control import FlowControl, FlowNoControl
 from parsl.dataflow.usage_tracking.usage import UsageTracker
 from parsl.dataflow.config_defaults import update_config
 from parsl.app.futures import DataFuture
+from parsl.data_provider.staging import StagingEngine, needs_staging, STAGING_THREADS
+from parsl.data_provider.cache import set_max_bytes as set_cache_max_bytes, CACHE_MAX_BYTES
+from parsl.dataflow.freshness import FreshnessChecker
+from parsl.app.rusage import UsageStats
+from parsl.app import walltime
+from parsl.executors.object_store import ObjectRef
 from parsl.execution_provider.provider_factory import ExecProviderFactory as EPF
 
 #from parsl.dataflow.start_controller import Controller
@@ -79,6 +88,15 @@ class DataFlowKernel(object):
             # Create the executors
             epf = EPF()
             self.executors = epf.make(self.rundir, self._config)
+            for site, delta in epf.timings.items():
+                controller = getattr(self.executors[site], 'controller', None)
+                if controller and controller.ready_after is not None:
+                    logger.info("Site %s started in %.3fs, controller ready in %.3fs",
+                                site, delta, controller.ready_after)
+                else:
+                    logger.info("Site %s started in %.3fs", site, delta)
+            for site, error in epf.failures.items():
+                logger.error("Site %s failed to start and is not used : %s", site, error)
 
             # set global vars from config
             self.lazy_fail = self._config["globals"].get("lazyFail", lazy_fail)
@@ -92,9 +110,21 @@ class DataFlowKernel(object):
             print("Executors : ", self.executors)
             self.flowcontrol  = FlowNoControl(self, None)
 
+        staging_threads = STAGING_THREADS
+        if self._config:
+            staging_threads = self._config["globals"].get("stagingThreads", STAGING_THREADS)
+            set_cache_max_bytes(self._config["globals"].get("cacheMaxBytes", CACHE_MAX_BYTES))
+        self.staging = StagingEngine(os.path.join(self.rundir, "staging"), threads=staging_threads)
+        self.freshness = FreshnessChecker()
+        # Resource usage of the finished tasks per app, see parsl.app.rusage
+        self.usage_stats = UsageStats()
+        # Apps run here on threads, their walltime is only enforced in worker processes
+        walltime.mark_client()
+
         self.task_count      = 0
         self.fut_task_lookup = {}
         self.tasks           = {}
+        self._ref_lock       = threading.Lock()
 
 
         logger.debug("Using executors: {0}".format(self.executors))
@@ -134,6 +164,8 @@ class DataFlowKernel(object):
         '''
         if future.done():
 
+            self._release_deps(task_id)
+
             # Untested
             if not self.lazy_fail:
                 # Fail early
@@ -148,6 +180,21 @@ class DataFlowKernel(object):
             logger.debug("Task[%s]: COMPLETED with %s", task_id, future)
             self.tasks[task_id]['status'] = States.done
 
+            task = self.tasks[task_id]
+            usage = None
+            if not future.cancelled():
+                usage = getattr(future.exception() or future.result(), 'usage', None)
+            if usage:
+                task['usage'] = usage
+                self.usage_stats.add(task['func_name'], usage)
+
+            if task_id in self.freshness.skipped:
+                task['fresh'] = True
+            elif 'time_launched' in task:
+                self.flowcontrol.task_done(task['func_name'], task['site'],
+                                           time.time() - task['time_launched'])
+            self.flowcontrol.notify(task_id)
+
         # Identify tasks that have resolved dependencies and launch
         for tid in list(self.tasks):
             # Skip all non-pending tasks
@@ -176,6 +223,7 @@ class DataFlowKernel(object):
                     logger.debug("Task[%s]: Deferring Task due to dependency failure", tid)
                     # Raise a dependency exception
                     self.tasks[tid]['status'] = States.dep_fail
+                    self._release_deps(tid)
                     try:
                         fu = Future()
                         self.tasks[tid]['exec_fu'] = fu
@@ -192,6 +240,16 @@ class DataFlowKernel(object):
         return
 
 
+    def app_usage(self):
+        ''' Resource usage of the finished tasks, aggregated per app. Use it to size
+        blocks and set taskBlocks from what tasks really use.
+
+        Returns:
+             - {app name : {'count', totals and 'mean_' means of wall_time, user_time,
+               system_time, read_blocks and write_blocks, 'max_wall_time', 'max_rss'}}
+        '''
+        return self.usage_stats.summary()
+
     def write_status_log(self):
         ''' Write status log.
 
@@ -273,21 +331,53 @@ class DataFlowKernel(object):
             site, executor = random.choice(list(self.executors.items()))
 
         elif isinstance(target_sites, list) :
+            # Sites that failed to start have no executor, see ExecProviderFactory.make
+            available = [site for site in target_sites if site in self.executors]
+            if not available:
+                logger.error("Task[%s]: none of the requested sites %s is available", task_id, target_sites)
+                return self._fail_launch(task_id, SiteUnavailable(task_id, target_sites,
+                                                                  "not among the started sites {0}".format(
+                                                                      list(self.executors))))
             # Pick a random site from user specified list
-            try :
-                site = random.choice(target_sites)
-                executor = self.executors[site]
+            site = random.choice(available)
+            executor = self.executors[site]
 
-            except Exception as e:
-                logger.error("Task[%s]: requests invalid site [%s]" % task_id, target_sites)
         else:
-            logger.error("App[%s]: sites defined is invalid, neither str|list" % self.tasks[task_id]['func'].__name__)
-
-        exec_fu = executor.submit(executable, *args, **kwargs)
+            logger.error("App[%s]: sites defined is invalid, neither str|list", task_name)
+            return self._fail_launch(task_id, SiteUnavailable(task_id, target_sites,
+                                                              "sites must be 'all' or a list of site names"))
+
+        self.tasks[task_id]['site'] = site
+        self.tasks[task_id]['time_launched'] = time.time()
+
+        def submit():
+            if needs_staging(kwargs):
+                # The returned future is done once the outputs are staged out
+                exec_fu = self.staging.launch(task_id, partial(executor.submit, executable), args, kwargs)
+                self.tasks[task_id]['staging'] = self.staging.metrics[task_id]
+                return exec_fu
+            return executor.submit(executable, *args, **kwargs)
+
+        skip_if_fresh = self.tasks[task_id]['skip_if_fresh']
+        if skip_if_fresh:
+            # Resolves to 0 without reaching the executor if the outputs are up to date
+            exec_fu = self.freshness.launch(task_id, submit, kwargs, checksum=skip_if_fresh == 'checksum')
+        else:
+            exec_fu = submit()
         exec_fu.add_done_callback(partial(self.handle_update, task_id))
         logger.debug("Task[%s] launched on executor:%s" %(task_id, executor))
         return exec_fu
 
+    def _fail_launch(self, task_id, exception):
+        ''' Fail a task that cannot be launched. Returns a future holding exception,
+        which is handled like the future of a task that failed in an executor.
+        '''
+        self.tasks[task_id]['site'] = None
+        exec_fu = Future()
+        exec_fu.add_done_callback(partial(self.handle_update, task_id))
+        exec_fu.set_exception(exception)
+        return exec_fu
+
     @staticmethod
     def _count_all_deps(task_id, args, kwargs):
         ''' Internal. Count the number of unresolved futures in the list depends
@@ -328,6 +418,44 @@ class DataFlowKernel(object):
         #logger.debug("Task:{0}   dep_cnt:{1}  deps:{2}".format(task_id, count, depends))
         return count, depends
 
+    def _hold_deps(self, depends):
+        ''' Internal. Count a new consumer on each AppFuture in depends, so that results
+        held by reference stay on the worker till the consumer is done.
+        '''
+
+        with self._ref_lock:
+            for dep in depends:
+                if isinstance(dep, AppFuture):
+                    dep._consumers += 1
+
+    def _release_deps(self, task_id):
+        ''' Internal. Drop the task's hold on its dependencies, and release results held
+        by reference that no pending task needs anymore.
+        '''
+
+        for dep in self.tasks[task_id]['depends']:
+            if not isinstance(dep, AppFuture):
+                continue
+
+            with self._ref_lock:
+                dep._consumers -= 1
+                last = dep._consumers == 0
+
+            if last and dep.done() and not dep.exception():
+                ref = dep.reference()
+                if isinstance(ref, ObjectRef):
+                    ref.release()
+
+    @staticmethod
+    def _dep_result(dep):
+        ''' Internal. Result of the future dep, leaving results held by reference
+        as ObjectRefs for the executor to resolve.
+        '''
+
+        if isinstance(dep, AppFuture):
+            return dep.reference()
+        return dep.result()
+
     @staticmethod
     def sanitize_and_wrap(task_id, args, kwargs):
         ''' This function should be called **ONLY** when all the futures we track
@@ -352,7 +480,7 @@ class DataFlowKernel(object):
         for dep in args :
             if isinstance(dep, Future) or issubclass(type(dep), Future):
                 try :
-                    new_args.extend([dep.result()])
+                    new_args.extend([DataFlowKernel._dep_result(dep)])
                 except Exception as e:
                     dep_failures.extend([e])
             else:
@@ -363,7 +491,7 @@ class DataFlowKernel(object):
             dep = kwargs[key]
             if isinstance(dep, Future) or issubclass(type(dep), Future):
                 try :
-                    kwargs[key] = dep.result()
+                    kwargs[key] = DataFlowKernel._dep_result(dep)
                 except Exception as e:
                     dep_failures.extend([e])
 
@@ -373,7 +501,7 @@ class DataFlowKernel(object):
             for dep in kwargs['inputs']:
                 if isinstance(dep, Future) or issubclass(type(dep), Future):
                     try :
-                        new_inputs.extend([dep.result()])
+                        new_inputs.extend([DataFlowKernel._dep_result(dep)])
                     except Exception as e:
                         dep_failures.extend([e])
 
@@ -384,7 +512,7 @@ class DataFlowKernel(object):
         return new_args, kwargs, dep_failures
 
 
-    def submit (self, func, *args, parsl_sites='all', **kwargs):
+    def submit (self, func, *args, parsl_sites='all', parsl_skip_if_fresh=False, **kwargs):
         ''' Add task to the dataflow system.
 
         Args:
@@ -394,7 +522,9 @@ class DataFlowKernel(object):
         KWargs :
              Standard kwargs to the func as provided by the user
              parsl_sites : List of sites as defined in the config, Default :'all'
-             This is the only kwarg that is passed in by the app definition.
+             parsl_skip_if_fresh : True or 'checksum' to resolve the task without running
+             it if its outputs are up to date, see parsl.dataflow.freshness. Default: False
+             These kwargs are passed in by the app definition.
 
         If all deps are met :
               send to the runnable queue
@@ -414,6 +544,7 @@ class DataFlowKernel(object):
 
         task_def = { 'depends'    : depends,
                      'sites'      : parsl_sites,
+                     'skip_if_fresh' : parsl_skip_if_fresh,
                      'func'       : func,
                      'func_name'  : func.__name__,
                      'args'       : args,
@@ -429,6 +560,8 @@ class DataFlowKernel(object):
         else:
             self.tasks[task_id] = task_def
 
+        self._hold_deps(depends)
+
         # Extract stdout and stderr to pass to AppFuture:
         task_stdout = kwargs.get('stdout', None)
         task_stderr = kwargs.get('stderr', None)
@@ -437,12 +570,13 @@ class DataFlowKernel(object):
             # Set to running
             new_args, kwargs, exceptions = self.sanitize_and_wrap(task_id, args, kwargs)
             if not exceptions:
+                # Set before launching, a task can be done by the time launch_task returns
+                self.tasks[task_id]['status']  = States.running
                 self.tasks[task_id]['exec_fu'] = self.launch_task(task_id, func, *new_args, **kwargs)
                 self.tasks[task_id]['app_fu']  = AppFuture(self.tasks[task_id]['exec_fu'],
                                                            tid=task_id,
                                                            stdout=task_stdout,
                                                            stderr=task_stderr)
-                self.tasks[task_id]['status']  = States.running
             else:
                 self.tasks[task_id]['exec_fu'] = None
                 app_fu = AppFuture(self.tasks[task_id]['exec_fu'],
@@ -454,6 +588,7 @@ class DataFlowKernel(object):
                                                      None))
                 self.tasks[task_id]['app_fu']  = app_fu
                 self.tasks[task_id]['status']  = States.dep_fail
+                self._release_deps(task_id)
         else:
             # Send to pending, create the AppFuture with no parent and have it set
             # when an executor future is available.
@@ -462,6 +597,8 @@ class DataFlowKernel(object):
                                                        stderr=task_stderr)
             self.tasks[task_id]['status']  = States.pending
 
+        self.flowcontrol.notify(task_id)
+
         logger.debug("Task:%s Launched with AppFut:%s", task_id, task_def['app_fu'])
         return task_def['app_fu']
 
@@ -480,15 +617,33 @@ class DataFlowKernel(object):
 
         # Send final stats
         self.usage_tracker.send_message()
+        for app, usage in self.app_usage().items():
+            logger.info("App %s : %s tasks, mean wall %.3fs, mean cpu %.3fs, max rss %s bytes", app,
+                        usage['count'], usage['mean_wall_time'],
+                        usage['mean_user_time'] + usage['mean_system_time'], usage['max_rss'])
+        self.staging.shutdown()
+        self.freshness.shutdown()
         # We do not need to cleanup if the executors are managed outside
         # the DFK
         if not self._executors_managed :
             return
 
+        # Stop the strategy before the blocks are cancelled under it
+        self.flowcontrol.close()
+
         for executor in self.executors.values() :
             if executor.scaling_enabled :
-                job_ids = executor.execution_provider.resources.keys()
-                executor.scale_in(len(job_ids))
+                # Scaling runs in the background, wait for the cancels to be issued
+                if getattr(executor, 'drain_blocks', False):
+                    # Cancel at once rather than wait up to drainTimeout for in-flight tasks
+                    cancelled = executor.scale_in(len(executor.status()), drain=False)
+                else:
+                    cancelled = executor.scale_in(len(executor.status()))
+                if isinstance(cancelled, Future):
+                    try:
+                        cancelled.result()
+                    except Exception as e:
+                        logger.error("Failed to cancel blocks : %s", e)
 
             # We are not doing shutdown here because even with block=False this blocks.
             executor.shutdown()
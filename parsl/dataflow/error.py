@@ -42,3 +42,23 @@ class DependencyError(DataFlowExceptions):
 
     def __str__ (self):
         return self.__repr__()
+
+class SiteUnavailable(DataFlowExceptions):
+    ''' None of the sites a task may run on is available, eg. they failed to start
+
+    Args:
+         - task_id: Identity of the task
+         - sites: The sites the task may run on
+         - reason (string)
+    '''
+
+    def __init__(self, task_id, sites, reason):
+        self.task_id = task_id
+        self.sites = sites
+        self.reason = reason
+
+    def __repr__ (self):
+        return "[{}] No site to run on, requested {} : {}".format(self.task_id, self.sites, self.reason)
+
+    def __str__ (self):
+        return self.__repr__()
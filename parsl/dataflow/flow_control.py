@@ -32,6 +32,11 @@ class FlowNoControl(object):
         '''
         pass
 
+    def task_done(self, app_name, sitename, runtime):
+        ''' This task_done fn does nothing
+        '''
+        pass
+
     def close(self):
         ''' This close fn does nothing
         '''
@@ -63,11 +68,12 @@ class FlowControl(object):
     Once a callback is triggered, the callback generally runs a strategy
     method on the sites available as well asqeuque
 
-
-    TODO : When the debug logs are enabled this module emits duplicate messages.
-    This issue needs more debugging. What I've learnt so far is that the duplicate
-    messages are present only when the timer thread is started, so this could be
-    from a duplicate logger being added by the thread.
+    The DFK notifies an event for every task submitted and every task completed.
+    The timer thread sleeps on a condition variable, and notify wakes it once
+    THRESHOLD events have built up, so a burst is acted on within milliseconds
+    while an idle workflow costs one callback per INTERVAL. Callbacks only ever run
+    on the timer thread, one at a time. Events arriving while a callback runs are
+    coalesced into the next one.
 
     '''
 
@@ -94,43 +100,67 @@ class FlowControl(object):
         self._event_count = 0
         self._event_buffer = []
         self._wake_up_time = time.time() + 1
+        self._cv = threading.Condition()
+        self._closed = False
         self._thread = threading.Thread(target=self._wake_up_timer)
         self._thread.daemon = True
         self._thread.start()
 
     def _wake_up_timer(self):
 
-        # Sleep till time to wake up
         while True:
-            prev = self._wake_up_time
-            time.sleep(prev - time.time())
-            if prev == self._wake_up_time:
-                self.make_callback(kind='timer')
-            else:
-                print("Sleeping a bit more")
+            with self._cv:
+                # Sleep till the timer expires or enough events have built up
+                while not self._closed and self._event_count < self.threshold:
+                    remaining = self._wake_up_time - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cv.wait(remaining)
+
+                if self._closed:
+                    return
+
+                kind = 'event' if self._event_count >= self.threshold else 'timer'
+                tasks = self._event_buffer
+                self._event_buffer = []
+                self._event_count = 0
+                self._wake_up_time = time.time() + self.interval
+
+            try:
+                self.callback(tasks=tasks, kind=kind)
+            except Exception as e:
+                logger.error("Flow control callback failed : %s", e)
 
     def notify(self, event_id):
         ''' Let the FlowControl system know that there's an event
         '''
 
-        self._event_buffer.extend([event_id])
-        self._event_count += 1
-        if self._event_count >= self.threshold :
-            logger.debug("Eventcount >= threshold")
-            self.make_callback(kind="event")
+        with self._cv:
+            self._event_buffer.append(event_id)
+            self._event_count += 1
+            if self._event_count == self.threshold :
+                logger.debug("Eventcount >= threshold")
+                self._cv.notify()
 
+    def task_done(self, app_name, sitename, runtime):
+        ''' Pass the runtime of a completed task on to the strategy
+        '''
+        self.strategy.record_task(app_name, sitename, runtime)
 
     def make_callback(self, kind=None):
-        ''' Makes the callback and resets the timer.
+        ''' Expires the timer, so the callback runs on the timer thread right away.
         '''
-        self._wake_up_time = time.time() + self.interval
-        self.callback(tasks=self._event_buffer, kind=kind)
-        self._event_buffer = []
+        with self._cv:
+            self._wake_up_time = time.time()
+            self._cv.notify()
 
 
     def close(self):
         ''' Merge the threads and terminate.
         '''
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
         self._thread.join()
 
 
@@ -0,0 +1,234 @@
+''' Skipping bash apps whose outputs are up to date.
+
+With skip_if_fresh set on a bash app, the DataFlowKernel checks the task's input
+and output files before launching it, the way make does. If every output exists
+and none is older than any input, the task is not sent to an executor and its
+AppFuture resolves to 0, the exit code of a bash app that succeeded.
+
+With skip_if_fresh='checksum', a task whose outputs are older than its inputs is
+skipped too if its inputs and outputs still have the checksums recorded when it
+last ran, eg. after a checkout touched the files without changing them. The record
+is written next to the first output, as .<name>.parsl-fresh, after each run that
+succeeded.
+
+Only files on this host are checked: strings and File objects of the file protocol.
+A task with no outputs, with a File of another protocol, or with a missing input
+is always launched.
+
+Checks run on one thread, which takes every check queued since its last pass
+and stats each distinct path once for all of them. Inputs are only stat'ed for
+tasks whose outputs all exist. A fan in of many tasks over the same inputs so
+costs one stat per file rather than one per task and file.
+'''
+
+import os
+import json
+import queue
+import hashlib
+import logging
+import threading
+import collections
+import concurrent.futures as cf
+
+from parsl.data_provider.files import File
+
+logger = logging.getLogger(__name__)
+
+RECORD_SUFFIX = '.parsl-fresh'
+
+Check = collections.namedtuple('Check', ['task_id', 'submit', 'inputs', 'outputs', 'checksum', 'fut'])
+
+
+def local_paths(files):
+    ''' Absolute paths of the files on this host in files, skipping items that are not
+    files. None if a File of another protocol is in files.
+    '''
+    paths = []
+    for f in files:
+        if isinstance(f, File):
+            if f.protocol != 'file':
+                return None
+            paths.append(os.path.abspath(f.path))
+        elif isinstance(f, str):
+            paths.append(os.path.abspath(f))
+    return paths
+
+
+def checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def record_path(outputs):
+    ''' Path of the checksum record of a task with outputs
+    '''
+    dirname, name = os.path.split(outputs[0])
+    return os.path.join(dirname, '.' + name + RECORD_SUFFIX)
+
+
+class FreshnessChecker(object):
+    ''' Checks tasks' files in batches, and launches the tasks that are not up to date.
+    '''
+
+    def __init__ (self):
+        # Ids of the tasks that were skipped
+        self.skipped = set()
+        self.checks = 0
+        self.stat_calls = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def launch(self, task_id, submit, kwargs, checksum=False):
+        ''' Launch the task unless its outputs are up to date
+
+        Args:
+             - task_id : Id of the task
+             - submit (callable) : Called with no args to launch the task, returns the
+               executor's future
+             - kwargs (dict) : Kwargs of the task, with the inputs and outputs lists
+
+        KWargs:
+             - checksum (Bool) : Also skip the task if its files match the recorded checksums
+
+        Returns:
+             - Future, resolves to 0 if the task was skipped, else to the result of the future
+               returned by submit
+        '''
+
+        fut = cf.Future()
+        inputs = local_paths(kwargs.get('inputs', []))
+        outputs = local_paths(kwargs.get('outputs', []))
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="Freshness-Checker")
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put(('check', Check(task_id, submit, inputs, outputs, checksum, fut)))
+        return fut
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while True:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            checks = [item for kind, item in batch if kind == 'check']
+            records = [item for kind, item in batch if kind == 'record']
+            try:
+                for check, result in records:
+                    self._record(check, result)
+                if checks:
+                    self._check(checks)
+            except Exception as e:
+                # Nothing may be left waiting on this thread
+                logger.exception("Freshness checks failed : %s", e)
+                for check in checks + [check for check, result in records]:
+                    if not check.fut.done():
+                        check.fut.set_exception(e)
+
+            if ('stop', None) in batch:
+                return
+
+    def _stat(self, paths, mtimes):
+        ''' Add the mtime of each path not in mtimes yet, None if it is missing
+        '''
+        for path in paths:
+            if path in mtimes:
+                continue
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+            self.stat_calls += 1
+
+    def _check(self, checks):
+        self.checks += len(checks)
+        checkable = [check for check in checks if check.inputs is not None and check.outputs]
+
+        mtimes = {}
+        for check in checkable:
+            self._stat(check.outputs, mtimes)
+        complete = [check for check in checkable if None not in (mtimes[path] for path in check.outputs)]
+        for check in complete:
+            self._stat(check.inputs, mtimes)
+
+        fresh = set()
+        for check in complete:
+            inputs = [mtimes[path] for path in check.inputs]
+            if None in inputs:
+                continue
+            oldest = min(mtimes[path] for path in check.outputs)
+            if not inputs or max(inputs) <= oldest or (check.checksum and self._matches_record(check)):
+                fresh.add(check.task_id)
+
+        logger.debug("Checked %s tasks with %s stats, %s up to date", len(checks), len(mtimes), len(fresh))
+        for check in checks:
+            if check.task_id in fresh:
+                logger.debug("Task[%s] outputs are up to date, skipping it", check.task_id)
+                self.skipped.add(check.task_id)
+                check.fut.set_result(0)
+            else:
+                self._submit(check)
+
+    def _submit(self, check):
+        try:
+            exec_fu = check.submit()
+        except Exception as e:
+            check.fut.set_exception(e)
+            return
+
+        def ran(exec_fu):
+            if exec_fu.exception():
+                check.fut.set_exception(exec_fu.exception())
+            elif check.checksum and check.outputs and check.inputs is not None:
+                # Hashing the files must not hold up the executor's thread
+                self._queue.put(('record', (check, exec_fu.result())))
+            else:
+                check.fut.set_result(exec_fu.result())
+
+        exec_fu.add_done_callback(ran)
+
+    def _matches_record(self, check):
+        try:
+            with open(record_path(check.outputs)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if sorted(record.get('inputs', {})) != sorted(check.inputs) or \
+           sorted(record.get('outputs', {})) != sorted(check.outputs):
+            return False
+
+        try:
+            return all(checksum(path) == digest
+                       for files in (record['inputs'], record['outputs'])
+                       for path, digest in files.items())
+        except OSError:
+            return False
+
+    def _record(self, check, result):
+        path = record_path(check.outputs)
+        try:
+            record = {'inputs' : {path : checksum(path) for path in check.inputs},
+                      'outputs' : {path : checksum(path) for path in check.outputs}}
+            tmp = "{0}.{1}".format(path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(record, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Task[%s] checksums could not be recorded in %s : %s", check.task_id, path, e)
+        check.fut.set_result(result)
+
+    def shutdown(self):
+        ''' Stop the checker thread once the queued checks are done
+        '''
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(('stop', None))
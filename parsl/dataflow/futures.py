@@ -10,6 +10,8 @@
 from concurrent.futures import Future
 import logging
 from parsl.dataflow.error import *
+from parsl.executors.object_store import ObjectRef
+from parsl.app.rusage import Measured
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +38,8 @@ class AppFuture(Future):
     We are simply wrapping a AppFuture, and adding the specific case where, if the future
     is resolved i.e file exists, then the DataFuture is assumed to be resolved.
 
+    If the executor returned the result by reference (see :mod:`parsl.executors.object_store`),
+    result() fetches the object from the worker, and reference() returns the ObjectRef.
     """
     def parent_callback(self, executor_fu):
         ''' Callback from executor future to update the parent.
@@ -75,8 +79,12 @@ class AppFuture(Future):
         #if self.parent:
         #    parent.add_done_callback(self.parent_callback)
         self._outputs = []
+        # Outputs with the glob and directory outputs replaced by the files they matched
+        self._matched_outputs = None
         self._stdout  = stdout
         self._stderr  = stderr
+        # Count of pending tasks that take this future as an input, kept by the DFK
+        self._consumers = 0
 
 
     @property
@@ -87,6 +95,37 @@ class AppFuture(Future):
     def stderr(self):
         return self._stderr
 
+    def _captured(self, name):
+        if not self.done():
+            return None
+        source = self.exception() or self.reference()
+        captured = getattr(source, name, None)
+        return captured.text() if captured is not None else None
+
+    @property
+    def usage(self):
+        ''' Resource usage of the task once it is done, see parsl.app.rusage. None if it
+        was not measured, eg. the task was skipped or failed before it ran, or it has
+        not been launched yet
+        '''
+        if self.parent is None or not self.done():
+            return None
+        source = self.parent.exception() or self.parent.result()
+        return getattr(source, 'usage', None)
+
+    @property
+    def stdout_data(self):
+        ''' Stdout of a bash app run with stdout=parsl.CAPTURE, once it is done, also
+        if it failed with an exit code. None if it was not captured
+        '''
+        return self._captured('stdout_data')
+
+    @property
+    def stderr_data(self):
+        ''' Stderr of a bash app run with stderr=parsl.CAPTURE, see stdout_data
+        '''
+        return self._captured('stderr_data')
+
     @property
     def tid(self):
         return self._tid
@@ -99,15 +138,35 @@ class AppFuture(Future):
         self.parent = fut
         fut.add_done_callback(self.parent_callback)
 
-    def result(self, timeout=None):
+    def reference(self, timeout=None):
+        ''' Same as result(), except that results held by reference are returned as
+        an ObjectRef, without fetching them from the worker.
+        '''
 
         if self.parent :
             x = self.parent._exception
             if x :
                 raise x
-            return self.parent.result(timeout=timeout)
+            result = self.parent.result(timeout=timeout)
         else:
-            return super().result(timeout=timeout)
+            result = super().result(timeout=timeout)
+
+        # Python apps return their result with the resource usage of the call
+        if isinstance(result, Measured):
+            return result.result
+        return result
+
+    def result(self, timeout=None):
+
+        result = self.reference(timeout=timeout)
+        if isinstance(result, ObjectRef):
+            value = result.materialize(timeout=timeout)
+            # The client holds the value now, the worker copy is only needed by dependents
+            if self._consumers == 0:
+                result.release()
+            return value
+
+        return result
 
     def cancel(self):
         if self.parent:
@@ -156,7 +215,32 @@ class AppFuture(Future):
 
     @property
     def outputs(self):
-        return self._outputs
+        ''' DataFutures of the app's outputs. Once a bash app is done, each of its glob
+        or directory outputs is replaced by a DataFuture for every file it matched.
+        '''
+        if self._matched_outputs is not None:
+            return self._matched_outputs
+        if not self.done() or self.exception():
+            return self._outputs
+
+        matched = getattr(self.reference(), 'outputs', None)
+        if matched is None:
+            return self._outputs
+
+        from parsl.app.futures import DataFuture
+        from parsl.data_provider.files import File
+
+        outputs = []
+        for data_fu, paths in zip(self._outputs, matched):
+            if paths is None:
+                outputs.append(data_fu)
+                continue
+            protocol = data_fu.file_obj.protocol
+            for path in paths:
+                file_obj = File(path if protocol == 'file' else "{0}://{1}".format(protocol, path))
+                outputs.append(DataFuture(self, file_obj, parent=self, tid=self.tid))
+        self._matched_outputs = outputs
+        return outputs
 
     def __repr__(self):
         if self.parent:
@@ -6,6 +6,9 @@ import math
 
 logger = logging.getLogger(__name__)
 
+# Weight of the latest observation in the runtime, app mix and arrival rate moving averages
+EWMA_ALPHA = 0.3
+
 class Strategy (object) :
     '''FlowControl Strategy
 
@@ -97,6 +100,26 @@ class Strategy (object) :
         |slot   slot|       |slot   slot|
         +-----------+       +-----------+
 
+    The 'predictive' strategy provisions ahead of demand rather than after queues
+    have built up. It keeps a moving average of runtime per app, of the mix of apps
+    completing on each site, of the task arrival rate at each site and of the time
+    blocks wait in the provider's queue. Blocks requested now are usable after the
+    queue wait, so that is the horizon demand is projected over:
+
+    .. code:: python
+
+          horizon = max(queue_wait, runtime)
+
+          slots = parallelism * (arrival_rate * runtime +
+                                 outstanding * runtime / horizon)
+
+          blocks = min(maxBlocks, max(minBlocks, ceil(slots / taskBlocks)))
+
+    The first term keeps up with tasks still arriving (Little's law), the second
+    drains the backlog within the horizon. Until runtimes are known, each
+    outstanding task and each task expected to arrive within the queue wait is
+    given a slot. Blocks are released once the target has stayed below the active
+    blocks for max_idletime.
     '''
 
     def __init__ (self, dfk):
@@ -107,12 +130,22 @@ class Strategy (object) :
         self.sites = {}
         self.max_idletime = 60*2 # 2 minutes
 
-        for site in self.dfk.config["sites"]:
-            self.sites[site['site']] = {'idle_since' : None,
-                                        'config'     : site }
+        # Moving average runtime per app name, fed by record_task
+        self.runtimes = {}
+        self._stats_lock = threading.Lock()
 
-        self.strategies = { None      : self._strategy_noop,
-                            'simple'  : self._strategy_simple }
+        for site in self.dfk.config["sites"]:
+            self.sites[site['site']] = {'idle_since'   : None,
+                                        'config'       : site,
+                                        'app_mix'      : {},
+                                        'arrival_rate' : 0.0,
+                                        'submitted'    : 0,
+                                        'last_tick'    : None,
+                                        'last_scale_out' : 0 }
+
+        self.strategies = { None         : self._strategy_noop,
+                            'simple'     : self._strategy_simple,
+                            'predictive' : self._strategy_predictive }
 
         strtgy_name = self.config['globals'].get('strategy', None)
         self.strategize = self.strategies.get(strtgy_name,
@@ -121,6 +154,61 @@ class Strategy (object) :
         logger.debug("Scaling strategy: {0}".format(strtgy_name))
 
 
+    def record_task (self, app_name, sitename, runtime):
+        ''' Record the runtime of a completed task
+
+        Args:
+             - app_name (string) : Name of the app function
+             - sitename (string) : Site the task ran on
+             - runtime (float) : Seconds from launch to completion
+        '''
+
+        with self._stats_lock:
+            prev = self.runtimes.get(app_name)
+            self.runtimes[app_name] = runtime if prev is None else prev + EWMA_ALPHA * (runtime - prev)
+
+            if sitename not in self.sites:
+                return
+            mix = self.sites[sitename]['app_mix']
+            for name in mix:
+                mix[name] *= (1 - EWMA_ALPHA)
+            mix[app_name] = mix.get(app_name, 0) + EWMA_ALPHA
+
+    def _site_runtime (self, sitename):
+        ''' Expected task runtime on a site, weighted by the apps recently completing there.
+        None if no task has completed yet.
+        '''
+
+        with self._stats_lock:
+            mix = self.sites[sitename]['app_mix']
+            total = sum(mix.values())
+            if not total:
+                return None
+            return sum(weight * self.runtimes[name] for name, weight in mix.items()) / total
+
+    def _arrival_rate (self, sitename, exc, now):
+        ''' Update and return the moving average of tasks per second submitted to a site
+        '''
+
+        site = self.sites[sitename]
+        submitted = exc.counters.submitted
+        if site['last_tick'] is not None and now > site['last_tick']:
+            rate = (submitted - site['submitted']) / (now - site['last_tick'])
+            site['arrival_rate'] += EWMA_ALPHA * (rate - site['arrival_rate'])
+        site['submitted'] = submitted
+        site['last_tick'] = now
+        return site['arrival_rate']
+
+    def _may_scale_in (self, sitename, now):
+        ''' Blocks are released only after the site has been idle, and has not needed
+        new blocks, for max_idletime. This keeps a block from being cancelled and
+        requested again within one window.
+        '''
+        site = self.sites[sitename]
+        return (site['idle_since'] is not None and
+                now - site['idle_since'] > self.max_idletime and
+                now - site['last_scale_out'] > self.max_idletime)
+
     def _strategy_noop (self, tasks, *args, kind=None, **kwargs):
         ''' Peek at the DFK and the sites specified,
 
@@ -154,8 +242,9 @@ class Strategy (object) :
                 logger.debug("Site:{0} Status:STATIC".format(sitename))
                 continue
 
-            # Tasks that are either pending completion
-            active_tasks = exc.executor.outstanding
+            # Tasks that are either pending completion, counted by the executor as
+            # they are submitted and completed
+            active_tasks = exc.outstanding
 
             # Get the status of the taskBlocks
             status = exc.status()
@@ -164,7 +253,8 @@ class Strategy (object) :
             minBlocks   = site_config["execution"]["block"]["minBlocks"]
             maxBlocks   = site_config["execution"]["block"]["maxBlocks"]
             initBlocks  = site_config["execution"]["block"]["initBlocks"]
-            taskBlocks  = site_config["execution"]["block"]["taskBlocks"]
+            # taskBlocks may be a bash expression, the executor reports the real count
+            taskBlocks  = exc.slots_per_block
             parallelism = site_config["execution"]["block"]["parallelism"]
 
             active_blocks = sum([1 for x in status if x in ('RUNNING',
@@ -175,13 +265,17 @@ class Strategy (object) :
             logger.debug("Min:{} initBlocks:{} Max:{}".format(minBlocks,
                                                               initBlocks,
                                                               maxBlocks))
-            logger.debug("Tasks:{} Slots:{} Parallelism:{}".format(len(active_tasks),
+            logger.debug("Tasks:{} Slots:{} Parallelism:{}".format(active_tasks,
                                                                    active_slots,
                                                                    parallelism))
 
+            # Any work restarts the idle timer
+            if active_tasks > 0 :
+                self.sites[sitename]['idle_since'] = None
+
             # Case 1
             # No tasks.
-            if len(active_tasks) == 0 :
+            if active_tasks == 0 :
                 # Case 1a
                 # Fewer blocks that minBlocks
                 if active_blocks <= minBlocks :
@@ -199,11 +293,12 @@ class Strategy (object) :
                         self.sites[sitename]['idle_since'] = time.time()
 
                     idle_since = self.sites[sitename]['idle_since']
-                    if (time.time() - idle_since) > self.max_idletime:
+                    if self._may_scale_in(sitename, time.time()):
                         # We have resources idle for the max duration,
                         # we have to scale_in now.
                         logger.debug("Strategy: Scale_in, tasks=0")
                         exc.scale_in(active_blocks - minBlocks)
+                        self.sites[sitename]['idle_since'] = None
 
                     else:
                         pass
@@ -211,7 +306,7 @@ class Strategy (object) :
 
             # Case 2
             # More tasks than the available slots.
-            elif (float(active_slots) / len(active_tasks)) < parallelism :
+            elif (float(active_slots) / active_tasks) < parallelism :
                 # Case 2a
                 # We have the max blocks possible
                 if active_blocks >= maxBlocks:
@@ -222,10 +317,11 @@ class Strategy (object) :
                 # Case 2b
                 else:
                     #logger.debug("Strategy: Case.2b")
-                    excess = math.ceil((len(active_tasks) * parallelism) - active_slots)
+                    excess = math.ceil((active_tasks * parallelism) - active_slots)
                     excess_blocks = math.ceil (float(excess) / taskBlocks)
                     logger.debug("Requesting : {}".format(excess_blocks))
                     exc.scale_out(excess_blocks)
+                    self.sites[sitename]['last_scale_out'] = time.time()
 
             # Case 3
             # tasks ~ slots
@@ -233,6 +329,69 @@ class Strategy (object) :
                 #logger.debug("Strategy: Case 3")
                 pass
 
+    def _strategy_predictive (self, tasks, *args, kind=None, **kwargs):
+        ''' Scale each site to the demand projected over the time new blocks take to
+        come up. See the class docstring for the model.
+        '''
+
+        now = time.time()
+
+        for sitename in self.dfk.executors :
+
+            exc = self.dfk.executors[sitename]
+            if not exc.scaling_enabled :
+                continue
+
+            site = self.sites[sitename]
+            block = site['config']["execution"]["block"]
+            minBlocks   = block["minBlocks"]
+            maxBlocks   = block["maxBlocks"]
+            parallelism = block["parallelism"]
+            taskBlocks  = exc.slots_per_block
+
+            arrival_rate = self._arrival_rate(sitename, exc, now)
+            outstanding  = exc.outstanding
+            runtime      = self._site_runtime(sitename)
+
+            provisioner = getattr(exc, 'provisioner', None)
+            queue_wait = provisioner.queue_wait if provisioner and provisioner.queue_wait else 0
+
+            status = exc.status()
+            active_blocks = sum([1 for x in status if x in ('RUNNING',
+                                                            'SUBMITTING',
+                                                            'PENDING')])
+
+            if runtime:
+                horizon = max(queue_wait, runtime)
+                slots = arrival_rate * runtime + outstanding * runtime / horizon
+            else:
+                slots = outstanding + arrival_rate * queue_wait
+
+            target = math.ceil(parallelism * slots / taskBlocks)
+            target = min(maxBlocks, max(minBlocks, target))
+
+            logger.debug("Site:{} Rate:{:.2f}/s Runtime:{} QueueWait:{:.1f}s Outstanding:{} "
+                         "Blocks:{} Target:{}".format(sitename, arrival_rate, runtime, queue_wait,
+                                                      outstanding, active_blocks, target))
+
+            if target > active_blocks :
+                site['idle_since'] = None
+                logger.debug("Strategy: Scale_out, requesting {}".format(target - active_blocks))
+                exc.scale_out(target - active_blocks)
+                site['last_scale_out'] = now
+
+            elif target < active_blocks :
+                # Hold on to blocks for max_idletime, demand may pick up again
+                if not site['idle_since']:
+                    site['idle_since'] = now
+                elif self._may_scale_in(sitename, now):
+                    logger.debug("Strategy: Scale_in, releasing {}".format(active_blocks - target))
+                    exc.scale_in(active_blocks - target)
+                    site['idle_since'] = None
+
+            else:
+                site['idle_since'] = None
+
 
 if __name__ == '__main__' :
 
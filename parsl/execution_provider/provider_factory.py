@@ -6,15 +6,21 @@ Centralize creation of execution providers and executors.
 
 import os
 import copy
+import time
 import logging
+import concurrent.futures as cf
 import libsubmit
 
 logger = logging.getLogger(__name__)
 
+# Default number of sites constructed at once
+SITE_THREADS = 8
+
 # Executors
 from parsl.executors.ipp import IPyParallelExecutor
 from parsl.executors.swift_t import TurbineExecutor
 from parsl.executors.threads import ThreadPoolExecutor
+from parsl.executors.zmq_executor import ZMQExecutor
 from parsl.execution_provider.errors import *
 
 # Controller
@@ -35,6 +41,7 @@ class ExecProviderFactory (object):
         self.executors = { 'ipp' : IPyParallelExecutor,
                            'swift_t' : TurbineExecutor,
                            'threads' : ThreadPoolExecutor,
+                           'zmq' : ZMQExecutor,
                            None : lambda *args, **kwargs : None }
 
         self.execution_providers = { 'slurm'  : Slurm,
@@ -50,6 +57,11 @@ class ExecProviderFactory (object):
                           'local' : LocalChannel,
                           None : lambda *args, **kwargs : None }
 
+        # Seconds spent constructing each site, and the errors of sites that
+        # failed to start, filled in by make
+        self.timings = {}
+        self.failures = {}
+
 
     def validate_config (self, config):
         ''' Validate_config validates config
@@ -63,76 +75,136 @@ class ExecProviderFactory (object):
         '''
         return True
 
-    def make (self, rundir, config):
-        ''' Construct the appropriate provider, executors and channels and link them together.
+    def start_controller (self, site, config):
+        ''' Start the ipcontroller for an ipp site. This does not wait for the
+        controller to come up, the executor does that.
         '''
 
-        self.rundir = rundir
-        sites = {}
+        logger.debug("Starting controller")
+        # A controller needs to be started per run
+        site["controller"] = copy.copy(config["controller"])
 
-        for site in config.get("sites"):
+        site["controller"]['ipythonDir'] = self.rundir
+        site["controller"]['profile']    = config["controller"].get('profile', site["site"])
 
-            logger.debug("Constructing site : %s ", site.get('site', 'Unnamed_site'))
-            channel_name = site["auth"]["channel"]
+        controller = Controller(**site["controller"])
+        logger.debug("Controller engine file : %s", controller.engine_file)
+        logger.debug("Controller client file : %s", controller.client_file)
+        return controller
 
-            if channel_name in self.channels:
-                channel_opts = site["auth"].copy()
-                if "channel" in channel_opts:
-                    del channel_opts["channel"]
-                channel = self.channels[channel_name](**channel_opts)
+    def make_site (self, site, controller=None):
+        ''' Construct the channel, provider and executor of a single site.
 
-            else:
-                logger.error("Site:{0} requests an invalid channel:{0}".format(site["site"],
-                                                                               channel_name))
-                raise BadConfig(site["site"],
-                                "invalid channel:{0} requested".format(channel_name))
+        Args:
+             - site (dict) : The config dict object for the site
 
-            logger.debug("Created channel : {0}".format(channel))
+        KWargs:
+             - controller (Controller) : The controller already started for an ipp site
 
-            provider_name = site["execution"]["provider"]
-            if provider_name in self.execution_providers:
-                provider = self.execution_providers[provider_name](site,
-                                                                   channel=channel)
+        Returns:
+             - The executor for the site
+        '''
 
-            else:
-                logger.error("Site:{0} requests an invalid provider:{0}".format(site["site"],
-                                                                                provider_name))
-                raise BadConfig(site["site"],
-                                "invalid provider:{0} requested".format(provider_name))
+        logger.debug("Constructing site : %s ", site.get('site', 'Unnamed_site'))
+        channel_name = site["auth"]["channel"]
 
-            logger.debug("Created execution_provider : {0}".format(provider))
+        if channel_name in self.channels:
+            channel_opts = site["auth"].copy()
+            if "channel" in channel_opts:
+                del channel_opts["channel"]
+            channel = self.channels[channel_name](**channel_opts)
 
-            executor_name = site["execution"]["executor"]
+        else:
+            logger.error("Site:{0} requests an invalid channel:{0}".format(site["site"],
+                                                                           channel_name))
+            raise BadConfig(site["site"],
+                            "invalid channel:{0} requested".format(channel_name))
 
-            if executor_name in self.executors :
+        logger.debug("Created channel : {0}".format(channel))
 
-                controller = None
+        provider_name = site["execution"]["provider"]
+        if provider_name in self.execution_providers:
+            provider = self.execution_providers[provider_name](site,
+                                                               channel=channel)
 
-                if executor_name == 'ipp' and config.get("controller", None):
+        else:
+            logger.error("Site:{0} requests an invalid provider:{0}".format(site["site"],
+                                                                            provider_name))
+            raise BadConfig(site["site"],
+                            "invalid provider:{0} requested".format(provider_name))
 
-                    logger.debug("Starting controller")
-                    # A controller needs to be started per run
-                    site["controller"] = copy.copy(config["controller"])
+        logger.debug("Created execution_provider : {0}".format(provider))
 
-                    site["controller"]['ipythonDir'] = self.rundir
-                    site["controller"]['profile']    = config["controller"].get('profile', site["site"])
+        executor_name = site["execution"]["executor"]
 
-                    controller = Controller(**site["controller"])
-                    logger.debug("Controller engine file : %s", controller.engine_file)
-                    logger.debug("Controller client file : %s", controller.client_file)
+        if executor_name in self.executors :
+            executor = self.executors[executor_name](execution_provider=provider,
+                                                     controller=controller,
+                                                     config=site)
 
-                executor = self.executors[executor_name](execution_provider=provider,
-                                                         controller=controller,
-                                                         config=site)
+        else:
+            logger.error("Site:{0} requests an invalid executor:{0}".format(site["site"],
+                                                                           executor_name))
+            raise BadConfig(site["site"],
+                            "invalid executor:{0} requested".format(executor_name))
 
-            else:
-                logger.error("Site:{0} requests an invalid executor:{0}".format(site["site"],
-                                                                               executor_name))
-                raise BadConfig(site["site"],
-                                "invalid executor:{0} requested".format(executor_name))
+        logger.debug("Created executor : {0}".format(executor))
+        return executor
 
-            logger.debug("Created executor : {0}".format(executor))
+    def _timed_make_site (self, site, controller):
+        start = time.time()
+        executor = self.make_site(site, controller)
+        return executor, time.time() - start
 
-            sites[site["site"]] = executor
+    def make (self, rundir, config):
+        ''' Construct the appropriate provider, executors and channels and link them together.
+
+        Sites are constructed concurrently on up to config["globals"]["siteThreads"]
+        threads, after the controllers of all ipp sites have been started. A site that
+        fails to start is logged, recorded in self.failures and skipped, unless every
+        site fails, in which case the first error is raised. Seconds spent on each site
+        are recorded in self.timings.
+
+        Returns:
+             - dict of executors keyed by site name, in config order
+        '''
+
+        self.rundir = rundir
+        self.timings = {}
+        self.failures = {}
+        site_configs = config.get("sites")
+        controllers = {}
+
+        for site in site_configs:
+            if site["execution"]["executor"] == 'ipp' and config.get("controller", None):
+                try:
+                    controllers[site["site"]] = self.start_controller(site, config)
+                except Exception as e:
+                    logger.error("Site:%s controller failed to start, skipping site : %s", site["site"], e)
+                    self.failures[site["site"]] = e
+
+        threads = config.get("globals", {}).get("siteThreads", SITE_THREADS)
+        threads = max(1, min(threads, len(site_configs)))
+
+        with cf.ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = {site["site"] : pool.submit(self._timed_make_site, site, controllers.get(site["site"]))
+                       for site in site_configs if site["site"] not in self.failures}
+
+        sites = {}
+        for site in site_configs:
+            name = site["site"]
+            if name in self.failures:
+                continue
+
+            try:
+                sites[name], self.timings[name] = futures[name].result()
+            except Exception as e:
+                logger.error("Site:%s failed to start, skipping site : %s", name, e)
+                self.failures[name] = e
+                if name in controllers:
+                    controllers[name].close()
+
+        if site_configs and not sites:
+            raise next(iter(self.failures.values()))
 
         return sites
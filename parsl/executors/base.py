@@ -1,5 +1,83 @@
+import threading
 from abc import ABCMeta, abstractmethod, abstractproperty
 
+# Providers that wrap the launch command in a launcher which runs taskBlocks copies
+# of it per block. Other providers run the launch command once per block.
+LAUNCHER_PROVIDERS = ('slurm', 'cobalt', 'condor')
+
+
+def task_slots_per_launch(config):
+    ''' Number of task slots a single run of the launch command should provide, so that
+    a block ends up with taskBlocks slots.
+
+    Args:
+         - config (dict) : The config dict object for the site
+
+    Returns:
+         - int, or the bash expression given as taskBlocks (eg. "$CORES")
+    '''
+
+    execution = config.get("execution", {}) if config else {}
+    if execution.get("provider") in LAUNCHER_PROVIDERS:
+        return 1
+    return execution.get("block", {}).get("taskBlocks", 1)
+
+
+class TaskCounters(object):
+    ''' Outstanding and running task counts kept up to date from submit, start and
+    completion events, so reading them is cheap and never goes over the network.
+    '''
+
+    def __init__ (self):
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._running = 0
+        self._submitted = 0
+
+    def track(self, fut):
+        ''' Count fut as outstanding until it is done
+        '''
+        with self._lock:
+            self._outstanding += 1
+            self._submitted += 1
+        fut.add_done_callback(self._completed)
+
+    def _completed(self, fut):
+        with self._lock:
+            self._outstanding -= 1
+
+    def started(self, count=1):
+        ''' Called by executors that see tasks start running, or hand them to workers
+        '''
+        with self._lock:
+            self._running += count
+
+    def stopped(self, count=1):
+        ''' Called when tasks that were counted as started return
+        '''
+        with self._lock:
+            self._running -= count
+
+    @property
+    def outstanding(self):
+        return self._outstanding
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def submitted(self):
+        ''' Total tasks ever submitted, for arrival rates
+        '''
+        return self._submitted
+
+    @property
+    def queued(self):
+        # A task can start before its future is tracked
+        return max(0, self._outstanding - self._running)
+
+
 class ParslExecutor(metaclass=ABCMeta):
     """ Define the strict interface for all Executor classes
     This is a metaclass that only enforces concrete implementations of
@@ -20,17 +98,16 @@ class ParslExecutor(metaclass=ABCMeta):
 
     @abstractmethod
     def scale_out(self, *args, **kwargs):
-        ''' Scale out method. We should have the scale out method simply take resource object
-        which will have the scaling methods, scale_out itself should be a coroutine, since
-        scaling tasks can be slow.
+        ''' Scale out method. Scaling tasks can be slow, so executors backed by a provider
+        return a Future straight away and call the provider in the background. Blocks
+        being requested show up as SUBMITTING in status().
         '''
         pass
 
     @abstractmethod
     def scale_in(self, *args, **kwargs):
-        ''' Scale in method. We should have the scale in method simply take resource object
-        which will have the scaling methods, scale_in itself should be a corinine, since
-        scaling tasks can be slow.
+        ''' Scale in method. Like scale_out this returns a Future, blocks being cancelled
+        show up as CANCELLING in status().
         '''
 
         pass
@@ -49,3 +126,37 @@ class ParslExecutor(metaclass=ABCMeta):
         '''
         pass
 
+    @property
+    def outstanding(self):
+        ''' Number of tasks submitted that are not yet done. Executors create
+        self.counters = TaskCounters() and track every future they return.
+        '''
+        return self.counters.outstanding
+
+    @property
+    def running(self):
+        ''' Number of tasks known to be running. Executors that hand tasks to remote
+        workers count them from when they are dispatched till their results return.
+        '''
+        return self.counters.running
+
+    @property
+    def queued(self):
+        ''' Number of outstanding tasks not known to be running
+        '''
+        return self.counters.queued
+
+    @property
+    def slots_per_block(self):
+        ''' Number of tasks a block runs concurrently, used by the scaling strategy.
+        This is taskBlocks when it is a number, executors that can count their
+        workers override this for taskBlocks given as a bash expression.
+        '''
+
+        config = getattr(self, 'config', None) or {}
+        task_blocks = config.get("execution", {}).get("block", {}).get("taskBlocks", 1)
+        try:
+            return int(task_blocks)
+        except ValueError:
+            return 1
+
@@ -0,0 +1,363 @@
+''' Asynchronous block provisioning for executors backed by an execution provider.
+
+Provider calls such as an sbatch or an EC2 API request can take seconds. The
+:class:`BlockProvisioner` runs submit and cancel calls on a background thread and
+returns futures, so the strategy thread is never held up by a slow provider.
+
+Blocks requested but not yet returned by the provider are reported as SUBMITTING,
+and blocks chosen for cancelling as CANCELLING until the provider has cancelled
+them, so the strategy does not request or cancel the same capacity twice. Blocks
+the provider has cancelled are no longer tracked.
+
+Block statuses are fetched for all blocks of the executor in one provider call
+and cached for status_ttl seconds, so the strategy, scale_in and the DFK cleanup
+share one view rather than each running squeue or qstat. Submits and cancels
+invalidate the cache.
+
+A scale_out of several blocks is one provider request when the provider has a
+``submit_blocks(cmd_string, count, blocksize, job_name=...)`` method, eg. a job
+array or a multi node allocation. It returns the job ids of the blocks in order,
+and runs each block with PARSL_BLOCK_INDEX set to its position in the request.
+Other providers get one submit per block, run submit_threads at a time. The
+time taken by the last scale_out is kept in last_submit.
+
+Each block's launch command exports PARSL_BLOCK_ID, a label unique within the
+executor, so that executors can tell which block a worker belongs to and cancel
+idle blocks before busy ones.
+
+The provisioner also tracks how long blocks wait in the provider's queue before
+they run, which the predictive strategy uses as its provisioning horizon. The
+wait is only observed when statuses are fetched, so it is accurate to status_ttl.
+'''
+
+import time
+import logging
+import itertools
+import threading
+import concurrent.futures as cf
+
+from parsl.executors.errors import ScalingFailed
+
+logger = logging.getLogger(__name__)
+
+# Seconds a fetched block status stays valid
+STATUS_TTL = 10
+
+# Concurrent submits for providers without submit_blocks. libsubmit's cluster
+# providers share the job options between submits, so the default is serial
+SUBMIT_THREADS = 1
+
+# Weight of the latest observation in the queue wait moving average
+QUEUE_WAIT_ALPHA = 0.3
+
+
+def normalize_status(status):
+    ''' The local provider reports process poll codes rather than states, None
+    while the block is running
+    '''
+    if status is None:
+        return 'RUNNING'
+    if isinstance(status, int):
+        return 'COMPLETED' if status == 0 else 'FAILED'
+    return status
+
+
+class BlockProvisioner(object):
+    ''' Submits, cancels and tracks the blocks of one executor.
+    '''
+
+    def __init__ (self, provider, launch_cmd, label, status_ttl=STATUS_TTL,
+                  submit_threads=SUBMIT_THREADS):
+        ''' Wrap an execution provider
+
+        Args:
+             - provider (ExecutionProvider object) : Provider the blocks are requested from
+             - launch_cmd (string) : Command each block runs
+             - label (string) : Name used in errors and logs, usually the site name
+
+        KWargs:
+             - status_ttl (float) : Seconds to reuse block statuses for. Default: 10
+             - submit_threads (int) : Blocks submitted at once when the provider has no
+               submit_blocks. Only for providers whose submit is thread safe. Default: 1
+        '''
+
+        self.provider = provider
+        self.launch_cmd = launch_cmd
+        self.label = label
+        self.status_ttl = status_ttl
+        # Number of status queries made to the provider
+        self.status_calls = 0
+        # Moving average of seconds from requesting a block to it running, None till seen
+        self.queue_wait = None
+        # {'blocks', 'requests', 'seconds'} of the last scale_out, None till one is done
+        self.last_submit = None
+        self.submit_threads = max(1, submit_threads)
+
+        # Block ids returned by the provider, in submit order
+        self.blocks = []
+        # Block id -> the PARSL_BLOCK_ID label its launch command exported
+        self.labels = {}
+        self._label_counter = itertools.count()
+
+        self._submitting = 0
+        self._cancelling = set()
+        self._last_status = {}
+        self._status_time = 0
+        self._requested_at = {}
+        # Guards the block lists and counts
+        self._lock = threading.Lock()
+        # Providers are not thread safe, calls into them are serialized
+        self._provider_lock = threading.Lock()
+        self._pool = cf.ThreadPoolExecutor(max_workers=1)
+        # Draining can take long, it must not hold up scaling out
+        self._drain_pool = cf.ThreadPoolExecutor(max_workers=1)
+        self._submit_pool = None
+        if self.submit_threads > 1 and not hasattr(provider, 'submit_blocks'):
+            self._submit_pool = cf.ThreadPoolExecutor(max_workers=self.submit_threads)
+
+    def _log_failure(self, fut):
+        if fut.exception():
+            logger.error("Site:%s scaling failed : %s", self.label, fut.exception())
+
+    def scale_out(self, blocks=1):
+        ''' Request blocks from the provider in the background
+
+        Args:
+             - blocks (int) : Number of blocks to request
+
+        Returns:
+             - Future, resolves to the list of new block ids or raises ScalingFailed
+        '''
+
+        with self._lock:
+            self._submitting += blocks
+        fut = self._pool.submit(self._submit, blocks)
+        fut.add_done_callback(self._log_failure)
+        return fut
+
+    def _submit(self, blocks):
+        if blocks < 1:
+            return []
+
+        start = time.time()
+        labels = [next(self._label_counter) for i in range(blocks)]
+        try:
+            with self._provider_lock:
+                if hasattr(self.provider, 'submit_blocks'):
+                    requests = 1
+                    results = self._submit_bulk(labels)
+                else:
+                    requests = blocks
+                    results = self._submit_each(labels)
+        except Exception:
+            with self._lock:
+                self._submitting -= blocks
+            raise
+
+        new = []
+        failed = None
+        with self._lock:
+            self._submitting -= blocks
+            for label, block in zip(labels, results):
+                if isinstance(block, Exception) or not block:
+                    failed = failed or block
+                    continue
+                self.blocks.append(block)
+                self.labels[block] = str(label)
+                self._requested_at[block] = start
+                new.append(block)
+            if new:
+                self._status_time = 0
+
+        delta = time.time() - start
+        self.last_submit = {'blocks' : len(new), 'requests' : requests, 'seconds' : delta}
+        logger.info("Site:%s launched %s of %s blocks in %s provider requests, %.3fs",
+                    self.label, len(new), blocks, requests, delta)
+
+        if len(new) < blocks:
+            if isinstance(failed, ScalingFailed):
+                raise failed
+            if isinstance(failed, Exception):
+                raise ScalingFailed(self.label, "Failed to scale via execution_provider : {0}".format(failed))
+            raise ScalingFailed(self.label, "Failed to scale via execution_provider")
+        return new
+
+    def _submit_bulk(self, labels):
+        # Block labels are consecutive, each block works out its own from its index
+        cmd = "export PARSL_BLOCK_ID=$(( {0} + ${{PARSL_BLOCK_INDEX:-0}} ))\n{1}".format(labels[0], self.launch_cmd)
+        job_name = "{0}.block{1}".format(self.label, labels[0])
+        blocks = self.provider.submit_blocks(cmd, len(labels), 1, job_name=job_name)
+        logger.debug("Site:%s launched blocks : %s", self.label, blocks)
+        blocks = list(blocks or [])
+        return blocks + [None] * (len(labels) - len(blocks))
+
+    def _submit_one(self, label):
+        cmd = "export PARSL_BLOCK_ID={0}\n{1}".format(label, self.launch_cmd)
+        try:
+            block = self.provider.submit(cmd, 1)
+        except Exception as e:
+            logger.error("Site:%s submit failed : %s", self.label, e)
+            return e
+        logger.debug("Site:%s launched block : %s", self.label, block)
+        return block
+
+    def _submit_each(self, labels):
+        if self._submit_pool:
+            return list(self._submit_pool.map(self._submit_one, labels))
+
+        results = []
+        for label in labels:
+            block = self._submit_one(label)
+            results.append(block)
+            # A provider at capacity will refuse the rest too
+            if isinstance(block, Exception) or not block:
+                results.extend([block] * (len(labels) - len(results)))
+                break
+        return results
+
+    def scale_in(self, blocks, choose=None, drain=None):
+        ''' Cancel running blocks in the background. As many blocks are marked
+        CANCELLING before this returns, in submit order, and choose may then swap them
+        for others in the background.
+
+        Args:
+             - blocks (int) : Number of blocks to cancel
+
+        KWargs:
+             - choose (callable) : Called in the background with the running block ids,
+               returns them in the order they should be cancelled in, eg. idle blocks
+               first. Not called when all of them are cancelled. Default: submit order
+             - drain (callable) : Called in the background with the blocks to cancel
+               before they are cancelled, to let their in-flight tasks finish. Default: None
+
+        Returns:
+             - Future, resolves to the provider's cancel statuses
+        '''
+
+        status = dict(zip(self.blocks, self.status()))
+        running = [block for block in status if status[block] == "RUNNING"]
+
+        with self._lock:
+            running = [block for block in running if block not in self._cancelling]
+            to_kill = running[:blocks]
+            self._cancelling.update(to_kill)
+
+        pool = self._drain_pool if drain else self._pool
+        try:
+            fut = pool.submit(self._cancel, to_kill, drain, choose, running)
+        except RuntimeError:
+            # The pool is shut down, eg. by concurrent.futures at interpreter exit
+            # before the DFK cleanup runs, the blocks must still be cancelled
+            logger.debug("Site:%s cancelling blocks %s in the caller", self.label, to_kill)
+            fut = cf.Future()
+            try:
+                fut.set_result(self._cancel(to_kill, drain, choose, running))
+            except Exception as e:
+                fut.set_exception(e)
+        fut.add_done_callback(self._log_failure)
+        return fut
+
+    def _choose(self, to_kill, choose, running):
+        ''' Swap the blocks marked for cancelling for the first ones choose orders
+        '''
+        try:
+            ordered = choose(running)
+        except Exception as e:
+            logger.warning("Site:%s could not order blocks to cancel, keeping %s : %s", self.label, to_kill, e)
+            return to_kill
+
+        with self._lock:
+            self._cancelling.difference_update(to_kill)
+            chosen = [block for block in ordered if block not in self._cancelling][:len(to_kill)]
+            self._cancelling.update(chosen)
+        return chosen
+
+    def _cancel(self, to_kill, drain=None, choose=None, running=()):
+        try:
+            if choose and len(to_kill) < len(running):
+                to_kill = self._choose(to_kill, choose, running)
+            if drain and to_kill:
+                try:
+                    drain(to_kill)
+                except Exception as e:
+                    logger.warning("Site:%s draining blocks %s failed : %s", self.label, to_kill, e)
+            with self._provider_lock:
+                statuses = self.provider.cancel(to_kill)
+            self._forget([block for block, cancelled in zip(to_kill, statuses or []) if cancelled])
+            return statuses
+        finally:
+            with self._lock:
+                self._cancelling.difference_update(to_kill)
+                self._status_time = 0
+
+    def _forget(self, blocks):
+        ''' Stop tracking blocks the provider has cancelled, so status() no longer
+        queries them
+        '''
+        with self._lock:
+            for block in blocks:
+                if block in self.blocks:
+                    # Executors hold on to this list, it is changed in place
+                    self.blocks.remove(block)
+                self.labels.pop(block, None)
+                self._last_status.pop(block, None)
+                self._requested_at.pop(block, None)
+
+    def _record_queue_wait(self, status, wait):
+        # Blocks that ended without running tell us nothing about the queue
+        if status != 'RUNNING':
+            return
+        if self.queue_wait is None:
+            self.queue_wait = wait
+        else:
+            self.queue_wait += QUEUE_WAIT_ALPHA * (wait - self.queue_wait)
+
+    def invalidate(self):
+        ''' Make the next status() call query the provider
+        '''
+        with self._lock:
+            self._status_time = 0
+
+    def status(self):
+        ''' Status of each block in self.blocks order, followed by a SUBMITTING entry
+        for each block still being requested. The provider is queried at most once
+        every status_ttl seconds. If the provider is busy submitting or cancelling,
+        the last known statuses are returned rather than waiting on it.
+        '''
+
+        with self._lock:
+            blocks = list(self.blocks)
+            submitting = self._submitting
+            stale = time.time() - self._status_time >= self.status_ttl
+
+        if blocks and stale and self._provider_lock.acquire(blocking=False):
+            try:
+                fetched_at = time.time()
+                statuses = self.provider.status(blocks)
+                self.status_calls += 1
+            finally:
+                self._provider_lock.release()
+            with self._lock:
+                for block, status in zip(blocks, statuses):
+                    if block not in self.labels:
+                        # Cancelled and forgotten while the provider was queried
+                        continue
+                    status = normalize_status(status)
+                    self._last_status[block] = status
+                    if status != 'PENDING' and block in self._requested_at:
+                        self._record_queue_wait(status, fetched_at - self._requested_at.pop(block))
+                self._status_time = fetched_at
+
+        with self._lock:
+            status = ['CANCELLING' if block in self._cancelling else self._last_status.get(block, 'PENDING')
+                      for block in blocks]
+
+        return status + ['SUBMITTING'] * submitting
+
+    def shutdown(self):
+        ''' Stop the background thread once the queued provider calls are done
+        '''
+        self._pool.shutdown(wait=False)
+        self._drain_pool.shutdown(wait=False)
+        if self._submit_pool:
+            self._submit_pool.shutdown(wait=False)
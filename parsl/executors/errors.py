@@ -20,6 +20,36 @@ class ScalingFailed(ExecutorError):
         self.site = sitename
         self.reason = reason
 
+class ManagerLost(ExecutorError):
+    ''' Task lost because the worker manager running it stopped sending heartbeats
+    '''
+    def __init__(self, manager_id):
+        self.manager_id = manager_id
+        self.reason = "Worker manager {0} stopped sending heartbeats".format(manager_id)
+
+    def __repr__ (self):
+        return "Task failure due to loss of manager:{0}".format(self.manager_id)
+
+    def __str__ (self):
+        return self.__repr__()
+
+class WorkerLost(ExecutorError):
+    ''' Task lost because the worker process running it died, eg. it was killed for
+    running out of memory
+    '''
+    def __init__(self, worker_id, hostname, exitcode):
+        self.worker_id = worker_id
+        self.hostname = hostname
+        self.exitcode = exitcode
+        self.reason = "Worker {0} on {1} died with exit code {2}".format(worker_id, hostname, exitcode)
+
+    def __repr__ (self):
+        return "Task failure due to loss of worker {0} on {1}, exit code {2}".format(self.worker_id, self.hostname,
+                                                                                   self.exitcode)
+
+    def __str__ (self):
+        return self.__repr__()
+
 class ControllerErr(ExecutorError):
     ''' Error raise by IPP controller
     '''
@@ -32,4 +62,15 @@ class ControllerErr(ExecutorError):
     def __str__ (self):
         return self.__repr__()
 
+class ObjectEvicted(ExecutorError):
+    ''' A result held by reference was evicted from the worker's object store
+    '''
+    def __init__(self, key):
+        self.key = key
+        self.reason = "Object {0} was evicted from the worker object store".format(key)
 
+    def __repr__ (self):
+        return "Object {0} is no longer held by the worker".format(self.key)
+
+    def __str__ (self):
+        return self.__repr__()
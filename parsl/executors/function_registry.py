@@ -0,0 +1,190 @@
+''' Function registry for executors that ship tasks to remote workers.
+
+Rather than pickling the app function with every task, the executor serializes a
+function once, names it by the hash of its serialized form and sends the serialized
+function to a worker only the first time that worker needs it. Later tasks carry just
+the hash and the packed args. Task messages take the form:
+
+.. code:: python
+
+   {
+      "task_id" : <task id>,
+      "fn_hash" : <hex digest of the serialized function>,
+      "fn_buffer" : serialized function, only if the receiver does not have it yet,
+      "buffer" : packed args and kwargs from pack_args
+   }
+
+Senders track what a receiver holds with an LRUCache of the same size as the
+receiver's cache, touched in the same order as the receiver processes tasks, so both
+sides evict the same functions.
+'''
+
+import pickle
+import hashlib
+import weakref
+import collections
+from itertools import chain
+
+from ipyparallel.serialize import serialize_object, deserialize_object
+
+FN_CACHE_SIZE = 128
+
+
+def pack_args(args, kwargs, buffer_threshold, item_threshold):
+    ''' Pack args and kwargs into a list of buffers, like pack_apply_message
+    but without the function.
+    '''
+
+    arg_bufs = list(chain.from_iterable(
+        serialize_object(arg, buffer_threshold, item_threshold) for arg in args))
+
+    kw_keys = sorted(kwargs.keys())
+    kwarg_bufs = list(chain.from_iterable(
+        serialize_object(kwargs[key], buffer_threshold, item_threshold) for key in kw_keys))
+
+    info = dict(nargs=len(args), narg_bufs=len(arg_bufs), kw_keys=kw_keys)
+    return [pickle.dumps(info, pickle.HIGHEST_PROTOCOL)] + arg_bufs + kwarg_bufs
+
+
+def unpack_args(bufs, g=None):
+    ''' Unpack buffers made by pack_args into (args, kwargs)
+    '''
+
+    bufs = list(bufs)
+    info = pickle.loads(bufs.pop(0))
+    arg_bufs, kwarg_bufs = bufs[:info['narg_bufs']], bufs[info['narg_bufs']:]
+
+    args = []
+    for i in range(info['nargs']):
+        arg, arg_bufs = deserialize_object(arg_bufs, g)
+        args.append(arg)
+
+    kwargs = {}
+    for key in info['kw_keys']:
+        kwarg, kwarg_bufs = deserialize_object(kwarg_bufs, g)
+        kwargs[key] = kwarg
+
+    return tuple(args), kwargs
+
+
+class LRUCache(object):
+    ''' A dict with a bounded size that evicts the least recently used key.
+    '''
+
+    def __init__ (self, max_size=FN_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = collections.OrderedDict()
+
+    def __contains__ (self, key):
+        return key in self._data
+
+    def __len__ (self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        ''' Return the value for key and mark it most recently used
+        '''
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key, value):
+        ''' Insert key as most recently used, evicting the oldest key if full
+        '''
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def touch(self, key):
+        ''' Mark key as used. Returns True if key was present, otherwise inserts it
+        and returns False. This is the sender side mirror of a receiver's cache lookup.
+        '''
+        if key in self._data:
+            self._data.move_to_end(key)
+            return True
+        self.put(key, True)
+        return False
+
+
+class FunctionRegistry(object):
+    ''' Serializes and hashes functions for the executor. Each function object is
+    serialized only once, except closures, whose cell contents may change between
+    calls and so are serialized on every submit (they are still named by content).
+    '''
+
+    def __init__ (self, buffer_threshold, item_threshold):
+        self.buffer_threshold = buffer_threshold
+        self.item_threshold = item_threshold
+        self._functions = weakref.WeakKeyDictionary()
+        # Functions found already serialized, and serialized
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, func):
+        ''' Return (fn_hash, fn_buffer) for func
+        '''
+
+        try:
+            entry = self._functions[func]
+            self.hits += 1
+            return entry
+        except (KeyError, TypeError):
+            pass
+
+        self.misses += 1
+        fn_buffer = serialize_object(func, self.buffer_threshold, self.item_threshold)
+        digest = hashlib.sha1()
+        for buf in fn_buffer:
+            digest.update(buf)
+        entry = (digest.hexdigest(), fn_buffer)
+
+        if getattr(func, '__closure__', None) is None:
+            try:
+                self._functions[func] = entry
+            except TypeError:
+                # Not weakly referenceable, eg. builtins
+                pass
+
+        return entry
+
+    def pack_task(self, task_id, func, args, kwargs):
+        ''' Build a task message without the serialized function.
+
+        Returns:
+             - (msg, fn_buffer) : The sender attaches fn_buffer as msg["fn_buffer"]
+               if the receiver does not have the function yet.
+        '''
+
+        fn_hash, fn_buffer = self.register(func)
+        msg = {"task_id" : task_id,
+               "fn_hash" : fn_hash,
+               "buffer" : pack_args(args, kwargs, self.buffer_threshold, self.item_threshold)}
+
+        return msg, fn_buffer
+
+
+class FunctionCache(LRUCache):
+    ''' Worker side cache of functions. Holds the serialized function and
+    deserializes it on first use.
+    '''
+
+    def lookup(self, fn_hash, fn_buffer=None, g=None):
+        ''' Return the function named fn_hash, caching fn_buffer if given.
+
+        Raises:
+             - KeyError : If the function is neither cached nor given
+        '''
+
+        entry = self.get(fn_hash)
+        if entry is None:
+            if fn_buffer is None:
+                raise KeyError("Function {0} is not in the worker cache".format(fn_hash))
+            entry = [fn_buffer, None]
+            self.put(fn_hash, entry)
+
+        if entry[1] is None:
+            entry[1], _ = deserialize_object(entry[0], g)
+
+        return entry[1]
@@ -0,0 +1,277 @@
+''' Interchange for the ZMQExecutor
+
+The interchange runs as a separate process on the client side. It queues tasks
+from the executor, hands them out to worker managers in batches as the managers
+grant capacity, and forwards result batches back to the executor.
+
+.. code:: python
+
+       Executor        |        Interchange         |     Worker managers
+                       |                            |
+      TasksOutgoing ---+--> task_incoming           |
+                       |         |                  |
+                       |    pending_tasks --> worker_socket <---+--> Manager --> workers
+                       |                       (ROUTER)         |      |
+      ResultsIncoming<-+--- results_outgoing <------+-----------+------+
+                       |                            |
+
+Managers talk to the interchange over a single DEALER socket each, with these
+pickled messages:
+
+.. code:: python
+
+    {'type' : 'registration', 'workers' : <int>, 'prefetch' : <int>, 'fn_cache_size' : <int>, 'hostname' : <str>}
+    {'type' : 'task_request', 'count' : <int>}       # Grants capacity for count more tasks
+    {'type' : 'results', 'results' : [<result>...]}  # Also grants capacity for len(results) tasks
+    {'type' : 'heartbeat'}
+
+The interchange sends ``{'type' : 'tasks', 'tasks' : [<task>...]}``, ``{'type' : 'heartbeat'}``
+and ``{'type' : 'stop'}`` to managers. Managers that go silent for longer than
+heartbeat_threshold are dropped, and their outstanding tasks fail with ManagerLost.
+
+The executor receives lists of results, and ``{'dispatched' : <int>}`` after each
+round of dispatching, ahead of any of those tasks' results. It counts tasks as
+running from their dispatch till their results return.
+
+Serialized functions from the executor's function registry are kept in a bounded
+cache, and sent to each manager only the first time that manager needs them.
+'''
+
+import time
+import pickle
+import logging
+import collections
+import zmq
+
+from ipyparallel.serialize import serialize_object
+
+from parsl.executors.errors import ManagerLost
+from parsl.executors.function_registry import LRUCache, FN_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class Interchange(object):
+    ''' Task queue and dispatcher between the ZMQExecutor and the worker managers.
+    '''
+
+    def __init__ (self, client_address="127.0.0.1", worker_address="*",
+                  worker_port=None, worker_port_range=(54000, 55000),
+                  heartbeat_period=30, heartbeat_threshold=120, fn_cache_size=FN_CACHE_SIZE):
+        ''' Bind the client and worker facing sockets
+
+        KWargs:
+             - client_address (string) : Address to bind the executor facing sockets on. Default: 127.0.0.1
+             - worker_address (string) : Address to bind the manager facing socket on. Default: *
+             - worker_port (int) : Port for managers to connect to. Default: random from worker_port_range
+             - worker_port_range (tuple) : (min, max) ports to pick the worker port from.
+             - heartbeat_period (int) : Seconds between heartbeat checks. Default: 30
+             - heartbeat_threshold (int) : Seconds of silence after which a manager is lost. Default: 120
+             - fn_cache_size (int) : Number of serialized functions to hold. Default: 128
+        '''
+
+        self.heartbeat_period = heartbeat_period
+        self.heartbeat_threshold = heartbeat_threshold
+        self.context = zmq.Context()
+
+        client_url = "tcp://{0}".format(client_address)
+        self.task_incoming = self.context.socket(zmq.PULL)
+        self.task_incoming.setsockopt(zmq.LINGER, 0)
+        self.task_port = self.task_incoming.bind_to_random_port(client_url)
+
+        self.results_outgoing = self.context.socket(zmq.PUSH)
+        self.results_outgoing.setsockopt(zmq.LINGER, 0)
+        self.result_port = self.results_outgoing.bind_to_random_port(client_url)
+
+        self.worker_socket = self.context.socket(zmq.ROUTER)
+        self.worker_socket.setsockopt(zmq.LINGER, 0)
+        worker_url = "tcp://{0}".format(worker_address)
+        if worker_port:
+            self.worker_socket.bind("{0}:{1}".format(worker_url, worker_port))
+            self.worker_port = worker_port
+        else:
+            self.worker_port = self.worker_socket.bind_to_random_port(worker_url,
+                                                                      min_port=worker_port_range[0],
+                                                                      max_port=worker_port_range[1])
+
+        self.pending_tasks = collections.deque()
+        self.functions = LRUCache(fn_cache_size)
+        self.managers = {}
+        self._kill = False
+
+        logger.debug("Interchange bound task_port:%s result_port:%s worker_port:%s",
+                     self.task_port, self.result_port, self.worker_port)
+
+    @property
+    def ports(self):
+        ''' Ports the interchange is listening on, as (task_port, result_port, worker_port)
+        '''
+        return (self.task_port, self.result_port, self.worker_port)
+
+    def _send_to_manager(self, manager, msg):
+        self.worker_socket.send_multipart([manager, pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)])
+
+    def _handle_client(self):
+        ''' Drain all tasks posted by the executor
+        '''
+
+        while True:
+            try:
+                buf = self.task_incoming.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            msg = pickle.loads(buf)
+            if msg is None:
+                logger.debug("Interchange received exit request")
+                self._kill = True
+                break
+
+            # Mirrors the executor's view of self.functions. Pending tasks hold a
+            # reference to their function so later evictions don't affect them.
+            if 'fn_hash' in msg:
+                if 'fn_buffer' in msg:
+                    self.functions.put(msg['fn_hash'], msg['fn_buffer'])
+                else:
+                    fn_buffer = self.functions.get(msg['fn_hash'])
+                    if fn_buffer is None:
+                        logger.warning("Function %s for task %s is not cached", msg['fn_hash'], msg['task_id'])
+                    else:
+                        msg['fn_buffer'] = fn_buffer
+
+            self.pending_tasks.append(msg)
+
+    def _handle_managers(self):
+        ''' Drain all messages posted by the managers
+        '''
+
+        while True:
+            try:
+                manager, buf = self.worker_socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                break
+
+            msg = pickle.loads(buf)
+            kind = msg['type']
+
+            if kind == 'registration':
+                logger.debug("Registered manager %s : %s", manager, msg)
+                self.managers[manager] = {'free' : 0,
+                                          'tasks' : set(),
+                                          'last' : time.time(),
+                                          'workers' : msg['workers'],
+                                          'functions' : LRUCache(msg.get('fn_cache_size', FN_CACHE_SIZE)),
+                                          'hostname' : msg.get('hostname')}
+                continue
+
+            if manager not in self.managers:
+                logger.warning("Dropping %s message from unregistered manager %s", kind, manager)
+                continue
+
+            record = self.managers[manager]
+            record['last'] = time.time()
+
+            if kind == 'task_request':
+                record['free'] += msg['count']
+
+            elif kind == 'results':
+                results = msg['results']
+                for result in results:
+                    record['tasks'].discard(result['task_id'])
+                record['free'] += len(results)
+                self.results_outgoing.send(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+
+            elif kind == 'heartbeat':
+                self._send_to_manager(manager, {'type' : 'heartbeat'})
+
+            else:
+                logger.warning("Unknown message type %s from manager %s", kind, manager)
+
+    def _dispatch(self):
+        ''' Hand pending tasks to managers with free capacity, one batch per manager
+        '''
+
+        dispatched = 0
+        for manager, record in self.managers.items():
+            if not self.pending_tasks:
+                break
+            if record['free'] <= 0:
+                continue
+
+            count = min(record['free'], len(self.pending_tasks))
+            batch = [self.pending_tasks.popleft() for i in range(count)]
+            record['free'] -= count
+            record['tasks'].update([task['task_id'] for task in batch])
+
+            # Leave out functions the manager already holds, the manager updates its
+            # cache in this same order.
+            outgoing = []
+            for task in batch:
+                if 'fn_hash' in task and record['functions'].touch(task['fn_hash']):
+                    task = {k : v for k, v in task.items() if k != 'fn_buffer'}
+                outgoing.append(task)
+
+            self._send_to_manager(manager, {'type' : 'tasks', 'tasks' : outgoing})
+            dispatched += count
+
+        if dispatched:
+            self.results_outgoing.send(pickle.dumps({'dispatched' : dispatched}, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _expire_managers(self):
+        ''' Drop managers that have missed heartbeats and fail their tasks
+        '''
+
+        now = time.time()
+        for manager in list(self.managers):
+            record = self.managers[manager]
+            if now - record['last'] < self.heartbeat_threshold:
+                continue
+
+            logger.warning("Manager %s missed heartbeats, failing %s tasks",
+                           manager, len(record['tasks']))
+            exception = serialize_object(ManagerLost(manager))
+            results = [{'task_id' : task_id, 'exception' : exception} for task_id in record['tasks']]
+            if results:
+                self.results_outgoing.send(pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+            del self.managers[manager]
+
+    def start(self):
+        ''' Run the interchange loop till an exit request arrives from the executor
+        '''
+
+        poller = zmq.Poller()
+        poller.register(self.task_incoming, zmq.POLLIN)
+        poller.register(self.worker_socket, zmq.POLLIN)
+
+        last_check = time.time()
+        while not self._kill:
+            socks = dict(poller.poll(timeout=int(self.heartbeat_period*1000)))
+
+            if self.task_incoming in socks:
+                self._handle_client()
+
+            if self.worker_socket in socks:
+                self._handle_managers()
+
+            self._dispatch()
+
+            if time.time() - last_check >= self.heartbeat_period:
+                self._expire_managers()
+                last_check = time.time()
+
+        for manager in self.managers:
+            self._send_to_manager(manager, {'type' : 'stop'})
+
+        # Give the stop messages a moment to go out before the sockets close
+        self.context.destroy(linger=1000)
+        logger.debug("Interchange exiting")
+
+
+def starter(comm_q, *args, **kwargs):
+    ''' Start the interchange process. The ports bound are posted on comm_q
+    as (task_port, result_port, worker_port) before the interchange loop starts.
+    '''
+
+    ic = Interchange(*args, **kwargs)
+    comm_q.put(ic.ports)
+    ic.start()
@@ -1,13 +1,18 @@
 import os
 import time
+import threading
 
 import logging
 logger = logging.getLogger(__name__)
 
 from shutil import copyfile
 from ipyparallel import Client
-from parsl.executors.base import ParslExecutor
+from parsl.executors.base import ParslExecutor, TaskCounters, task_slots_per_launch
 from parsl.executors.errors import *
+from parsl.executors.blocks import BlockProvisioner, STATUS_TTL, SUBMIT_THREADS
+
+# Seconds to wait for in-flight tasks on a draining block before cancelling it anyway
+DRAIN_TIMEOUT = 300
 
 
 class IPyParallelExecutor(ParslExecutor):
@@ -19,20 +24,29 @@ class IPyParallelExecutor(ParslExecutor):
            Some deficiencies with this executor are:
 
                1. Ipengine's execute one task at a time. This means one engine per core
-                  is necessary to exploit the full parallelism of a node.
+                  is necessary to exploit the full parallelism of a node. The launch command
+                  starts taskBlocks engines per block, unless the provider's launcher
+                  already runs taskBlocks copies of it.
                2. No notion of remaining walltime.
                3. Lack of throttling means tasks could be queued up on a worker.
 
     '''
 
 
-    def compose_launch_cmd(self, filepath, engine_dir):
+    def compose_launch_cmd(self, filepath, engine_dir, engines=1):
         ''' Reads the json contents from filepath and uses that to compose the engine launch command
 
         Args:
             filepath: Path to the engine file
             engine_dir : CWD for the engines .
 
+        KWargs:
+            engines : Number of engines to start, an int or a bash expression. CORES is set
+                      to the number of cores on the node if the launcher has not set it.
+
+        Each engine's session id starts with parsl.<PARSL_BLOCK_ID>, which the block
+        provisioner exports, so engines can be mapped back to their block.
+
         '''
 
         self.engine_file = os.path.expanduser(filepath)
@@ -52,8 +66,16 @@ cat <<EOF > ipengine.json
 EOF
 
 mkdir -p '.ipengine_logs'
-ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
-'''.format(engine_dir, engine_json)
+export CORES=${{CORES:-$(getconf _NPROCESSORS_ONLN)}}
+ENGINES={2}
+for ENGINE in $(seq 1 $ENGINES)
+do
+    # The session id tells the executor which block the engine belongs to
+    ipengine --file=ipengine.json --Session.session=parsl.${{PARSL_BLOCK_ID:-static}}.$ENGINE.$RANDOM$RANDOM \\
+             &>> .ipengine_logs/$JOBNAME.$ENGINE.log &
+done
+wait
+'''.format(engine_dir, engine_json, engines)
 
 
     def __init__ (self, execution_provider=None,
@@ -90,17 +112,8 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
             self.client_file = self.controller.client_file
             self.engine_file = self.controller.engine_file
 
-            if not os.path.exists(self.client_file):
-                logger.debug("Waiting for {0}".format(self.client_file))
-
-            sleep_dur = 20 # 20 seconds
-            for i in range(0, int(sleep_dur/0.2)):
-                time.sleep(0.2)
-                if os.path.exists(self.client_file):
-                    break
-
-            if not os.path.exists(self.client_file):
-                raise Exception("Controller client file is missing at {0}".format(self.client_file))
+            logger.debug("Waiting for {0}".format(self.client_file))
+            self.controller.wait_ready(timeout=20)
 
 
         self.executor = Client(url_file=self.client_file)
@@ -115,9 +128,19 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
         #    os.makedirs(self.config["execution"]["script_dir"])
 
 
-        self.launch_cmd = self.compose_launch_cmd(self.engine_file, engine_dir)
+        self.counters = TaskCounters()
+        execution = self.config["execution"] if self.config else {}
+        self.drain_blocks = execution.get("drainBlocks", False)
+        self.drain_timeout = execution.get("drainTimeout", DRAIN_TIMEOUT)
+        self._draining = set()
+        self._targets_lock = threading.Lock()
+        self.engines_per_launch = task_slots_per_launch(config)
+        self._slots_per_block = 1
+        self.launch_cmd = self.compose_launch_cmd(self.engine_file, engine_dir,
+                                                  engines=self.engines_per_launch)
         self.execution_provider = execution_provider
         self.engines = []
+        self.provisioner = None
 
         if reuse_controller:
             # Reuse existing controller if one is available
@@ -126,14 +149,14 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
         if execution_provider:
             self._scaling_enabled = True
             logger.debug("Starting IpyParallelExecutor with provider:%s", execution_provider)
+            self.provisioner = BlockProvisioner(execution_provider, self.launch_cmd,
+                                                execution_provider.sitename,
+                                                status_ttl=self.config["execution"].get("statusTTL", STATUS_TTL),
+                                                submit_threads=self.config["execution"].get("submitThreads",
+                                                                                            SUBMIT_THREADS))
+            self.engines = self.provisioner.blocks
             try:
-                for i in range(self.config["execution"]["block"].get("initBlocks", 1)):
-                    eng = self.execution_provider.submit(self.launch_cmd, 1)
-                    logger.debug("Launched block : {0}:{1}".format(i, eng))
-                    if not eng:
-                        raise(ScalingFailed(self.execution_provider.sitename,
-                                            "Ipp executor failed to scale via execution_provider"))
-                    self.engines.extend([eng])
+                self.provisioner.scale_out(self.config["execution"]["block"].get("initBlocks", 1)).result()
 
             except Exception as e:
                 logger.error("Scaling out failed : %s", e)
@@ -151,6 +174,37 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
     def scaling_enabled(self):
         return self._scaling_enabled
 
+    @property
+    def running(self):
+        ''' With the scheduler's default high water mark of one task per engine, the hub
+        hands an engine a task only once it is free, so as many tasks run as there are
+        engines, up to the outstanding count. The client keeps its list of
+        engines from the hub's notifications, this does not ask the hub.
+        '''
+        return min(self.counters.outstanding, len(self.executor.ids))
+
+    @property
+    def queued(self):
+        return self.counters.outstanding - self.running
+
+    @property
+    def slots_per_block(self):
+        ''' Number of engines per block. When taskBlocks is a bash expression such
+        as "$CORES" it is only resolved on the nodes, so this is counted from the
+        engines that have registered with the controller.
+        '''
+
+        task_blocks = self.config["execution"]["block"].get("taskBlocks", 1) if self.config else 1
+        if isinstance(task_blocks, int) or str(task_blocks).isdigit():
+            return int(task_blocks)
+
+        if self.engines:
+            # Blocks still queued would bring the average down, keep the best seen
+            per_block = len(self.executor.ids) // len(self.engines)
+            self._slots_per_block = max(self._slots_per_block, per_block)
+
+        return self._slots_per_block
+
     def submit (self,  *args, **kwargs):
         ''' Submits work to the thread pool
         This method is simply pass through and behaves like a submit call as described
@@ -161,53 +215,131 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
         '''
         logger.debug("Got args : %s,", args)
         logger.debug("Got kwargs : %s,", kwargs)
-        return self.lb_view.apply_async(*args, **kwargs)
+        if self._draining:
+            # Engines that registered since the drain started get tasks too
+            with self._targets_lock:
+                self.lb_view.targets = self._targets()
+                fut = self.lb_view.apply_async(*args, **kwargs)
+        else:
+            fut = self.lb_view.apply_async(*args, **kwargs)
+        self.counters.track(fut)
+        return fut
+
+    def scale_out (self, blocks=1):
+        ''' Scales out the number of blocks by "blocks". The provider is called in
+        the background.
 
-    def scale_out (self, *args, **kwargs):
-        ''' Scales out the number of active workers by 1
-        This method is notImplemented for threads and will raise the error if called.
+        Kwargs:
+             - blocks (int) : Number of blocks to add. Default: 1
 
+        Returns:
+             - Future resolving to the list of new block ids, or None if no execution provider is attached
         '''
-        if self.execution_provider :
-            r = self.execution_provider.submit(self.launch_cmd, *args, **kwargs)
-            self.engines.extend([r])
-        else:
-            logger.error("No execution provider available")
-            r = None
+        if self.provisioner :
+            return self.provisioner.scale_out(blocks)
 
-        return r
+        logger.error("No execution provider available")
+        return None
 
-    def scale_in (self, blocks, *args, **kwargs):
-        ''' Scale in the number of active workers by 1
-        This method is notImplemented for threads and will raise the error if called.
+    def scale_in (self, blocks, drain=None):
+        ''' Scale in the number of active blocks by "blocks". Blocks whose engines have
+        no tasks are cancelled first. With drainBlocks set, no new tasks are scheduled
+        on the chosen blocks and they are cancelled once their tasks finish, or after
+        drainTimeout seconds. The provider and the hub are called in the background.
 
-        Raises:
-             NotImplemented exception
+        Args:
+             - blocks (int) : Number of blocks to cancel
+
+        KWargs:
+             - drain (Bool) : Whether to drain the blocks first. Default: drainBlocks
+
+        Returns:
+             - Future resolving to the cancel statuses, or None if no execution provider is attached
         '''
-        status = dict(zip(self.engines, self.execution_provider.status(self.engines)))
+        if drain is None:
+            drain = self.drain_blocks
 
-        # This works for blocks=0
-        to_kill = [engine for engine in status if status[engine] == "RUNNING" ][:blocks]
+        if self.provisioner :
+            return self.provisioner.scale_in(blocks, choose=self._idle_first,
+                                             drain=self._drain if drain else None)
 
-        if self.execution_provider :
-            r = self.execution_provider.cancel(to_kill, *args, **kwargs)
-        else:
-            logger.error("No execution provider available")
-            r = None
+        logger.error("No execution provider available")
+        return None
 
-        return r
+    def _engine_blocks (self):
+        ''' Map engine ids to the label of the block they run in, from the session ids
+        the launch command gives the engines.
+        '''
+        blocks = {}
+        for engine_id, ident in self.executor._engines.items():
+            parts = str(ident).split('.')
+            if len(parts) > 2 and parts[0] == 'parsl':
+                blocks[engine_id] = parts[1]
+        return blocks
+
+    def _busy_engines (self, engine_ids):
+        ''' The engines in engine_ids with tasks queued or running, asks the hub
+        '''
+        if not engine_ids:
+            return set()
+        queues = self.executor.queue_status(targets=list(engine_ids))
+        return {engine_id for engine_id in engine_ids
+                if queues[engine_id]['queue'] or queues[engine_id]['tasks']}
+
+    def _idle_first (self, blocks):
+        ''' Order blocks so that those with no tasks on any of their engines come first
+        '''
+        try:
+            engine_blocks = self._engine_blocks()
+            busy = {engine_blocks[e] for e in self._busy_engines(engine_blocks)}
+        except Exception as e:
+            logger.warning("Could not find the idle blocks, cancelling in submit order : %s", e)
+            return blocks
 
-    def status (self):
-        ''' Returns the status of the executor via probing the execution providers.
+        labels = self.provisioner.labels
+        return sorted(blocks, key=lambda block: labels.get(block) in busy)
 
+    def _drain (self, blocks):
+        ''' Stop scheduling on the engines of blocks and wait for their tasks to finish
         '''
-        if self.execution_provider :
-            status = self.execution_provider.status(self.engines)
+        labels = {self.provisioner.labels.get(block) for block in blocks}
+        engines = {e for e, label in self._engine_blocks().items() if label in labels}
+        if not engines:
+            return
 
-        else:
-            status = []
+        with self._targets_lock:
+            self._draining.update(engines)
+            self.lb_view.targets = self._targets()
 
-        return status
+        try:
+            deadline = time.time() + self.drain_timeout
+            while self._busy_engines(engines):
+                if time.time() > deadline:
+                    logger.warning("Blocks %s still busy after %ss, cancelling", blocks, self.drain_timeout)
+                    break
+                time.sleep(1)
+        finally:
+            with self._targets_lock:
+                self._draining.difference_update(engines)
+                if not self._draining:
+                    self.lb_view.targets = None
+
+    def _targets (self):
+        ''' Engines to schedule on, all but the draining ones. With no other engine
+        left, tasks still have to go somewhere, so None, any engine.
+        '''
+        others = [e for e in self.executor.ids if e not in self._draining]
+        return others if others else None
+
+    def status (self):
+        ''' Returns the status of the blocks, including SUBMITTING entries for blocks
+        still being requested from the execution provider.
+
+        '''
+        if self.provisioner :
+            return self.provisioner.status()
+
+        return []
 
 
     def shutdown (self, hub=True, targets='all', block=False):
@@ -223,6 +355,9 @@ ipengine --file=ipengine.json &>> .ipengine_logs/$JOBNAME.log
              NotImplemented exception
         '''
 
+        if self.provisioner :
+            self.provisioner.shutdown()
+
         if self.controller :
             logger.debug("IPP:Shutdown sequence: Attempting controller kill")
             self.controller.close()
@@ -1,15 +1,123 @@
 import os
 import sys
+import json
+import errno
+import select
+import socket
 import subprocess
 import time
 import random
 import logging
 import signal
+import ctypes
+import ctypes.util
 
 from parsl.executors.errors import *
 
 logger = logging.getLogger(__name__)
 
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+
+
+class DirWatch(object):
+    ''' Wake up when files appear in a directory.
+
+    Uses inotify through libc where it is available, and falls back to polling
+    with a short backoff elsewhere. The directory does not need to exist yet,
+    the nearest existing parent is watched until it shows up.
+    '''
+
+    def __init__ (self, directory):
+        self.directory = directory
+        self._watched = set()
+        self._fd = None
+        self._poll_interval = 0.01
+
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = self._libc.inotify_init1(os.O_NONBLOCK)
+            if fd >= 0:
+                self._fd = fd
+        except (OSError, AttributeError):
+            pass
+
+        if self._fd is None:
+            logger.debug("inotify not available, polling for files in %s", directory)
+        else:
+            self._add_watches()
+
+    def _add_watches(self):
+        ''' Watch the directory and each of its existing parents not watched yet
+        '''
+        path = self.directory
+        while path and path not in self._watched:
+            if os.path.isdir(path):
+                wd = self._libc.inotify_add_watch(self._fd, path.encode(),
+                                                  IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+                if wd >= 0:
+                    self._watched.add(path)
+                if path == self.directory:
+                    return
+            parent = os.path.dirname(path)
+            if parent == path:
+                return
+            path = parent
+
+    def wait(self, timeout):
+        ''' Block until something changes in the directory, or timeout seconds pass
+        '''
+
+        if self._fd is None:
+            time.sleep(min(timeout, self._poll_interval))
+            self._poll_interval = min(self._poll_interval * 2, 0.2)
+            return
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise
+            self._add_watches()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _connectable(client_file):
+    ''' Check that the controller described by client_file accepts connections
+    on its registration port.
+
+    Returns:
+          - Bool, False also if the file is missing or only partly written
+    '''
+
+    try:
+        with open(client_file) as f:
+            info = json.load(f)
+        port = int(info["registration"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+    host = info.get("interface", "").replace("tcp://", "")
+    hosts = [h for h in (host, info.get("location")) if h and h != '*'] + ['127.0.0.1']
+
+    for host in hosts:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return True
+        except OSError:
+            continue
+
+    return False
+
 class Controller(object):
 
     ''' Start and maintain a ipyparallel controller
@@ -43,6 +151,10 @@ class Controller(object):
 
         logger.debug("Starting ipcontroller, baseDir:%s" % ipythonDir)
 
+        self.started_at = time.time()
+        self.ready_after = None
+        self.proc = None
+
         self.mode       = mode
         self.range_min  = 50000
         self.range_max  = 60000
@@ -140,6 +252,45 @@ class Controller(object):
                             'profile_{0}'.format(self.profile),
                             'security/ipcontroller-client.json')
 
+    def wait_ready(self, timeout=20):
+        ''' Block until the controller has written its client file and accepts
+        connections. The security directory is watched rather than polled where
+        the platform allows it.
+
+        KWargs:
+              - timeout (float) : Seconds to wait. Default: 20
+
+        Returns:
+              - float, seconds from the controller start to it being ready
+
+        Raises:
+              - ControllerErr : If the controller exits or is not ready within timeout
+        '''
+
+        if self.ready_after is not None:
+            return self.ready_after
+
+        deadline = time.time() + timeout
+        watch = DirWatch(os.path.dirname(self.client_file))
+        try:
+            while not _connectable(self.client_file):
+                if self.proc and self.proc.poll() is not None:
+                    raise ControllerErr("ipcontroller exited with code {0}".format(self.proc.returncode))
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ControllerErr("Controller client file is missing or the controller is not "
+                                        "reachable at {0}".format(self.client_file))
+                # Wake up now and then even with inotify, the file may already be in place
+                # while the controller is still binding its ports
+                watch.wait(min(remaining, 0.5))
+        finally:
+            watch.close()
+
+        self.ready_after = time.time() - self.started_at
+        logger.debug("Controller ready in %.3fs", self.ready_after)
+        return self.ready_after
+
     def close(self):
         ''' Terminate the controller process and it's child processes.
 
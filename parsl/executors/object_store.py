@@ -0,0 +1,171 @@
+''' Worker resident results passed by reference.
+
+With results by reference enabled, a worker keeps results larger than a threshold
+in its object store and returns only an :class:`ObjectRef`. The AppFuture resolves
+to the reference, and a downstream task on the same executor gets the reference in
+its args, which the worker swaps for the stored object before running the task.
+The object only travels to the client when ``.result()`` is called on the AppFuture.
+
+The DataFlowKernel counts the tasks that depend on each AppFuture and releases
+the stored object once all of them have finished, or once the client has the value
+and no dependents are left. A released reference that was never materialized on
+the client can no longer be used, and tasks or ``.result()`` calls on it fail with
+:class:`~parsl.executors.errors.ObjectEvicted`.
+'''
+
+import threading
+
+from parsl.executors.errors import ObjectEvicted
+
+REF_THRESHOLD = 1024*1024
+
+
+class ObjectRef(object):
+    ''' Proxy for a result held in a worker's object store.
+
+    Only the key and size are pickled, the owner (the executor the object lives
+    on) and the materialized value stay on the client.
+    '''
+
+    def __init__ (self, key, size, owner=None):
+        self.key = key
+        self.size = size
+        self._owner = owner
+        self._lock = threading.Lock()
+        self._value = None
+        self._materialized = False
+        self.released = False
+
+    def __getstate__ (self):
+        return (self.key, self.size)
+
+    def __setstate__ (self, state):
+        self.__init__(*state)
+
+    def __repr__ (self):
+        return "<ObjectRef {0} {1} bytes>".format(self.key, self.size)
+
+    @property
+    def owner(self):
+        return self._owner
+
+    @property
+    def materialized(self):
+        return self._materialized
+
+    def materialize(self, timeout=None):
+        ''' Fetch the object from the worker, once.
+
+        This blocks till the owner's fetch reply arrives. Replies come on a queue of
+        their own, so calling it from a done callback does not deadlock, but it holds
+        up the thread reading the owner's result queue, and with it the results of
+        other tasks, till the object arrives. Do not block that thread with large
+        fetches, call this from another thread.
+
+        Raises:
+             - ObjectEvicted : If the object was released before it was fetched
+        '''
+
+        with self._lock:
+            if not self._materialized:
+                if self.released or self._owner is None:
+                    raise ObjectEvicted(self.key)
+                self._value = self._owner.fetch(self, timeout=timeout)
+                self._materialized = True
+
+        return self._value
+
+    def release(self):
+        ''' Drop the object from the worker's store. Safe to call more than once.
+        '''
+
+        with self._lock:
+            if self.released or self._owner is None:
+                return
+            self.released = True
+
+        self._owner.release_ref(self)
+
+
+def materialize(obj, timeout=None):
+    ''' Return the value behind obj if it is an ObjectRef, else obj itself
+    '''
+    if isinstance(obj, ObjectRef):
+        return obj.materialize(timeout=timeout)
+    return obj
+
+
+def map_refs(fn, args, kwargs):
+    ''' Apply fn to the ObjectRefs in args, kwargs and kwargs['inputs'], the same
+    places the DataFlowKernel looks for futures in.
+
+    Returns:
+         - (args, kwargs) : New containers, the originals are not modified
+    '''
+
+    args = [fn(arg) if isinstance(arg, ObjectRef) else arg for arg in args]
+
+    new_kwargs = {}
+    for key, value in kwargs.items():
+        if isinstance(value, ObjectRef):
+            value = fn(value)
+        elif key == 'inputs' and isinstance(value, list):
+            value = [fn(item) if isinstance(item, ObjectRef) else item for item in value]
+        new_kwargs[key] = value
+
+    return args, new_kwargs
+
+
+class ObjectStore(object):
+    ''' Worker side store of results held by reference.
+    '''
+
+    def __init__ (self, threshold=None):
+        ''' Create an empty store
+
+        KWargs:
+             - threshold (int) : Results that serialize to more than this many bytes
+               are kept. Default: None, nothing is kept
+        '''
+
+        self.threshold = threshold
+        self._objects = {}
+
+    def __len__ (self):
+        return len(self._objects)
+
+    def keep(self, key, obj, bufs):
+        ''' Store obj under key if its serialized buffers are over the threshold.
+
+        Returns:
+             - size (int) of the object if it was kept, else None
+        '''
+
+        if self.threshold is None:
+            return None
+
+        size = sum(memoryview(buf).nbytes for buf in bufs)
+        if size <= self.threshold:
+            return None
+
+        self._objects[key] = obj
+        return size
+
+    def get(self, key):
+        ''' Return the object stored under key
+
+        Raises:
+             - ObjectEvicted : If there is no such object
+        '''
+        try:
+            return self._objects[key]
+        except KeyError:
+            raise ObjectEvicted(key)
+
+    def release(self, key):
+        self._objects.pop(key, None)
+
+    def dereference(self, args, kwargs):
+        ''' Swap the ObjectRefs in a task's args for the stored objects
+        '''
+        return map_refs(lambda ref: self.get(ref.key), args, kwargs)
@@ -0,0 +1,140 @@
+''' Shared memory transport for large task buffers.
+
+When the workers run on the same host as the executor, buffers split out by
+``serialize_object`` that are larger than a threshold are written once to a
+memory mapped file, and the task message carries a small :class:`SharedBuffer`
+handle in their place. Workers map the file instead of receiving the data over
+a queue or socket. The files live in /dev/shm where available, so they are
+backed by memory and never touch disk.
+
+Workers map the files copy-on-write, so objects rebuilt on top of the buffers
+(eg. numpy arrays) are writable without modifying the shared copy. The executor
+releases a task's files once its result arrives, and removes the whole directory
+on shutdown.
+'''
+
+import os
+import mmap
+import shutil
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+SHARED_BUFFER_THRESHOLD = 1024*1024
+
+
+def _default_directory():
+    ''' Prefer the memory backed /dev/shm, fall back to the temp directory
+    '''
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class SharedBuffer(object):
+    ''' Handle to a buffer held in a memory mapped file.
+    '''
+
+    __slots__ = ('path', 'size')
+
+    def __init__ (self, path, size):
+        self.path = path
+        self.size = size
+
+    def __getstate__ (self):
+        return (self.path, self.size)
+
+    def __setstate__ (self, state):
+        self.path, self.size = state
+
+    def __repr__ (self):
+        return "<SharedBuffer {0} {1} bytes>".format(self.path, self.size)
+
+    def map(self):
+        ''' Map the file copy-on-write and return a memoryview on it. The mapping
+        stays valid after the executor removes the file.
+        '''
+        with open(self.path, 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_COPY))
+
+
+def map_buffers(bufs):
+    ''' Replace the SharedBuffer handles in a list of buffers with their mapped data
+    '''
+    return [buf.map() if isinstance(buf, SharedBuffer) else buf for buf in bufs]
+
+
+class SharedBufferStore(object):
+    ''' Executor side store of the shared buffers of in-flight tasks.
+    '''
+
+    def __init__ (self, directory=None, threshold=SHARED_BUFFER_THRESHOLD):
+        ''' Create a private directory for the buffer files
+
+        KWargs:
+             - directory (string) : Where to create the buffer directory. Default: /dev/shm or the temp dir
+             - threshold (int) : Buffers larger than this many bytes are shared. Default: 1MB
+        '''
+
+        self.threshold = threshold
+        self.directory = tempfile.mkdtemp(prefix="parsl_shm_", dir=directory or _default_directory())
+        self.bytes_shared = 0
+        self._tasks = {}
+        self._lock = threading.Lock()
+        logger.debug("Shared buffers in %s for buffers over %s bytes", self.directory, threshold)
+
+    def export(self, task_id, bufs):
+        ''' Write the large buffers of a task to shared files.
+
+        Args:
+             - task_id : Id the files are released under
+             - bufs (list) : Buffers as returned by pack_apply_message or pack_args
+
+        Returns:
+             - list of buffers with the large ones replaced by SharedBuffer handles
+        '''
+
+        out = []
+        paths = []
+        for i, buf in enumerate(bufs):
+            view = memoryview(buf)
+            if view.nbytes <= self.threshold:
+                out.append(buf)
+                continue
+
+            path = os.path.join(self.directory, "{0}.{1}".format(task_id, i))
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(view.cast('B'))
+            paths.append(path)
+            out.append(SharedBuffer(path, view.nbytes))
+
+        if paths:
+            with self._lock:
+                self._tasks[task_id] = paths
+                self.bytes_shared += sum(handle.size for handle in out if isinstance(handle, SharedBuffer))
+
+        return out
+
+    def release(self, task_id):
+        ''' Remove the files of a completed task
+        '''
+
+        with self._lock:
+            paths = self._tasks.pop(task_id, [])
+
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning("Failed to remove shared buffer %s : %s", path, e)
+
+    def close(self):
+        ''' Remove all files, including those of tasks still in flight
+        '''
+
+        with self._lock:
+            self._tasks = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
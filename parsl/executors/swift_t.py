@@ -7,6 +7,7 @@ to some extent.
 from concurrent.futures import Future
 import logging
 import uuid
+import time
 import threading
 import queue
 import multiprocessing as mp
@@ -14,7 +15,11 @@ import multiprocessing as mp
 from ipyparallel.serialize import pack_apply_message, unpack_apply_message
 from ipyparallel.serialize import serialize_object, deserialize_object
 
-from parsl.executors.base import ParslExecutor
+from parsl.executors.base import ParslExecutor, TaskCounters
+from parsl.executors.function_registry import FunctionRegistry, FunctionCache, LRUCache, unpack_args, FN_CACHE_SIZE
+from parsl.executors.shared_buffers import SharedBufferStore, map_buffers, SHARED_BUFFER_THRESHOLD
+from parsl.executors.object_store import ObjectRef, ObjectStore, map_refs, REF_THRESHOLD
+from parsl.app.rusage import Measured
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +27,15 @@ logger = logging.getLogger(__name__)
 BUFFER_THRESHOLD = 1024*1024
 ITEM_THRESHOLD = 1024
 
+# Defaults for the batched wire protocol
+TASK_BATCH_SIZE = 256
+RESULT_BATCH_SIZE = 256
+BATCH_TIMEOUT = 0.01 # seconds
 
-def runner(incoming_q, outgoing_q):
+
+def runner(incoming_q, outgoing_q, result_batch_size=RESULT_BATCH_SIZE,
+           batch_timeout=BATCH_TIMEOUT, fn_cache_size=FN_CACHE_SIZE, ref_threshold=None,
+           fetch_q=None):
     ''' This is a function that mocks the Swift-T side. It listens on the the
     incoming_q for tasks and posts returns on the outgoing_q
 
@@ -31,43 +43,81 @@ def runner(incoming_q, outgoing_q):
          - incoming_q (Queue object) : The queue to listen on
          - outgoing_q (Queue object) : Queue to post results on
 
-    The messages posted on the incoming_q will be of the form :
+    KWargs:
+         - result_batch_size (int) : Max results packed into one response message
+         - batch_timeout (float) : Max seconds a result is held back before the batch is flushed
+         - fn_cache_size (int) : Number of functions kept in the runner's function cache
+         - ref_threshold (int) : Results larger than this many bytes are kept in the runner and
+           returned by reference. Default: None, all results are returned by value
+         - fetch_q (Queue object) : Queue to post fetched objects on. Default: None, use outgoing_q
+
+    The messages posted on the incoming_q will be lists of tasks of the form :
 
     .. code:: python
 
-       {
+       [ {
           "task_id" : <uuid.uuid4 string>,
           "buffer"  : serialized buffer containing the fn, args and kwargs
-       }
+         },
+         ...
+       ]
+
+    When the executor uses the function registry, tasks instead carry "fn_hash",
+    "buffer" with just the args and kwargs, and "fn_buffer" the first time a function
+    is sent. See :mod:`parsl.executors.function_registry`. Large buffers may be
+    replaced by handles to shared memory, see :mod:`parsl.executors.shared_buffers`.
+
+    Batches may also carry ``{"task_id" : <id>, "fetch" : <key>}`` to return a stored
+    object by value on the fetch_q, and ``{"release" : <key>}`` to drop it from the store.
+    See :mod:`parsl.executors.object_store`.
 
     If ``None`` is received, the runner will exit.
 
-    Response messages should be of the form:
+    Response messages are lists of results of the form:
 
     .. code:: python
 
-       {
+       [ {
           "task_id" : <uuid.uuid4 string>,
           "result"  : serialized buffer containing result
+          "ref" : (key, size) of a result kept in the runner's object store
           "exception" : serialized exception object
-       }
+         },
+         ...
+       ]
+
+    A response batch is flushed when it holds result_batch_size results, when batch_timeout
+    has elapsed since its first result was added, or when all tasks from the current incoming
+    batch are done. The timeout is kept by a thread of its own, so a long task does not hold
+    back the results of the tasks that finished before it.
 
     On exiting the runner will post ``None`` to the outgoing_q
 
     '''
     logger.debug("[RUNNER] Starting")
 
-    def execute_task(bufs):
-        ''' Deserialize the buf, and execute the task.
-        Returns the serialized result/exception
+    fn_cache = FunctionCache(fn_cache_size)
+    store = ObjectStore(ref_threshold)
+
+    def execute_task(task):
+        ''' Deserialize the task, and execute it.
+        Returns the result or raises exception
         '''
         all_names = dir(__builtins__)
         user_ns   = locals()
         user_ns.update( {'__builtins__' : {k : getattr(__builtins__, k)  for k in all_names} } )
 
-        f, args, kwargs = unpack_apply_message(bufs, user_ns, copy=False)
+        if 'fn_hash' in task:
+            # Cache the function before anything that may fail, the sender counts it as
+            # shipped and later tasks come without it
+            f = fn_cache.lookup(task['fn_hash'], task.get('fn_buffer'), user_ns)
+            args, kwargs = unpack_args(map_buffers(task['buffer']), user_ns)
+        else:
+            bufs = map_buffers(task['buffer'])
+            f, args, kwargs = unpack_apply_message(bufs, user_ns, copy=False)
+
+        args, kwargs = store.dereference(args, kwargs)
 
-        fname = getattr(f, '__name__', 'f')
         prefix     = "parsl_"
         fname      = prefix+"f"
         argname    = prefix+"args"
@@ -84,7 +134,7 @@ def runner(incoming_q, outgoing_q):
 
         try:
 
-            print("[RUNNER] Executing : {0}".format(code))
+            logger.debug("[RUNNER] Executing : {0}".format(code))
             exec(code, user_ns, user_ns)
 
         except Exception as e:
@@ -92,10 +142,58 @@ def runner(incoming_q, outgoing_q):
             raise e
 
         else :
-            #print("Done : {0}".format(locals()))
-            print("[RUNNER] Result    : {0}".format(user_ns.get(resultname)))
             return user_ns.get(resultname)
 
+    results = []
+    first_result = None
+    results_cv = threading.Condition()
+    running = True
+
+    def flush_results():
+        ''' Post all buffered results as a single message
+        '''
+        nonlocal results
+        with results_cv:
+            batch, results = results, []
+            if batch:
+                outgoing_q.put(batch)
+
+    def add_result(response):
+        ''' Buffer a result, posting the batch when it is full
+        '''
+        nonlocal first_result
+        with results_cv:
+            results.append(response)
+            if len(results) >= result_batch_size:
+                flush_results()
+            elif len(results) == 1:
+                first_result = time.time()
+                results_cv.notify()
+
+    def result_flush_worker():
+        ''' Post a partial batch of results once its first result has waited batch_timeout
+        '''
+        with results_cv:
+            while running:
+                if not results:
+                    results_cv.wait()
+                    continue
+                remaining = first_result + batch_timeout - time.time()
+                if remaining > 0:
+                    results_cv.wait(remaining)
+                    continue
+                flush_results()
+
+    flush_thread = threading.Thread(target=result_flush_worker, name="Runner-Result-Flush")
+    flush_thread.daemon = True
+    flush_thread.start()
+
+    def stop_flush_thread():
+        nonlocal running
+        with results_cv:
+            running = False
+            results_cv.notify()
+        flush_thread.join()
 
     while True :
         try:
@@ -109,6 +207,7 @@ def runner(incoming_q, outgoing_q):
 
         except IOError as ioerror:
             logger.debug("[RUNNER] broken pipe, error: %s", ioerror)
+            stop_flush_thread()
             try:
                 # Attempt to send a stop notification to the management thread
                 outgoing_q.put(None)
@@ -126,25 +225,54 @@ def runner(incoming_q, outgoing_q):
             if not msg :
                 # Empty message is a die request
                 logger.debug("[RUNNER] Received exit request")
+                stop_flush_thread()
+                flush_results()
                 outgoing_q.put(None)
                 break
             else:
-                # Received a valid message, handle it
-                logger.debug("[RUNNER] Got a valid task : %s", msg["task_id"])
-                try:
-                    response_obj = execute_task(msg['buffer'])
-                    response = {"task_id" : msg["task_id"],
-                                "result"  : serialize_object(response_obj)}
-
-                    logger.warning("[RUNNER] Returing result : %s",
-                                   deserialize_object(response["result"]) )
-
-                except Exception as e:
-                    logger.debug("[RUNNER] Caught task exception")
-                    response = {"task_id" : msg["task_id"],
-                                "exception"  : serialize_object(e)}
-
-                outgoing_q.put(response)
+                # Received a valid batch, handle each task in it
+                logger.debug("[RUNNER] Got a batch of %s tasks", len(msg))
+                for task in msg:
+                    if "release" in task:
+                        store.release(task["release"])
+                        continue
+
+                    try:
+                        if "fetch" in task:
+                            response = {"task_id" : task["task_id"],
+                                        "result"  : serialize_object(store.get(task["fetch"]))}
+
+                        else:
+                            response_obj = execute_task(task)
+                            bufs = serialize_object(response_obj)
+                            key = str(task["task_id"])
+                            # The usage of a measured result goes back with its reference
+                            usage = None
+                            if isinstance(response_obj, Measured):
+                                usage = response_obj.usage
+                                response_obj = response_obj.result
+                            size = store.keep(key, response_obj, bufs)
+                            if size is None:
+                                response = {"task_id" : task["task_id"],
+                                            "result"  : bufs}
+                            else:
+                                response = {"task_id" : task["task_id"],
+                                            "ref"  : (key, size),
+                                            "usage" : usage}
+
+                    except Exception as e:
+                        logger.debug("[RUNNER] Caught task exception")
+                        response = {"task_id" : task["task_id"],
+                                    "exception"  : serialize_object(e)}
+
+                    if "fetch" in task and fetch_q is not None:
+                        fetch_q.put(response)
+                        continue
+
+                    add_result(response)
+
+                # Nothing else is in flight for this runner, don't hold results back
+                flush_results()
 
     logger.debug("[RUNNER] Terminating")
 
@@ -176,7 +304,8 @@ class TurbineExecutor(ParslExecutor):
         ''' The queue management worker is responsible for listening to the incoming_q
         for task status messages and updating tasks with results/exceptions/updates
 
-        It expects the following messages:
+        Each message is a list (batch) of results, and every future in the batch is
+        resolved on a single wake-up. It expects the following messages in the list:
 
         .. code:: python
 
@@ -215,7 +344,8 @@ class TurbineExecutor(ParslExecutor):
 
             except queue.Empty as e:
                 # timed out.
-                pass
+                if not self.isAlive:
+                    break
 
             except IOError as e:
                 logger.debug("[MTHREAD] caught broken queue : %s : errno:%s", e, e.errno)
@@ -232,18 +362,25 @@ class TurbineExecutor(ParslExecutor):
                     return
 
                 else:
-                    logger.debug("[MTHREAD] Got message : %s", msg)
-                    task_fut = self.tasks[msg['task_id']]
-                    if 'result' in msg:
-                        result, _ = deserialize_object(msg['result'])
-                        task_fut.set_result(result)
-
-                    elif 'exception' in msg:
-                        exception, _ = deserialize_object(msg['exception'])
-                        task_fut.set_exception(exception)
-
-            if not self.isAlive:
-                break
+                    logger.debug("[MTHREAD] Got batch of %s results", len(msg))
+                    for result_msg in msg:
+                        if self.shared:
+                            self.shared.release(result_msg['task_id'])
+                        task_fut = self.tasks.pop(result_msg['task_id'])
+                        if 'result' in result_msg:
+                            result, _ = deserialize_object(result_msg['result'])
+                            task_fut.set_result(result)
+
+                        elif 'ref' in result_msg:
+                            key, size = result_msg['ref']
+                            ref = ObjectRef(key, size, owner=self)
+                            if result_msg.get('usage') is not None:
+                                ref = Measured(ref, result_msg['usage'])
+                            task_fut.set_result(ref)
+
+                        elif 'exception' in result_msg:
+                            exception, _ = deserialize_object(result_msg['exception'])
+                            task_fut.set_exception(exception)
 
     # When the executor gets lost, the weakref callback will wake up
     # the queue management thread.
@@ -269,47 +406,250 @@ class TurbineExecutor(ParslExecutor):
         else:
             logging.debug("Management thread already exists, returning")
 
+    def _flush_task_batch(self):
+        ''' Post all pending tasks to the outgoing_q as a single message.
+        Must be called with self._batch_cv held.
+        '''
+
+        if self._task_batch:
+            self.outgoing_q.put(self._task_batch)
+            self._task_batch = []
+
+    def _batch_flush_worker(self):
+        ''' The batch flush worker posts a partially filled task batch once the
+        oldest task in it has waited batch_timeout seconds. Full batches are
+        flushed directly from submit.
+        '''
+
+        with self._batch_cv:
+            while self.isAlive:
+                if not self._task_batch:
+                    self._batch_cv.wait()
+                    continue
+
+                remaining = self._batch_started + self.batch_timeout - time.time()
+                if remaining > 0:
+                    self._batch_cv.wait(remaining)
+                    continue
+
+                self._flush_task_batch()
+
+    def _post(self, msg):
+        ''' Add a message to the current batch, post the batch to the outgoing queue
+        when full. Must be called with self._batch_cv held.
+        '''
+
+        self._task_batch.append(msg)
+        if len(self._task_batch) >= self.task_batch_size:
+            self._flush_task_batch()
+        elif len(self._task_batch) == 1:
+            self._batch_started = time.time()
+            self._batch_cv.notify()
+
+    def _outgoing_ref(self, ref):
+        ''' Pass references to objects held by our runner through, and send
+        everything else by value. Released references are passed through, the
+        runner fails the task with ObjectEvicted.
+        '''
+
+        if ref.materialized:
+            return ref.materialize()
+        if ref.owner is self or ref.released:
+            return ref
+        return ref.materialize()
+
+    def fetch(self, ref, timeout=None):
+        ''' Fetch an object held by reference from the runner. Replies come back on
+        their own queue, so this is safe to call from a done callback.
+
+        Args:
+            - ref (ObjectRef) : Reference returned by this executor
+
+        Kwargs:
+            - timeout (float) : Seconds to wait for the object
+
+        Returns:
+              The object
+        '''
+
+        fetch_id = uuid.uuid4()
+        with self._fetch_lock:
+            with self._batch_cv:
+                self._post({"task_id" : fetch_id, "fetch" : ref.key})
+                self._flush_task_batch()
+
+            # Skip replies to earlier fetches that timed out
+            reply = self.fetch_q.get(timeout=timeout)
+            while reply["task_id"] != fetch_id:
+                reply = self.fetch_q.get(timeout=timeout)
+
+        if "exception" in reply:
+            exception, _ = deserialize_object(reply["exception"])
+            raise exception
+
+        result, _ = deserialize_object(reply["result"])
+        return result
+
+    def release_ref(self, ref):
+        ''' Drop an object held by reference from the runner's store
+        '''
+
+        with self._batch_cv:
+            self._post({"release" : ref.key})
+
     def shutdown(self):
         ''' Shutdown method, to kill the threads and workers.
         '''
 
-        self.isAlive = False
-        logging.debug("Waking management thread")
-        self.incoming_q.put(None) # Wake up the thread
+        with self._batch_cv:
+            self._flush_task_batch()
+            self.isAlive = False
+            self._batch_cv.notify()
+
+        logging.debug("Sending exit request to the worker")
+        self.outgoing_q.put(None) # The runner echoes None back, which stops the thread
         self._queue_management_thread.join() # Force join
+        self._batch_flush_thread.join()
         logging.debug("Exiting thread")
         self.worker.join()
+        if self.shared:
+            self.shared.close()
         return True
 
-    def __init__ (self, swift_attribs=None, config=None, **kwargs):
+    def __init__ (self, swift_attribs=None, config=None, task_batch_size=TASK_BATCH_SIZE,
+                  result_batch_size=RESULT_BATCH_SIZE, batch_timeout=BATCH_TIMEOUT,
+                  function_registry=True, fn_cache_size=FN_CACHE_SIZE, shared_buffers=True,
+                  shared_buffer_threshold=SHARED_BUFFER_THRESHOLD, shared_buffer_dir=None,
+                  results_by_reference=False, ref_threshold=REF_THRESHOLD, **kwargs):
         ''' Initialize the thread pool
         Trying to implement the emews model.
 
+        Config options that are used are :
+
+        config.sites.site.execution = {"taskBatchSize" : <int>,
+                                       "resultBatchSize" : <int>,
+                                       "batchTimeout" : <float>,
+                                       "functionRegistry" : <Bool>,
+                                       "fnCacheSize" : <int>,
+                                       "sharedBuffers" : <Bool>,
+                                       "sharedBufferThreshold" : <int>,
+                                       "sharedBufferDir" : <string>,
+                                       "resultsByReference" : <Bool>,
+                                       "refThreshold" : <int>}
+
         Kwargs:
             - swift_attribs : Takes a dict of swift attribs. Fot future.
+            - config (dict): The config dict object for the site
+            - task_batch_size (int) : Max tasks packed into one message to the worker (Default=256)
+            - result_batch_size (int) : Max results packed into one message from the worker (Default=256)
+            - batch_timeout (float) : Max seconds a task or result waits for its batch to fill (Default=0.01)
+            - function_registry (Bool) : Send each function to the runner once and refer to it by hash after (Default=True)
+            - fn_cache_size (int) : Number of functions the runner caches (Default=128)
+            - shared_buffers (Bool) : Pass argument buffers over shared_buffer_threshold bytes through shared memory (Default=True)
+            - shared_buffer_threshold (int) : Size in bytes above which buffers are shared (Default=1MB)
+            - shared_buffer_dir (string) : Directory for the shared buffer files (Default=/dev/shm or the temp dir)
+            - results_by_reference (Bool) : Keep results over ref_threshold bytes in the runner and resolve
+              futures to an ObjectRef, see :mod:`parsl.executors.object_store` (Default=False)
+            - ref_threshold (int) : Size in bytes above which results are kept by reference (Default=1MB)
 
         '''
+        self._scaling_enabled = False
+        if not config :
+            config = {"execution" : { } }
+        if "taskBatchSize" not in config["execution"]:
+            config["execution"]["taskBatchSize"] = task_batch_size
+        if "resultBatchSize" not in config["execution"]:
+            config["execution"]["resultBatchSize"] = result_batch_size
+        if "batchTimeout" not in config["execution"]:
+            config["execution"]["batchTimeout"] = batch_timeout
+        if "functionRegistry" not in config["execution"]:
+            config["execution"]["functionRegistry"] = function_registry
+        if "fnCacheSize" not in config["execution"]:
+            config["execution"]["fnCacheSize"] = fn_cache_size
+        if "sharedBuffers" not in config["execution"]:
+            config["execution"]["sharedBuffers"] = shared_buffers
+        if "sharedBufferThreshold" not in config["execution"]:
+            config["execution"]["sharedBufferThreshold"] = shared_buffer_threshold
+        if "sharedBufferDir" not in config["execution"]:
+            config["execution"]["sharedBufferDir"] = shared_buffer_dir
+        if "resultsByReference" not in config["execution"]:
+            config["execution"]["resultsByReference"] = results_by_reference
+        if "refThreshold" not in config["execution"]:
+            config["execution"]["refThreshold"] = ref_threshold
+
         self.config = config
+        self.task_batch_size = config["execution"]["taskBatchSize"]
+        self.result_batch_size = config["execution"]["resultBatchSize"]
+        self.batch_timeout = config["execution"]["batchTimeout"]
+        self.fn_cache_size = config["execution"]["fnCacheSize"]
+        self.ref_threshold = None
+        if config["execution"]["resultsByReference"]:
+            self.ref_threshold = config["execution"]["refThreshold"]
+
+        self.registry = None
+        if config["execution"]["functionRegistry"]:
+            self.registry = FunctionRegistry(BUFFER_THRESHOLD, ITEM_THRESHOLD)
+            # Mirror of the functions held in the runner's cache
+            self._shipped = LRUCache(self.fn_cache_size)
+
+        # The runner is always on this host, so large buffers can go through shared memory
+        self.shared = None
+        if config["execution"]["sharedBuffers"]:
+            self.shared = SharedBufferStore(config["execution"]["sharedBufferDir"],
+                                            config["execution"]["sharedBufferThreshold"])
+
         logger.debug("In __init__")
         self.mp_manager = mp.Manager()
         self.outgoing_q = self.mp_manager.Queue()
         self.incoming_q = self.mp_manager.Queue()
+        self.fetch_q = self.mp_manager.Queue()
+        self._fetch_lock = threading.Lock()
         self.isAlive   = True
+        self.tasks   = {}
+        self.counters = TaskCounters()
+
+        self._task_batch = []
+        self._batch_started = None
+        self._batch_cv = threading.Condition()
+        self._batch_flush_thread = threading.Thread(target=self._batch_flush_worker)
+        self._batch_flush_thread.daemon = True
+        self._batch_flush_thread.start()
 
         self._queue_management_thread = None
         self._start_queue_management_thread()
         logger.debug("Created management thread : %s", self._queue_management_thread)
 
-        self.worker  = mp.Process(target=runner, args = (self.outgoing_q, self.incoming_q))
+        self.worker  = mp.Process(target=runner, args = (self.outgoing_q, self.incoming_q,
+                                                         self.result_batch_size,
+                                                         self.batch_timeout,
+                                                         self.fn_cache_size,
+                                                         self.ref_threshold,
+                                                         self.fetch_q))
         self.worker.start()
         logger.debug("Created worker : %s", self.worker)
-        self.tasks   = {}
+
+    @property
+    def scaling_enabled(self):
+        return self._scaling_enabled
+
+    @property
+    def running(self):
+        ''' The runner executes one task at a time
+        '''
+        return min(self.counters.outstanding, 1)
+
+    @property
+    def queued(self):
+        return self.counters.outstanding - self.running
 
     def submit (self, func, *args, **kwargs):
         ''' Submits work to the the outgoing_q, an external process listens on this
         queue for new work. This method is simply pass through and behaves like a
         submit call as described here `Python docs: <https://docs.python.org/3/library/concurrent.futures.html#concurrent.futures.ThreadPoolExecutor>`_
 
+        Tasks are buffered and posted in batches of task_batch_size, a partial batch
+        is posted once its oldest task has waited batch_timeout seconds.
+
         Args:
             - func (callable) : Callable function
             - *args (list) : List of arbitrary positional arguments.
@@ -324,20 +664,37 @@ class TurbineExecutor(ParslExecutor):
 
         logger.debug("Before pushing to queue : func:%s func_args:%s", func, args)
 
-        self.tasks[task_id] = Future()
+        fut = Future()
+        self.tasks[task_id] = fut
+        self.counters.track(fut)
+
+        # References to objects on our runner are passed through, it swaps them for the objects
+        args, kwargs = map_refs(self._outgoing_ref, args, kwargs)
+
+        if self.registry:
+            msg, fn_buffer = self.registry.pack_task(task_id, func, args, kwargs)
+
+        else:
+            fn_buf  = pack_apply_message(func, args, kwargs,
+                                         buffer_threshold=BUFFER_THRESHOLD,
+                                         item_threshold=ITEM_THRESHOLD)
+
+            msg = {"task_id" : task_id,
+                   "buffer"  : fn_buf }
 
-        fn_buf  = pack_apply_message(func, args, kwargs,
-                                     buffer_threshold=1024*1024,
-                                     item_threshold=1024)
+        if self.shared:
+            msg["buffer"] = self.shared.export(task_id, msg["buffer"])
 
-        msg = {"task_id" : task_id,
-               "buffer"  : fn_buf }
+        # Add the task to the current batch, post to the outgoing queue when full
+        with self._batch_cv:
+            # Tasks reach the runner in batch order, so the mirror is updated in that order
+            if self.registry and not self._shipped.touch(msg["fn_hash"]):
+                msg["fn_buffer"] = fn_buffer
 
-        # Post task to the the outgoing queue
-        self.outgoing_q.put(msg)
+            self._post(msg)
 
         # Return the future
-        return self.tasks[task_id]
+        return fut
 
 
     def scale_out (self, workers=1):
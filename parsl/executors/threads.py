@@ -1,7 +1,7 @@
 import logging
 import sys
 import concurrent.futures as cf
-from parsl.executors.base import ParslExecutor
+from parsl.executors.base import ParslExecutor, TaskCounters
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +34,7 @@ class ThreadPoolExecutor(ParslExecutor):
             config["execution"]["threadNamePrefix"] = thread_name_prefix
 
         self.config = config
+        self.counters = TaskCounters()
 
         if sys.version_info > (3,6):
             self.executor = cf.ThreadPoolExecutor(max_workers=config["execution"]["maxThreads"],
@@ -46,7 +47,16 @@ class ThreadPoolExecutor(ParslExecutor):
     def scaling_enabled(self):
         return self._scaling_enabled
 
-    def submit (self, *args, **kwargs):
+    def _run(self, fn, args, kwargs):
+        ''' Runs fn in a pool thread, counting it as running while it does
+        '''
+        self.counters.started()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.counters.stopped()
+
+    def submit (self, fn, *args, **kwargs):
         ''' Submits work to the thread pool
         This method is simply pass through and behaves like a submit call as described
         here `Python docs: <https://docs.python.org/3/library/concurrent.futures.html#concurrent.futures.ThreadPoolExecutor>`_
@@ -55,7 +65,9 @@ class ThreadPoolExecutor(ParslExecutor):
               Future
         '''
 
-        return self.executor.submit(*args, **kwargs)
+        fut = self.executor.submit(self._run, fn, args, kwargs)
+        self.counters.track(fut)
+        return fut
 
     def scale_out (self, workers=1):
         ''' Scales out the number of active workers by 1
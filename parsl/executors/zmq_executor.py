@@ -0,0 +1,394 @@
+''' ZeroMQ interchange based executor.
+
+A high throughput alternative to the IPyParallel executor that needs no ipcontroller.
+'''
+
+import queue
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from concurrent.futures import Future
+
+from ipyparallel.serialize import pack_apply_message, deserialize_object
+
+from parsl.executors.base import ParslExecutor, TaskCounters, task_slots_per_launch
+from parsl.executors.errors import *
+from parsl.executors.blocks import BlockProvisioner, STATUS_TTL, SUBMIT_THREADS
+from parsl.executors.zmq_plumbing import TasksOutgoing, ResultsIncoming
+from parsl.executors.function_registry import FunctionRegistry, LRUCache, FN_CACHE_SIZE
+from parsl.executors.shared_buffers import SharedBufferStore, SHARED_BUFFER_THRESHOLD
+from parsl.executors import interchange
+
+logger = logging.getLogger(__name__)
+
+BUFFER_THRESHOLD = 1024*1024
+ITEM_THRESHOLD = 1024
+
+DEFAULT_LAUNCH_CMD = ("python3 -m parsl.executors.zmq_worker --url={url} --workers={workers} "
+                      "--prefetch={prefetch} --hb_period={heartbeat_period} "
+                      "--hb_threshold={heartbeat_threshold} --fn_cache_size={fn_cache_size}")
+
+
+class ZMQExecutor(ParslExecutor):
+    ''' The ZeroMQ executor.
+
+    Tasks are sent to an interchange process on the client side, which hands them out in
+    batches to worker managers that connect to it over ZeroMQ. A manager is launched per
+    block through the execution provider and runs taskBlocks worker processes.
+
+    .. code:: python
+
+                        |  Data   |  Executor   | Interchange |  Worker managers
+                        |  Flow   |             |  process    |
+                   Task | Kernel  |             |             |
+                 +----->|-------->|------------>|-> pending --|--> Manager --> workers
+                 |      |         |             |   tasks     |   (taskBlocks + prefetch)
+           Parsl<---Fut-|         |             |             |      |
+                     ^  |         |   Q_mngmnt  |             |      |
+                     |  |         |    Thread<--|<- results <-|------+
+                     |  |         |      |      |             |
+                     +----update_fut-----+
+
+    Managers hold capacity for taskBlocks + prefetch tasks and return results in
+    batches. Heartbeats flow both ways, tasks on a manager that goes silent fail
+    with ManagerLost.
+    '''
+
+    def __init__ (self, execution_provider=None, controller=None, config=None,
+                  worker_address='127.0.0.1', worker_port=None, worker_port_range=(54000, 55000),
+                  workers_per_block=1, prefetch=0, heartbeat_period=30, heartbeat_threshold=120,
+                  function_registry=True, fn_cache_size=FN_CACHE_SIZE, shared_buffers=False,
+                  shared_buffer_threshold=SHARED_BUFFER_THRESHOLD, shared_buffer_dir=None,
+                  launch_cmd=DEFAULT_LAUNCH_CMD, **kwargs):
+        ''' Start the interchange and, if an execution_provider is attached, the initBlocks.
+
+        Config options that are used are :
+
+        config.sites.site.execution = {"workerAddress" : <string>,
+                                       "workerPort" : <int>,
+                                       "workerPortRange" : <string min,max>,
+                                       "prefetch" : <int>,
+                                       "heartbeatPeriod" : <int>,
+                                       "heartbeatThreshold" : <int>,
+                                       "functionRegistry" : <Bool>,
+                                       "fnCacheSize" : <int>,
+                                       "sharedBuffers" : <Bool>,
+                                       "sharedBufferThreshold" : <int>,
+                                       "sharedBufferDir" : <string>,
+                                       "launchCmd" : <string>,
+                                       "statusTTL" : <float>,
+                                       "submitThreads" : <int>,
+                                       "block" : {"taskBlocks" : <int or bash expression>}}
+
+        KWargs:
+             - execution_provider (ExecutionProvider object)
+             - controller : Ignored, no controller is needed
+             - config (dict): The config dict object for the site
+             - worker_address (string) : Address the managers use to reach the interchange. Default: 127.0.0.1
+             - worker_port (int) : Port for managers to connect to. Default: random from worker_port_range
+             - worker_port_range (tuple) : (min, max) ports. Default: (54000, 55000)
+             - workers_per_block (int) : Workers per manager, when no taskBlocks is configured. Default: 1
+             - prefetch (int) : Tasks each manager holds in excess of its workers. Default: 0
+             - heartbeat_period (int) : Seconds between heartbeats. Default: 30
+             - heartbeat_threshold (int) : Seconds of silence after which a manager or interchange is lost. Default: 120
+             - function_registry (Bool) : Send each function to a manager once and refer to it by hash after. Default: True
+             - fn_cache_size (int) : Number of functions cached by the interchange, managers and workers. Default: 128
+             - shared_buffers (Bool) : Pass argument buffers over shared_buffer_threshold bytes through
+               shared memory. Only for managers on the same host as the executor. Default: False
+             - shared_buffer_threshold (int) : Size in bytes above which buffers are shared. Default: 1MB
+             - shared_buffer_dir (string) : Directory for the shared buffer files. Default: /dev/shm or the temp dir
+             - launch_cmd (string) : Template for the manager launch command, see DEFAULT_LAUNCH_CMD
+        '''
+
+        if not config :
+            config = {"execution" : { } }
+
+        execution = config["execution"]
+        self.config = config
+        self.sitename = config['site'] if 'site' in config else 'Static_ZMQ'
+        self.worker_address = execution.get("workerAddress", worker_address)
+        self.worker_port = execution.get("workerPort", worker_port)
+        if "workerPortRange" in execution:
+            worker_port_range = tuple(map(int, execution["workerPortRange"].split(',')))
+        self.worker_port_range = worker_port_range
+        self.prefetch = execution.get("prefetch", prefetch)
+        self.heartbeat_period = execution.get("heartbeatPeriod", heartbeat_period)
+        self.heartbeat_threshold = execution.get("heartbeatThreshold", heartbeat_threshold)
+        self.workers_per_block = workers_per_block
+        if "taskBlocks" in execution.get("block", {}):
+            # Launchers already start taskBlocks managers per block
+            self.workers_per_block = task_slots_per_launch(config)
+        self.fn_cache_size = execution.get("fnCacheSize", fn_cache_size)
+
+        self.registry = None
+        if execution.get("functionRegistry", function_registry):
+            self.registry = FunctionRegistry(BUFFER_THRESHOLD, ITEM_THRESHOLD)
+            # Mirror of the functions held by the interchange
+            self._shipped = LRUCache(self.fn_cache_size)
+        self._submit_lock = threading.Lock()
+
+        self.shared = None
+        if execution.get("sharedBuffers", shared_buffers):
+            self.shared = SharedBufferStore(execution.get("sharedBufferDir", shared_buffer_dir),
+                                            execution.get("sharedBufferThreshold", shared_buffer_threshold))
+
+        self.tasks = {}
+        self.counters = TaskCounters()
+        self._task_counter = itertools.count()
+        self.isAlive = True
+
+        self._start_interchange()
+
+        self.launch_cmd = execution.get("launchCmd", launch_cmd).format(
+            url="tcp://{0}:{1}".format(self.worker_address, self.worker_port),
+            workers=self.workers_per_block,
+            prefetch=self.prefetch,
+            heartbeat_period=self.heartbeat_period,
+            heartbeat_threshold=self.heartbeat_threshold,
+            fn_cache_size=self.fn_cache_size)
+
+        self._queue_management_thread = None
+        self._start_queue_management_thread()
+
+        self.execution_provider = execution_provider
+        self.engines = []
+        self.provisioner = None
+
+        if execution_provider:
+            self._scaling_enabled = True
+            logger.debug("Starting ZMQExecutor with provider:%s", execution_provider)
+            self.provisioner = BlockProvisioner(execution_provider, self.launch_cmd,
+                                                execution_provider.sitename,
+                                                status_ttl=execution.get("statusTTL", STATUS_TTL),
+                                                submit_threads=execution.get("submitThreads", SUBMIT_THREADS))
+            self.engines = self.provisioner.blocks
+            try:
+                self.provisioner.scale_out(execution["block"].get("initBlocks", 1)).result()
+
+            except Exception as e:
+                logger.error("Scaling out failed : %s", e)
+                raise e
+
+        else:
+            self._scaling_enabled = False
+            logger.debug("Starting ZMQExecutor with no provider")
+
+    def _start_interchange(self):
+        ''' Fork the interchange and connect to the ports it reports back.
+        The interchange creates its own zmq context after the fork.
+        '''
+
+        comm_q = mp.Queue()
+        self.interchange = mp.Process(target=interchange.starter,
+                                      args=(comm_q,),
+                                      kwargs={"worker_port" : self.worker_port,
+                                              "worker_port_range" : self.worker_port_range,
+                                              "heartbeat_period" : self.heartbeat_period,
+                                              "heartbeat_threshold" : self.heartbeat_threshold,
+                                              "fn_cache_size" : self.fn_cache_size})
+        self.interchange.daemon = True
+        self.interchange.start()
+
+        try:
+            task_port, result_port, self.worker_port = comm_q.get(block=True, timeout=120)
+        except queue.Empty:
+            msg = "Interchange failed to start"
+            logger.error(msg)
+            raise ScalingFailed(self.sitename, msg)
+
+        logger.debug("Interchange started, worker port:%s", self.worker_port)
+        self.outgoing_q = TasksOutgoing("tcp://127.0.0.1:{0}".format(task_port))
+        self.incoming_q = ResultsIncoming("tcp://127.0.0.1:{0}".format(result_port))
+
+    def _queue_management_worker(self):
+        ''' The queue management worker listens on the incoming_q for result batches
+        from the interchange and resolves every future in the batch.
+
+        Each message is a list of:
+
+        .. code:: python
+
+            {
+               "task_id" : <task_id>
+               "result"  : serialized result object, if task succeeded
+            }
+
+            {
+               "task_id" : <task_id>
+               "exception" : serialized exception object, on failure
+            }
+
+        or ``{"dispatched" : <count>}`` when the interchange hands tasks to managers,
+        which keeps the running count.
+        '''
+
+        while True:
+            try:
+                msg = self.incoming_q.get(block=True, timeout=1)
+
+            except queue.Empty:
+                if not self.isAlive:
+                    break
+
+            except Exception as e:
+                logger.debug("[MTHREAD] caught unknown exception : %s", e)
+                if not self.isAlive:
+                    break
+
+            else:
+                if isinstance(msg, dict):
+                    self.counters.started(msg['dispatched'])
+                    continue
+
+                logger.debug("[MTHREAD] Got batch of %s results", len(msg))
+                # Every task with a result was counted as dispatched before it
+                self.counters.stopped(len(msg))
+                for result_msg in msg:
+                    if self.shared:
+                        self.shared.release(result_msg['task_id'])
+                    task_fut = self.tasks.pop(result_msg['task_id'], None)
+                    if task_fut is None:
+                        logger.warning("[MTHREAD] Result for unknown task : %s", result_msg['task_id'])
+                        continue
+
+                    if 'result' in result_msg:
+                        result, _ = deserialize_object(result_msg['result'])
+                        task_fut.set_result(result)
+
+                    elif 'exception' in result_msg:
+                        exception, _ = deserialize_object(result_msg['exception'])
+                        task_fut.set_exception(exception)
+
+    def _start_queue_management_thread(self):
+        ''' Method to start the management thread as a daemon.
+        '''
+
+        if self._queue_management_thread is None:
+            logger.debug("Starting management thread ")
+            self._queue_management_thread = threading.Thread (target=self._queue_management_worker)
+            self._queue_management_thread.daemon = True
+            self._queue_management_thread.start()
+
+        else:
+            logger.debug("Management thread already exists, returning")
+
+    @property
+    def scaling_enabled(self):
+        return self._scaling_enabled
+
+    def submit (self, func, *args, **kwargs):
+        ''' Submits work to the interchange. This method is simply pass through and behaves
+        like a submit call as described here `Python docs: <https://docs.python.org/3/library/concurrent.futures.html#concurrent.futures.ThreadPoolExecutor>`_
+
+        Args:
+            - func (callable) : Callable function
+            - *args (list) : List of arbitrary positional arguments.
+
+        Kwargs:
+            - **kwargs (dict) : A dictionary of arbitrary keyword args for func.
+
+        Returns:
+              Future
+        '''
+
+        task_id = next(self._task_counter)
+        fut = Future()
+        self.tasks[task_id] = fut
+        self.counters.track(fut)
+
+        if self.registry:
+            msg, fn_buffer = self.registry.pack_task(task_id, func, args, kwargs)
+            if self.shared:
+                msg["buffer"] = self.shared.export(task_id, msg["buffer"])
+            # The interchange sees tasks in send order, so the mirror is updated in that order
+            with self._submit_lock:
+                if not self._shipped.touch(msg["fn_hash"]):
+                    msg["fn_buffer"] = fn_buffer
+                self.outgoing_q.put(msg)
+
+        else:
+            fn_buf = pack_apply_message(func, args, kwargs,
+                                        buffer_threshold=BUFFER_THRESHOLD,
+                                        item_threshold=ITEM_THRESHOLD)
+            if self.shared:
+                fn_buf = self.shared.export(task_id, fn_buf)
+
+            self.outgoing_q.put({"task_id" : task_id,
+                                 "buffer" : fn_buf})
+        return fut
+
+    def scale_out (self, blocks=1):
+        ''' Scales out the number of blocks by "blocks". The provider is called in
+        the background.
+
+        Kwargs:
+             - blocks (int) : Number of blocks to add. Default: 1
+
+        Returns:
+             - Future resolving to the list of new block ids, or None if no execution provider is attached
+        '''
+
+        if not self.provisioner :
+            logger.error("No execution provider available")
+            return None
+
+        return self.provisioner.scale_out(blocks)
+
+    def scale_in (self, blocks):
+        ''' Scale in the number of active blocks by "blocks". The provider is called in
+        the background.
+
+        Args:
+             - blocks (int) : Number of blocks to cancel
+
+        Returns:
+             - Future resolving to the cancel statuses, or None if no execution provider is attached
+        '''
+
+        if not self.provisioner :
+            logger.error("No execution provider available")
+            return None
+
+        return self.provisioner.scale_in(blocks)
+
+    def status (self):
+        ''' Returns the status of the blocks, including SUBMITTING entries for blocks
+        still being requested from the execution provider.
+        '''
+
+        if self.provisioner :
+            return self.provisioner.status()
+
+        return []
+
+    def shutdown (self, block=False):
+        ''' Shutdown the interchange and the management thread. Managers are asked to
+        stop by the interchange as it exits.
+
+        Kwargs:
+            - block (Bool): Wait for the interchange to exit
+        '''
+
+        self.isAlive = False
+        if self.provisioner:
+            self.provisioner.shutdown()
+        self.outgoing_q.put(None)
+        self._queue_management_thread.join()
+
+        if block:
+            self.interchange.join()
+        else:
+            self.interchange.join(timeout=2)
+            if self.interchange.is_alive():
+                self.interchange.terminate()
+
+        self.outgoing_q.close()
+        self.incoming_q.close()
+        if self.shared:
+            self.shared.close()
+        logger.debug("Done with executor shutdown")
+        return True
+
+    def __repr__ (self):
+        return "<ZMQ Executor for site:{0}>".format(self.sitename)
@@ -1,27 +1,131 @@
-import sys
-import time
+''' ZeroMQ plumbing used by the ZMQExecutor and its interchange.
+
+Every wrapper creates its sockets on a context passed in, or on a fresh context
+when none is given, so that forked processes (the interchange and the worker
+managers) never share a context with their parent.
+'''
+import queue
+import pickle
+import threading
+import logging
 import zmq
 
-context = zmq.Context()
+logger = logging.getLogger(__name__)
+
+
+class ZmQueue(object):
+    ''' A queue like wrapper around a PULL socket for incoming messages and
+    a PUSH socket for outgoing messages.
+    '''
+
+    def __init__ (self, incoming, outgoing, context=None):
+        ''' Connect to the incoming and outgoing urls
 
-class ZmQueue():
+        Args:
+             - incoming (string) : Url to receive messages from, eg. tcp://127.0.0.1:50001
+             - outgoing (string) : Url to post messages to
 
-    def __init__ (self, incoming, outgoing):
+        KWargs:
+             - context (zmq.Context) : Context to create sockets on. Default: new context
+        '''
 
-        self.incoming = context.socket(zmq.PULL)
+        self.context = context if context else zmq.Context()
+
+        self.incoming = self.context.socket(zmq.PULL)
         self.incoming.connect(incoming)
 
-        self.outgoing = context.socket(zmq.PUSH)
+        self.outgoing = self.context.socket(zmq.PUSH)
         self.outgoing.connect(outgoing)
 
     def get(self):
-        print("Waiting on ", self.incoming)
-        x = self.incoming.recv()
-        print("Received message ", x)
-        return x
+        ''' Blocking receive of a raw message
+        '''
+        return self.incoming.recv()
 
     def put(self, msg):
-        print("Posting on ", self.outgoing)
-        print("Sending message" , msg)
+        ''' Send a raw message
+        '''
         return self.outgoing.send(msg)
 
+
+class TasksOutgoing(object):
+    ''' Outgoing task queue from the executor to the interchange.
+
+    Messages are pickled python objects. ZeroMQ sockets are not thread safe
+    and tasks may be submitted from DFK callbacks on any thread, so the send
+    is guarded by a lock.
+    '''
+
+    def __init__ (self, url, context=None):
+        ''' Connect a PUSH socket to the interchange
+
+        Args:
+             - url (string) : Url the interchange listens for tasks on
+
+        KWargs:
+             - context (zmq.Context) : Context to create sockets on. Default: new context
+        '''
+
+        self.context = context if context else zmq.Context()
+        self.zmq_socket = self.context.socket(zmq.PUSH)
+        self.zmq_socket.setsockopt(zmq.LINGER, 0)
+        self.zmq_socket.connect(url)
+        self._lock = threading.Lock()
+        self.bytes_sent = 0
+
+    def put(self, message):
+        ''' Pickle and post the message to the interchange
+
+        Args:
+             - message (object) : Any picklable object, None is a die request
+        '''
+
+        buf = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.zmq_socket.send(buf)
+            self.bytes_sent += len(buf)
+
+    def close(self):
+        self.zmq_socket.close()
+
+
+class ResultsIncoming(object):
+    ''' Incoming results queue from the interchange to the executor.
+    '''
+
+    def __init__ (self, url, context=None):
+        ''' Connect a PULL socket to the interchange
+
+        Args:
+             - url (string) : Url the interchange posts results on
+
+        KWargs:
+             - context (zmq.Context) : Context to create sockets on. Default: new context
+        '''
+
+        self.context = context if context else zmq.Context()
+        self.zmq_socket = self.context.socket(zmq.PULL)
+        self.zmq_socket.setsockopt(zmq.LINGER, 0)
+        self.zmq_socket.connect(url)
+
+    def get(self, block=True, timeout=None):
+        ''' Receive and unpickle a message. Behaves like queue.Queue.get
+
+        KWargs:
+             - block (Bool) : Wait for a message. Default: True
+             - timeout (float) : Seconds to wait for a message. Default: None, wait forever
+
+        Raises:
+             - queue.Empty : If no message arrived within the timeout
+        '''
+
+        if not block:
+            timeout = 0
+        if timeout is not None:
+            if not self.zmq_socket.poll(timeout=int(timeout*1000)):
+                raise queue.Empty
+
+        return pickle.loads(self.zmq_socket.recv())
+
+    def close(self):
+        self.zmq_socket.close()
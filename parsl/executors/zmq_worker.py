@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+''' Worker manager for the ZMQExecutor
+
+A manager is launched once per block through the execution provider. It starts
+a pool of worker processes on the node, connects to the interchange over ZeroMQ
+and keeps the pool busy:
+
+1. On registration it grants the interchange capacity for workers + prefetch tasks.
+2. Task batches from the interchange are queued for the workers.
+3. Results are sent back in batches of whatever has completed, which also grants
+   capacity for as many new tasks.
+4. Functions sent by hash (see :mod:`parsl.executors.function_registry`) are kept in
+   a bounded cache on the manager. Each worker keeps its own cache of deserialized
+   functions, and the manager mirrors it, so a function is sent to a worker only
+   the first time that worker needs it.
+5. Each worker runs one task at a time, handed to it over a pipe of its own. If a
+   worker process dies, eg. killed for running out of memory, its task fails with
+   WorkerLost and a new worker takes its place.
+6. Heartbeats are exchanged every heartbeat_period. The manager shuts the pool
+   down if the interchange is silent for longer than heartbeat_threshold.
+
+Launch with::
+
+    python3 -m parsl.executors.zmq_worker --url=tcp://<interchange>:<port> --workers=4
+'''
+
+import os
+import sys
+import uuid
+import time
+import pickle
+import socket
+import logging
+import argparse
+import collections
+import multiprocessing as mp
+import zmq
+
+from ipyparallel.serialize import unpack_apply_message, serialize_object
+
+from parsl.executors.function_registry import FunctionCache, LRUCache, unpack_args, FN_CACHE_SIZE
+from parsl.executors.shared_buffers import map_buffers
+from parsl.executors.errors import WorkerLost
+
+logger = logging.getLogger(__name__)
+
+
+def execute_task(task, fn_cache):
+    ''' Deserialize the task and execute it.
+
+    Returns the result or raises exception.
+    '''
+
+    all_names = dir(__builtins__)
+    user_ns   = locals()
+    user_ns.update( {'__builtins__' : {k : getattr(__builtins__, k)  for k in all_names} } )
+
+    if 'fn_hash' in task:
+        # Cache the function before anything that may fail, the sender counts it as
+        # shipped and later tasks come without it
+        f = fn_cache.lookup(task['fn_hash'], task.get('fn_buffer'), user_ns)
+        args, kwargs = unpack_args(map_buffers(task['buffer']), user_ns)
+    else:
+        bufs = map_buffers(task['buffer'])
+        f, args, kwargs = unpack_apply_message(bufs, user_ns, copy=False)
+
+    prefix     = "parsl_"
+    fname      = prefix+"f"
+    argname    = prefix+"args"
+    kwargname  = prefix+"kwargs"
+    resultname = prefix+"result"
+
+    user_ns.update({ fname : f,
+                     argname : args,
+                     kwargname : kwargs,
+                     resultname : resultname })
+
+    code = "{0} = {1}(*{2}, **{3})".format(resultname, fname,
+                                           argname, kwargname)
+
+    exec(code, user_ns, user_ns)
+    return user_ns.get(resultname)
+
+
+def worker(worker_id, task_conn, result_conn, fn_cache_size=FN_CACHE_SIZE):
+    ''' Worker process loop. Executes tasks received on task_conn and sends results
+    on result_conn till None is received or the manager goes away.
+    '''
+
+    logger.debug("Worker %s starting", worker_id)
+    fn_cache = FunctionCache(fn_cache_size)
+    while True:
+        try:
+            task = task_conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        try:
+            result = execute_task(task, fn_cache)
+            reply = {'task_id' : task['task_id'],
+                     'result' : serialize_object(result)}
+
+        except Exception as e:
+            logger.debug("Worker %s caught task exception : %s", worker_id, e)
+            reply = {'task_id' : task['task_id'],
+                     'exception' : serialize_object(e)}
+
+        result_conn.send(reply)
+
+    logger.debug("Worker %s exiting", worker_id)
+
+
+class WorkerProcess(object):
+    ''' A worker process with its pipes, the task it is running and a mirror of its
+    function cache
+    '''
+
+    def __init__ (self, worker_id, fn_cache_size):
+        self.worker_id = worker_id
+        task_recv, self.task_conn = mp.Pipe(duplex=False)
+        self.result_conn, result_send = mp.Pipe(duplex=False)
+        self.proc = mp.Process(target=worker, args=(worker_id, task_recv, result_send, fn_cache_size))
+        self.proc.daemon = True
+        self.proc.start()
+        task_recv.close()
+        result_send.close()
+        # Hashes of the functions the worker holds, touched in the order it receives tasks
+        self.functions = LRUCache(fn_cache_size)
+        self.task = None
+
+    def close(self):
+        self.task_conn.close()
+        self.result_conn.close()
+
+
+class Manager(object):
+    ''' Manage a pool of worker processes fed by the interchange.
+    '''
+
+    def __init__ (self, url, worker_count=1, prefetch=0,
+                  heartbeat_period=30, heartbeat_threshold=120, fn_cache_size=FN_CACHE_SIZE):
+        ''' Initialize the manager. Nothing is started till start() is called.
+
+        Args:
+             - url (string) : Url of the interchange worker port, eg. tcp://10.0.0.1:54000
+
+        KWargs:
+             - worker_count (int) : Number of worker processes. Default: 1
+             - prefetch (int) : Tasks to hold in excess of the worker count. Default: 0
+             - heartbeat_period (int) : Seconds between heartbeats. Default: 30
+             - heartbeat_threshold (int) : Seconds of interchange silence before exiting. Default: 120
+             - fn_cache_size (int) : Number of functions cached by the manager and each worker. Default: 128
+        '''
+
+        self.url = url
+        self.worker_count = worker_count
+        self.prefetch = prefetch
+        self.heartbeat_period = heartbeat_period
+        self.heartbeat_threshold = heartbeat_threshold
+        self.fn_cache_size = fn_cache_size
+        self.functions = LRUCache(fn_cache_size)
+        self.hostname = socket.gethostname()
+        self.workers = {}
+        # Tasks received from the interchange and not yet handed to a worker
+        self.pending = collections.deque()
+        self.fn_buffers_sent = 0
+        self.workers_lost = 0
+        self.poller = None
+
+    def _send(self, msg):
+        self.dealer.send(pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _start_worker(self, worker_id):
+        ''' Start a worker process. Workers started after the zmq context is made are
+        forked too, the child never uses the context and exits with os._exit.
+        '''
+
+        w = WorkerProcess(worker_id, self.fn_cache_size)
+        self.workers[worker_id] = w
+        if self.poller:
+            self.poller.register(w.result_conn.fileno(), zmq.POLLIN)
+            self.poller.register(w.proc.sentinel, zmq.POLLIN)
+        return w
+
+    def task_message(self, w, task):
+        ''' The task as sent to worker w, with the serialized function only if w does
+        not hold it yet
+        '''
+
+        if 'fn_hash' not in task:
+            return task
+        msg = dict(task)
+        fn_buffer = msg.pop('fn_buffer')
+        if not w.functions.touch(msg['fn_hash']):
+            msg['fn_buffer'] = fn_buffer
+            self.fn_buffers_sent += 1
+        return msg
+
+    def _dispatch(self):
+        ''' Hand pending tasks to idle workers, one task each
+        '''
+
+        for w in self.workers.values():
+            if not self.pending:
+                break
+            if w.task is None:
+                w.task = self.pending.popleft()
+                try:
+                    w.task_conn.send(self.task_message(w, w.task))
+                except OSError:
+                    # The worker died, its sentinel fires and _worker_lost fails the task
+                    logger.debug("Worker %s is gone, could not send task", w.worker_id)
+
+    def _worker_lost(self, w, results):
+        ''' Collect the last result of a dead worker, fail the task it was running
+        and start a worker in its place
+        '''
+
+        try:
+            while w.result_conn.poll():
+                results.append(w.result_conn.recv())
+                w.task = None
+        except (EOFError, OSError):
+            pass
+
+        w.proc.join()
+        self.workers_lost += 1
+        logger.error("Worker %s died with exit code %s", w.worker_id, w.proc.exitcode)
+        if w.task is not None:
+            error = WorkerLost(w.worker_id, self.hostname, w.proc.exitcode)
+            results.append({'task_id' : w.task['task_id'],
+                            'exception' : serialize_object(error)})
+
+        self.poller.unregister(w.result_conn.fileno())
+        self.poller.unregister(w.proc.sentinel)
+        w.close()
+        self._start_worker(w.worker_id)
+
+    def start(self):
+        ''' Start the workers and serve tasks till the interchange asks us to stop
+        or goes silent.
+        '''
+
+        # Fork the workers before any zmq context exists in this process
+        for worker_id in range(self.worker_count):
+            self._start_worker(worker_id)
+
+        context = zmq.Context()
+        self.dealer = context.socket(zmq.DEALER)
+        self.dealer.setsockopt(zmq.IDENTITY, uuid.uuid4().bytes)
+        self.dealer.setsockopt(zmq.LINGER, 0)
+        self.dealer.connect(self.url)
+
+        self._send({'type' : 'registration',
+                    'workers' : self.worker_count,
+                    'prefetch' : self.prefetch,
+                    'fn_cache_size' : self.fn_cache_size,
+                    'hostname' : self.hostname})
+        self._send({'type' : 'task_request',
+                    'count' : self.worker_count + self.prefetch})
+
+        # Results and the exit of each worker are polled for alongside the interchange
+        self.poller = zmq.Poller()
+        self.poller.register(self.dealer, zmq.POLLIN)
+        for w in self.workers.values():
+            self.poller.register(w.result_conn.fileno(), zmq.POLLIN)
+            self.poller.register(w.proc.sentinel, zmq.POLLIN)
+
+        last_heartbeat = time.time()
+        last_interchange = time.time()
+
+        while True:
+            socks = dict(self.poller.poll(timeout=int(self.heartbeat_period*1000)))
+
+            if self.dealer in socks:
+                msg = pickle.loads(self.dealer.recv())
+                last_interchange = time.time()
+                if msg['type'] == 'tasks':
+                    logger.debug("Got %s tasks", len(msg['tasks']))
+                    for task in msg['tasks']:
+                        # Mirrors the interchange's view of self.functions, see _dispatch there
+                        if 'fn_hash' in task:
+                            if 'fn_buffer' in task:
+                                self.functions.put(task['fn_hash'], task['fn_buffer'])
+                            else:
+                                task['fn_buffer'] = self.functions.get(task['fn_hash'])
+                        self.pending.append(task)
+                elif msg['type'] == 'stop':
+                    logger.debug("Interchange requested stop")
+                    break
+
+            results = []
+            for w in list(self.workers.values()):
+                if w.proc.sentinel in socks:
+                    self._worker_lost(w, results)
+                elif w.result_conn.fileno() in socks:
+                    try:
+                        results.append(w.result_conn.recv())
+                        w.task = None
+                    except EOFError:
+                        self._worker_lost(w, results)
+
+            if results:
+                logger.debug("Sending %s results", len(results))
+                self._send({'type' : 'results', 'results' : results})
+
+            self._dispatch()
+
+            if time.time() - last_heartbeat >= self.heartbeat_period:
+                self._send({'type' : 'heartbeat'})
+                last_heartbeat = time.time()
+
+            if time.time() - last_interchange > self.heartbeat_threshold:
+                logger.error("Interchange went silent for over %s s, exiting", self.heartbeat_threshold)
+                break
+
+        for w in self.workers.values():
+            try:
+                w.task_conn.send(None)
+            except OSError:
+                pass
+        for w in self.workers.values():
+            w.proc.join(timeout=1)
+            if w.proc.is_alive():
+                w.proc.terminate()
+            w.close()
+
+        context.destroy()
+        logger.debug("Manager exiting")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True, help="Url of the interchange worker port")
+    parser.add_argument("--workers", default="1", help="Number of worker processes")
+    parser.add_argument("--prefetch", default="0", help="Tasks to hold in excess of the worker count")
+    parser.add_argument("--hb_period", default="30", help="Seconds between heartbeats")
+    parser.add_argument("--hb_threshold", default="120", help="Seconds of silence before exiting")
+    parser.add_argument("--fn_cache_size", default=str(FN_CACHE_SIZE), help="Number of functions to cache")
+    parser.add_argument("--logdir", default=None, help="Directory to write the manager log to")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args = parser.parse_args()
+
+    if args.logdir:
+        os.makedirs(args.logdir, exist_ok=True)
+        logging.basicConfig(filename=os.path.join(args.logdir, "manager.{0}.log".format(os.getpid())),
+                            level=logging.DEBUG if args.debug else logging.INFO)
+
+    manager = Manager(args.url,
+                      worker_count=int(args.workers),
+                      prefetch=int(args.prefetch),
+                      heartbeat_period=float(args.hb_period),
+                      heartbeat_threshold=float(args.hb_threshold),
+                      fn_cache_size=int(args.fn_cache_size))
+    manager.start()
+    sys.exit(0)
@@ -0,0 +1,165 @@
+''' Testing staged inputs are served from the file cache
+'''
+import parsl
+from parsl import *
+from parsl.data_provider.files import File
+from parsl.data_provider.cache import FileCache, get_cache
+from parsl.data_provider.staging import FileHandler, register_handler
+
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('python', dfk)
+def read_input(inputs=[]):
+    import os
+    with open(inputs[0].filepath) as f:
+        return f.read(), os.stat(inputs[0].filepath).st_ino
+
+
+class CountingHandler(FileHandler):
+    ''' Appends a line to a log for each fetch, so fetches from several processes can be counted
+    '''
+
+    def __init__ (self, log):
+        self.log = log
+
+    def stage_in(self, file_obj, local_path):
+        with open(self.log, 'a') as f:
+            f.write("fetch\n")
+        time.sleep(0.2)
+        return super().stage_in(file_obj, local_path)
+
+
+class SizeOnlyHandler(FileHandler):
+    ''' Knows the size of files but no validator, like a server without ETag or Last-Modified
+    '''
+
+    def stat(self, file_obj):
+        return (os.path.getsize(file_obj.path), None)
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+
+def test_cache_hit():
+    ''' Testing the second stage in of a file is a hard link to the cached copy
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'ref.txt'), "reference\n")
+    cache = get_cache(workdir)
+
+    first = read_input(inputs=[File('file://' + src, staging='copy', cache=True, caching_dir=workdir)])
+    second = read_input(inputs=[File('file://' + src, staging='copy', cache=True, caching_dir=workdir)])
+    (data1, ino1), (data2, ino2) = first.result(), second.result()
+
+    assert data1 == data2 == "reference\n"
+    assert ino1 == ino2, "Inputs were not linked to the same cached copy"
+    assert (cache.hits, cache.misses) == (1, 1), "Hits:{0} Misses:{1}".format(cache.hits, cache.misses)
+    assert dfk.tasks[second.tid]['staging']['bytes_in'] == 0
+
+
+def test_changed_file():
+    ''' Testing a changed file is fetched again
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'ref.txt'), "old\n")
+    read_input(inputs=[File('file://' + src, staging='copy', cache=True, caching_dir=workdir)]).result()
+
+    os.utime(src, (time.time() + 10, time.time() + 10))
+    write(src, "new contents\n")
+    data, ino = read_input(inputs=[File('file://' + src, staging='copy', cache=True, caching_dir=workdir)]).result()
+    assert data == "new contents\n"
+    assert get_cache(workdir).misses == 2
+
+
+def test_no_validator():
+    ''' Testing files whose handler has no validator are not cached, versions of the
+    same size would share an entry
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'ref.txt'), "old\n")
+    cache = get_cache(workdir)
+    register_handler('sizeonly', SizeOnlyHandler())
+
+    read_input(inputs=[File('sizeonly://' + src, staging='copy', cache=True, caching_dir=workdir)]).result()
+    write(src, "new\n")
+    data, ino = read_input(inputs=[File('sizeonly://' + src, staging='copy', cache=True,
+                                        caching_dir=workdir)]).result()
+    assert data == "new\n"
+    assert (cache.hits, cache.misses) == (0, 0), "Hits:{0} Misses:{1}".format(cache.hits, cache.misses)
+
+
+def test_lru_eviction():
+    ''' Testing the entries used least recently are evicted first
+    '''
+    workdir = tempfile.mkdtemp()
+    cache = FileCache(workdir, max_bytes=250)
+    handler = FileHandler()
+    files = {name : File('file://' + write(os.path.join(workdir, name), name * 100))
+             for name in 'abc'}
+
+    def stage(name):
+        local = tempfile.mktemp(dir=workdir)
+        cache.stage_in(files[name], local, handler)
+        time.sleep(0.05)
+
+    stage('a')
+    stage('b')
+    stage('a')
+    stage('c')
+    assert cache.evictions == 1
+    stage('a')
+    stage('b')
+    assert (cache.hits, cache.misses) == (2, 4), "Hits:{0} Misses:{1}".format(cache.hits, cache.misses)
+
+
+def fetch_in_process(workdir, src, log, out):
+    cache = FileCache(workdir)
+    cache.stage_in(File('file://' + src), out, CountingHandler(log))
+
+
+def test_concurrent_processes(procs=4):
+    ''' Testing processes sharing a cache fetch a file once
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'ref.txt'), "shared\n")
+    log = os.path.join(workdir, 'fetches.log')
+
+    ctx = multiprocessing.get_context('fork')
+    outs = [os.path.join(workdir, "out.{0}".format(i)) for i in range(procs)]
+    ps = [ctx.Process(target=fetch_in_process, args=(workdir, src, log, out)) for out in outs]
+    [p.start() for p in ps]
+    [p.join() for p in ps]
+
+    assert all(p.exitcode == 0 for p in ps)
+    with open(log) as f:
+        assert f.read() == "fetch\n", "Expected a single fetch"
+    for out in outs:
+        with open(out) as f:
+            assert f.read() == "shared\n"
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_cache_hit()
+    test_changed_file()
+    test_no_validator()
+    test_lru_eviction()
+    test_concurrent_processes()
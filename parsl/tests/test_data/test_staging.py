@@ -0,0 +1,179 @@
+''' Testing files are staged in and out around tasks
+'''
+import parsl
+from parsl import *
+from parsl.data_provider.files import File
+from parsl.data_provider.staging import register_handler, FileHandler, ChannelHandler
+from parsl.app.errors import FileStagingError
+from libsubmit.channels.local.local import LocalChannel
+
+import os
+import time
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('python', dfk)
+def sort_lines(inputs=[], outputs=[]):
+    with open(inputs[0].filepath) as src, open(outputs[0].filepath, 'w') as dst:
+        dst.writelines(sorted(src))
+    return inputs[0].filepath
+
+
+@App('python', dfk)
+def count_bytes(inputs=[]):
+    return sum(os.path.getsize(f.filepath) for f in inputs)
+
+
+@App('bash', dfk)
+def bash_cat(inputs=[], outputs=[]):
+    return 'cat {inputs[0]} > {outputs[0]}'
+
+
+@App('python', dfk)
+def concat(inputs=[], outputs=[]):
+    with open(outputs[0].filepath, 'w') as dst:
+        for f in inputs:
+            with open(f.filepath) as src:
+                dst.write(src.read())
+    return [f.filepath for f in inputs + outputs]
+
+
+class SlowHandler(FileHandler):
+    ''' Copies files after a delay, like a transfer over the network
+    '''
+
+    def __init__ (self, delay):
+        self.delay = delay
+
+    def stage_in(self, file_obj, local_path):
+        time.sleep(self.delay)
+        return super().stage_in(file_obj, local_path)
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+
+def test_stage_in_out():
+    ''' Testing the task sees a copy of the input and its output reaches the url
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'in.txt'), "b\na\nc\n")
+    dst = os.path.join(workdir, 'out', 'sorted.txt')
+    infile = File('file://' + src, staging='copy')
+
+    fut = sort_lines(inputs=[infile], outputs=[File('file://' + dst, staging='copy')])
+    task_path = fut.result()
+    assert task_path != src and task_path.startswith(dfk.staging.staging_dir), "Input not staged : {0}".format(task_path)
+    assert not os.path.exists(task_path), "Task directory not removed"
+    assert infile.filepath == src, "The user's File was changed"
+
+    with open(dst) as f:
+        assert f.read() == "a\nb\nc\n"
+
+    metrics = dfk.tasks[fut.tid]['staging']
+    assert metrics['bytes_in'] == 6 and metrics['bytes_out'] == 6, "Metrics : {0}".format(metrics)
+
+
+def test_bash_stage_in_out():
+    ''' Testing a bash app's command line gets the staged copies of its files
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'in.txt'), "hello\n")
+    dst = os.path.join(workdir, 'out', 'copy.txt')
+
+    bash_cat(inputs=[File('file://' + src, staging='copy')],
+             outputs=[File('file://' + dst, staging='copy')]).result()
+    with open(dst) as f:
+        assert f.read() == "hello\n"
+
+
+def test_same_basename():
+    ''' Testing files with the same name are staged to paths of their own
+    '''
+    workdir = tempfile.mkdtemp()
+    for name in ('a', 'b'):
+        os.makedirs(os.path.join(workdir, name))
+    first = write(os.path.join(workdir, 'a', 'data.txt'), "first\n")
+    second = write(os.path.join(workdir, 'b', 'data.txt'), "second\n")
+    dst = os.path.join(workdir, 'out', 'data.txt')
+
+    paths = concat(inputs=[File('file://' + first, staging='copy'), File('file://' + second, staging='copy')],
+                   outputs=[File('file://' + dst, staging='copy')]).result()
+    assert len(set(paths)) == 3, "Files staged to the same path : {0}".format(paths)
+    with open(dst) as f:
+        assert f.read() == "first\nsecond\n"
+
+
+def test_direct_untouched():
+    ''' Testing files with direct staging are used in place
+    '''
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'in.txt'), "hello\n")
+    fut = count_bytes(inputs=[File(src)])
+    assert fut.result() == 6
+    assert 'staging' not in dfk.tasks[fut.tid]
+
+
+def test_parallel_transfers(count=4, delay=0.5):
+    ''' Testing the inputs of a task are fetched in parallel
+    '''
+    register_handler('slow', SlowHandler(delay))
+    workdir = tempfile.mkdtemp()
+    inputs = [File('slow://' + write(os.path.join(workdir, "{0}.txt".format(i)), "x" * 10), staging='copy')
+              for i in range(count)]
+
+    fut = count_bytes(inputs=inputs)
+    assert fut.result() == 10 * count
+    metrics = dfk.tasks[fut.tid]['staging']
+    assert metrics['stage_in_time'] < delay * count / 2, "Transfers did not overlap : {0}".format(metrics)
+
+
+def test_channel_handler():
+    ''' Testing files move through a channel, with a LocalChannel standing in for a remote site
+    '''
+    register_handler('site', ChannelHandler(LocalChannel()))
+    workdir = tempfile.mkdtemp()
+    src = write(os.path.join(workdir, 'in.txt'), "b\na\n")
+    dst = os.path.join(workdir, 'sorted.txt')
+
+    sort_lines(inputs=[File('site://' + src, staging='copy')],
+               outputs=[File('site://' + dst, staging='copy')]).result()
+    with open(dst) as f:
+        assert f.read() == "a\nb\n"
+
+
+def test_missing_input():
+    ''' Testing a failed stage in fails the task without running it
+    '''
+    fut = count_bytes(inputs=[File('file:///nonexistent/parsl/in.txt', staging='copy')])
+    try:
+        fut.result()
+    except FileStagingError as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected FileStagingError"
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_stage_in_out()
+    test_bash_stage_in_out()
+    test_same_basename()
+    test_direct_untouched()
+    test_parallel_transfers()
+    test_channel_handler()
+    test_missing_input()
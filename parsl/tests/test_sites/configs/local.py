@@ -28,6 +28,46 @@ localIPP = {
         }]
 }
 
+localIPPMulticore = {
+    "sites" : [
+        { "site" : "Local_IPP_Multicore",
+          "auth" : {
+              "channel" : None,
+          },
+          "execution" : {
+              "executor" : "ipp",
+              "provider" : "local",
+              "block" : {
+                  "taskBlocks" : 2,       # engines started by the one block
+                  "initBlocks" : 1,
+                  "maxBlocks" : 1,
+              }
+          }
+        }],
+    "globals" : {"lazyErrors" : True}
+}
+
+localIPPDrain = {
+    "sites" : [
+        { "site" : "Local_IPP_Drain",
+          "auth" : {
+              "channel" : None,
+          },
+          "execution" : {
+              "executor" : "ipp",
+              "provider" : "local",
+              "drainBlocks" : True,   # let tasks finish on blocks being cancelled
+              "drainTimeout" : 60,
+              "block" : {
+                  "taskBlocks" : 1,
+                  "initBlocks" : 2,
+                  "maxBlocks" : 2,
+              }
+          }
+        }],
+    "globals" : {"lazyErrors" : True}
+}
+
 ''' Use the following config with caution.
 '''
 
@@ -0,0 +1,261 @@
+''' Testing blocks are submitted and cancelled without blocking the caller
+'''
+import parsl
+from parsl.executors.blocks import BlockProvisioner
+from parsl.executors.errors import ScalingFailed
+
+import time
+import argparse
+import threading
+
+
+class SlowProvider(object):
+    ''' Provider whose submit takes delay seconds, and fails when asked to
+    '''
+    sitename = "Slow"
+
+    def __init__ (self, delay=0.5, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.jobs = {}
+        self.submits = 0
+
+    def submit(self, cmd, blocksize):
+        time.sleep(self.delay)
+        self.submits += 1
+        self.last_cmd = cmd
+        if self.fail:
+            return None
+        job_id = "job.{0}".format(self.submits)
+        self.jobs[job_id] = "RUNNING"
+        return job_id
+
+    def status(self, job_ids):
+        return [self.jobs[job_id] for job_id in job_ids]
+
+    def cancel(self, job_ids):
+        time.sleep(self.delay)
+        for job_id in job_ids:
+            self.jobs[job_id] = "CANCELLED"
+        return [True for job_id in job_ids]
+
+
+class ArrayProvider(SlowProvider):
+    ''' Provider that submits a job array of blocks in one request
+    '''
+
+    def __init__ (self, delay=0.5):
+        super().__init__(delay)
+        self.requests = 0
+
+    def submit_blocks(self, cmd, count, blocksize, job_name="parsl.auto"):
+        time.sleep(self.delay)
+        self.requests += 1
+        self.last_cmd = cmd
+        job_ids = ["array.{0}_{1}".format(self.requests, i) for i in range(count)]
+        for job_id in job_ids:
+            self.jobs[job_id] = "RUNNING"
+        return job_ids
+
+
+def test_scale_out_async (delay=0.5):
+    ''' Testing scale_out returns at once and reports SUBMITTING blocks
+    '''
+    provider = SlowProvider(delay)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+
+    start = time.time()
+    fut = blocks.scale_out(2)
+    assert time.time() - start < delay / 2, "scale_out blocked on the provider"
+    assert blocks.status() == ['SUBMITTING', 'SUBMITTING']
+
+    assert len(fut.result()) == 2
+    assert blocks.status() == ['RUNNING', 'RUNNING']
+    assert provider.submits == 2
+    blocks.shutdown()
+
+
+def test_scale_in_async (delay=0.5):
+    ''' Testing scale_in marks blocks CANCELLING so they are not cancelled twice
+    '''
+    provider = SlowProvider(delay)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+    blocks.scale_out(2).result()
+
+    start = time.time()
+    fut = blocks.scale_in(1)
+    assert time.time() - start < delay / 2, "scale_in blocked on the provider"
+    assert sorted(blocks.status()) == ['CANCELLING', 'RUNNING']
+
+    # Only the one block still running is picked
+    second = blocks.scale_in(2)
+    fut.result()
+    second.result()
+    assert sorted(provider.jobs.values()) == ['CANCELLED', 'CANCELLED']
+    # Cancelled blocks are no longer tracked
+    assert blocks.status() == [] and blocks.blocks == [] and blocks.labels == {}
+    blocks.shutdown()
+
+
+def test_status_cache ():
+    ''' Testing the provider is queried once per TTL and again after a scale event
+    '''
+    blocks = BlockProvisioner(SlowProvider(0.01), "sleep 1", "Slow", status_ttl=60)
+    blocks.scale_out(1).result()
+
+    for i in range(10):
+        assert blocks.status() == ['RUNNING']
+    assert blocks.status_calls == 1, "Expected 1 status call, got {0}".format(blocks.status_calls)
+
+    blocks.scale_out(1).result()
+    assert blocks.status() == ['RUNNING', 'RUNNING']
+    assert blocks.status_calls == 2
+
+    blocks.scale_in(1).result()
+    assert blocks.status() == ['RUNNING']
+    assert blocks.status_calls == 3
+    blocks.shutdown()
+
+
+def test_scale_out_failure ():
+    ''' Testing a failed submit shows up on the future and leaves no SUBMITTING blocks
+    '''
+    blocks = BlockProvisioner(SlowProvider(0.1, fail=True), "sleep 1", "Slow")
+    fut = blocks.scale_out(2)
+    try:
+        fut.result()
+    except ScalingFailed as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected ScalingFailed"
+    assert blocks.status() == []
+    blocks.shutdown()
+
+
+def test_scale_in_choose_and_drain ():
+    ''' Testing scale_in cancels blocks in the order chosen, after draining them
+    '''
+    provider = SlowProvider(0.01)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+    blocks.scale_out(3).result()
+    assert provider.last_cmd.startswith("export PARSL_BLOCK_ID=2\n")
+    assert [blocks.labels[b] for b in blocks.blocks] == ['0', '1', '2']
+
+    drained = []
+
+    def drain(to_kill):
+        # Blocks stay CANCELLING, not cancelled, while they drain
+        assert [provider.jobs[b] for b in to_kill] == ['RUNNING']
+        drained.extend(to_kill)
+
+    fut = blocks.scale_in(1, choose=lambda running: list(reversed(running)), drain=drain)
+    fut.result()
+    assert drained == ['job.3']
+    assert provider.jobs['job.3'] == 'CANCELLED'
+    assert provider.jobs['job.1'] == 'RUNNING'
+    blocks.shutdown()
+
+
+def test_scale_in_choose_async (delay=0.5):
+    ''' Testing a slow choose runs in the background, with the blocks marked at once
+    '''
+    provider = SlowProvider(0.01)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+    blocks.scale_out(3).result()
+
+    def choose(running):
+        time.sleep(delay)
+        return list(reversed(running))
+
+    start = time.time()
+    fut = blocks.scale_in(1, choose=choose)
+    assert time.time() - start < delay / 2, "scale_in blocked on choose"
+    assert sorted(blocks.status()) == ['CANCELLING', 'RUNNING', 'RUNNING']
+
+    fut.result()
+    assert provider.jobs['job.3'] == 'CANCELLED'
+    assert provider.jobs['job.1'] == 'RUNNING'
+    blocks.shutdown()
+
+
+def test_scale_in_failed_drain ():
+    ''' Testing a failing drain does not keep the blocks from being cancelled
+    '''
+    provider = SlowProvider(0.01)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+    blocks.scale_out(1).result()
+
+    def drain(to_kill):
+        raise RuntimeError("Hub unreachable")
+
+    blocks.scale_in(1, drain=drain).result()
+    assert provider.jobs['job.1'] == 'CANCELLED'
+    blocks.shutdown()
+
+
+def test_scale_in_after_shutdown ():
+    ''' Testing blocks are still cancelled once the background threads are shut down,
+    as they are at interpreter exit before the DFK cleanup runs
+    '''
+    provider = SlowProvider(0.01)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+    blocks.scale_out(2).result()
+    blocks.shutdown()
+
+    assert blocks.scale_in(2).result() == [True, True]
+    assert sorted(provider.jobs.values()) == ['CANCELLED', 'CANCELLED']
+    assert blocks.status() == []
+
+
+def test_scale_out_bulk (delay=0.2):
+    ''' Testing a provider with submit_blocks gets one request for many blocks
+    '''
+    provider = ArrayProvider(delay)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow")
+
+    assert len(blocks.scale_out(10).result()) == 10
+    assert provider.requests == 1 and provider.submits == 0
+    assert blocks.last_submit['requests'] == 1
+    assert blocks.last_submit['seconds'] < delay * 2
+    assert provider.last_cmd.startswith("export PARSL_BLOCK_ID=$(( 0 + ${PARSL_BLOCK_INDEX:-0} ))\n")
+
+    blocks.scale_out(2).result()
+    assert provider.last_cmd.startswith("export PARSL_BLOCK_ID=$(( 10 + ")
+    assert blocks.labels["array.2_1"] == '11'
+    assert blocks.status() == ['RUNNING'] * 12
+    blocks.shutdown()
+
+
+def test_scale_out_parallel (delay=0.2):
+    ''' Testing submit_threads overlaps the submits of providers without submit_blocks
+    '''
+    provider = SlowProvider(delay)
+    blocks = BlockProvisioner(provider, "sleep 1", "Slow", submit_threads=8)
+
+    assert len(blocks.scale_out(8).result()) == 8
+    assert provider.submits == 8
+    assert blocks.last_submit['requests'] == 8
+    assert blocks.last_submit['seconds'] < delay * 4, "Submits did not overlap"
+    assert sorted(blocks.labels.values()) == [str(i) for i in range(8)]
+    blocks.shutdown()
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_scale_out_async()
+    test_scale_in_async()
+    test_status_cache()
+    test_scale_out_failure()
+    test_scale_in_choose_and_drain()
+    test_scale_in_choose_async()
+    test_scale_in_failed_drain()
+    test_scale_in_after_shutdown()
+    test_scale_out_bulk()
+    test_scale_out_parallel()
@@ -0,0 +1,141 @@
+''' Testing sites are constructed concurrently and a broken site is skipped
+'''
+from parsl import *
+import parsl
+
+import time
+import argparse
+
+from parsl.execution_provider.provider_factory import ExecProviderFactory
+from parsl.dataflow.error import SiteUnavailable, DependencyError
+
+
+class SlowProvider(object):
+    ''' Stands in for a provider with a slow channel connect
+    '''
+    def __init__ (self, config, channel=None):
+        time.sleep(config["execution"]["delay"])
+
+
+def make_site(name, provider="slow", delay=1):
+    return {"site" : name,
+            "auth" : {"channel" : None},
+            "execution" : {"executor" : "threads",
+                           "provider" : provider,
+                           "delay" : delay,
+                           "maxThreads" : 2}}
+
+
+def test_concurrent_make (count=4, delay=1):
+    ''' Testing slow sites start in about the time of the slowest one
+    '''
+    epf = ExecProviderFactory()
+    epf.execution_providers["slow"] = SlowProvider
+    config = {"sites" : [make_site("Slow_{0}".format(i), delay=delay) for i in range(count)],
+              "globals" : {"siteThreads" : count}}
+
+    start = time.time()
+    sites = epf.make(".", config)
+    delta = time.time() - start
+
+    assert list(sites.keys()) == ["Slow_{0}".format(i) for i in range(count)], "Sites out of order"
+    assert delta < delay * 2, "Sites took {0}s to start, expected about {1}s".format(delta, delay)
+    assert len(epf.timings) == count
+
+
+def test_broken_site ():
+    ''' Testing a site with a bad provider is skipped and the rest keep working
+    '''
+    config = {"sites" : [make_site("Good", provider=None),
+                         make_site("Broken", provider="no_such_provider")],
+              "globals" : {"lazyErrors" : True}}
+    dfk = DataFlowKernel(config=config)
+
+    assert list(dfk.executors.keys()) == ["Good"], "Expected only the good site, got {0}".format(dfk.executors)
+
+    @App('python', dfk)
+    def double(x):
+        return x*2
+
+    assert double(5).result() == 10
+    dfk.cleanup()
+
+
+def test_pinned_to_broken_site ():
+    ''' Testing an app pinned to a site that failed to start fails, as do its dependents
+    '''
+    config = {"sites" : [make_site("Good", provider=None),
+                         make_site("Broken", provider="no_such_provider")],
+              "globals" : {"lazyErrors" : True}}
+    dfk = DataFlowKernel(config=config)
+
+    @App('python', dfk, sites=["Broken"])
+    def pinned(x):
+        return x*2
+
+    @App('python', dfk, sites=["Broken", "Good"])
+    def either(x):
+        return x*3
+
+    @App('python', dfk)
+    def double(x):
+        return x*2
+
+    @App('python', dfk)
+    def slow(x):
+        import time
+        time.sleep(0.5)
+        return x
+
+    try:
+        pinned(5).result(timeout=10)
+    except SiteUnavailable as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected SiteUnavailable"
+
+    # Launched from the callback of its dependency
+    dependent = pinned(slow(1))
+    try:
+        dependent.result(timeout=10)
+    except SiteUnavailable as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected SiteUnavailable"
+
+    try:
+        double(dependent).result(timeout=10)
+    except DependencyError as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected DependencyError"
+
+    assert either(5).result(timeout=10) == 15
+    dfk.cleanup()
+
+
+def test_all_sites_broken ():
+    ''' Testing the error is raised when no site starts
+    '''
+    epf = ExecProviderFactory()
+    try:
+        epf.make(".", {"sites" : [make_site("Broken", provider="no_such_provider")]})
+    except Exception as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected BadConfig"
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_concurrent_make()
+    test_broken_site()
+    test_pinned_to_broken_site()
+    test_all_sites_broken()
@@ -0,0 +1,65 @@
+''' Testing controller readiness detection
+'''
+import parsl
+from parsl.executors.ipp_controller import Controller, DirWatch
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+
+def test_dir_watch ():
+    ''' Testing DirWatch wakes up on a file created in a directory that does not exist yet
+    '''
+    base = tempfile.mkdtemp()
+    target = os.path.join(base, "profile_test", "security")
+    watch = DirWatch(target)
+
+    def create():
+        time.sleep(0.5)
+        os.makedirs(target)
+        with open(os.path.join(target, "ready.json"), 'w') as f:
+            f.write("{}")
+
+    threading.Thread(target=create).start()
+
+    start = time.time()
+    while not os.path.exists(os.path.join(target, "ready.json")):
+        assert time.time() - start < 5, "File did not show up"
+        watch.wait(2)
+    delta = time.time() - start
+    watch.close()
+    shutil.rmtree(base)
+
+    assert delta < 1.5, "Took {0}s to notice the file".format(delta)
+
+
+def test_controller_ready ():
+    ''' Testing wait_ready returns once the controller accepts connections
+    '''
+    base = tempfile.mkdtemp()
+    controller = Controller(ipythonDir=base, profile="ready_test")
+    try:
+        ready_after = controller.wait_ready(timeout=30)
+        print("Controller ready in {0:.3f}s".format(ready_after))
+        assert os.path.exists(controller.client_file)
+        assert controller.wait_ready() == ready_after
+    finally:
+        controller.close()
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_dir_watch()
+    test_controller_ready()
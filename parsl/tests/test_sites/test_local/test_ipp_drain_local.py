@@ -0,0 +1,91 @@
+''' Testing scale_in cancels the idle block and drains the busy one, and cleanup
+does not drain
+'''
+from parsl import *
+import parsl
+
+import time
+import argparse
+
+from parsl.tests.test_zmq import apps
+from .local import localIPPDrain
+dfk = DataFlowKernel(config=localIPPDrain)
+
+# Engines import the module of the app function, so it lives outside this module
+sleep_pid = App("python", dfk)(apps.sleep_pid)
+
+
+def wait_for_engines(executor, count, timeout=60):
+    start = time.time()
+    while len(executor.executor.ids) < count:
+        assert time.time() - start < timeout, "Engines did not register in {0}s".format(timeout)
+        time.sleep(0.5)
+
+
+def test_idle_block_first():
+    ''' Testing the block without tasks is cancelled, the busy one finishes its task
+    '''
+    executor = dfk.executors["Local_IPP_Drain"]
+    wait_for_engines(executor, 2)
+
+    engine_blocks = executor._engine_blocks()
+    assert sorted(engine_blocks.values()) == ['0', '1'], "Engines not mapped to blocks : {0}".format(engine_blocks)
+
+    busy = sleep_pid(5)
+    time.sleep(1)
+    assert executor.running == 1 and executor.queued == 0, "Expected the task counted as running"
+    busy_engine = executor.executor.queue_status(verbose=False)
+    busy_label = [engine_blocks[e] for e in engine_blocks
+                  if busy_engine[e]['queue'] or busy_engine[e]['tasks']][0]
+
+    executor.provisioner.invalidate()
+    fut = executor.scale_in(1)
+    fut.result()
+
+    labels = executor.provisioner.labels
+    status = dict(zip(executor.engines, executor.status()))
+    running = [labels[b] for b in status if status[b] == 'RUNNING']
+    assert running == [busy_label], "Expected the busy block {0} to be kept, running : {1}".format(busy_label, running)
+    assert busy.result() > 0, "Task on the busy block failed"
+
+
+def test_draining_targets():
+    ''' Testing only the draining engines are left out of scheduling
+    '''
+    executor = dfk.executors["Local_IPP_Drain"]
+    engines = list(executor.executor.ids)
+    # An engine registered since the drain started is scheduled on
+    executor._draining.add(-1)
+    try:
+        assert executor._targets() == engines, "Engines not draining were left out"
+        executor._draining.update(engines)
+        assert executor._targets() is None, "Expected any engine once all are draining"
+    finally:
+        executor._draining.difference_update(engines + [-1])
+
+
+def test_cleanup_without_drain():
+    ''' Testing cleanup cancels a busy block at once rather than waiting drainTimeout
+    '''
+    # One task per registered engine, so the running block is busy
+    executor = dfk.executors["Local_IPP_Drain"]
+    for engine in executor.executor.ids:
+        sleep_pid(30)
+    time.sleep(1)
+    start = time.time()
+    dfk.cleanup()
+    assert time.time() - start < 20, "Cleanup waited for the busy block to drain"
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_idle_block_first()
+    test_draining_targets()
+    test_cleanup_without_drain()
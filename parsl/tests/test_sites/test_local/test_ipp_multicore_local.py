@@ -0,0 +1,47 @@
+''' Testing that a single block starts taskBlocks engines
+'''
+from parsl import *
+import parsl
+
+import time
+import argparse
+
+from parsl.tests.test_zmq import apps
+from .local import localIPPMulticore
+dfk = DataFlowKernel(config=localIPPMulticore)
+
+# Engines import the module of the app function, so it lives outside this module
+engine_pid = App("python", dfk)(apps.sleep_pid)
+
+
+def wait_for_engines(executor, count, timeout=60):
+    start = time.time()
+    while len(executor.executor.ids) < count:
+        assert time.time() - start < timeout, "Engines did not register in {0}s".format(timeout)
+        time.sleep(0.5)
+
+
+def test_engines_per_block():
+    ''' Testing one block of taskBlocks 2 runs two engines
+    '''
+    executor = dfk.executors["Local_IPP_Multicore"]
+    wait_for_engines(executor, 2)
+
+    assert len(executor.engines) == 1, "Expected a single block"
+    assert executor.slots_per_block == 2, "Expected 2 slots, got {0}".format(executor.slots_per_block)
+
+    pids = [engine_pid(2) for i in range(2)]
+    assert len(set(pid.result() for pid in pids)) == 2, "Tasks did not run on distinct engines"
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_engines_per_block()
+    dfk.cleanup()
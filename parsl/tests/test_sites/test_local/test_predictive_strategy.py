@@ -0,0 +1,171 @@
+''' Testing the predictive strategy against a simulated provider
+'''
+import parsl
+from parsl.dataflow.strategy import Strategy
+from parsl.dataflow.config_defaults import update_config
+from parsl.executors.base import ParslExecutor, TaskCounters
+from parsl.executors.blocks import BlockProvisioner
+
+import time
+import argparse
+from concurrent.futures import Future
+
+
+class SimProvider(object):
+    ''' Provider whose blocks sit in the queue for queue_wait seconds before running
+    '''
+    sitename = "Sim"
+
+    def __init__ (self, queue_wait=0.2):
+        self.queue_wait = queue_wait
+        self.jobs = {}
+
+    def submit(self, cmd, blocksize):
+        job_id = "sim.{0}".format(len(self.jobs))
+        self.jobs[job_id] = {'submitted' : time.time(), 'cancelled' : False}
+        return job_id
+
+    def status(self, job_ids):
+        status = []
+        for job_id in job_ids:
+            job = self.jobs[job_id]
+            if job['cancelled']:
+                status.append('CANCELLED')
+            elif time.time() - job['submitted'] < self.queue_wait:
+                status.append('PENDING')
+            else:
+                status.append('RUNNING')
+        return status
+
+    def cancel(self, job_ids):
+        for job_id in job_ids:
+            self.jobs[job_id]['cancelled'] = True
+        return [True for job_id in job_ids]
+
+
+class SimExecutor(ParslExecutor):
+    ''' Executor that only counts tasks, its blocks come from a SimProvider
+    '''
+
+    def __init__ (self, config, provider):
+        self.config = config
+        self.counters = TaskCounters()
+        self.provisioner = BlockProvisioner(provider, "true", "Sim", status_ttl=0)
+
+    @property
+    def scaling_enabled(self):
+        return True
+
+    def submit(self, count=1):
+        futs = [Future() for i in range(count)]
+        for fut in futs:
+            self.counters.track(fut)
+        return futs
+
+    def scale_out(self, blocks=1):
+        return self.provisioner.scale_out(blocks)
+
+    def scale_in(self, blocks):
+        return self.provisioner.scale_in(blocks)
+
+    def status(self):
+        return self.provisioner.status()
+
+    def shutdown(self):
+        self.provisioner.shutdown()
+
+
+class SimDFK(object):
+
+    def __init__ (self, maxBlocks=10, minBlocks=0):
+        self.config = update_config({"sites" : [{"site" : "Sim",
+                                                 "auth" : {"channel" : None},
+                                                 "execution" : {"executor" : "sim",
+                                                                "provider" : "sim",
+                                                                "block" : {"taskBlocks" : 2,
+                                                                           "minBlocks" : minBlocks,
+                                                                           "maxBlocks" : maxBlocks,
+                                                                           "parallelism" : 1}}}],
+                                     "globals" : {"strategy" : "predictive"}}, ".")
+        self.executor = SimExecutor(self.config["sites"][0], SimProvider())
+        self.executors = {"Sim" : self.executor}
+
+
+def settle(executor):
+    ''' Wait for the background scaling calls to be made
+    '''
+    executor.provisioner._pool.submit(lambda: None).result()
+
+
+def test_scale_ahead_of_arrivals ():
+    ''' Testing blocks are requested for tasks still arriving, not only for the backlog
+    '''
+    dfk = SimDFK()
+    strategy = Strategy(dfk)
+    for i in range(5):
+        strategy.record_task("sim_app", "Sim", 1.0)
+
+    # 4 tasks arrive each 0.1s tick, each runs 1s and is done before the next burst
+    futs = []
+    for tick in range(10):
+        for fut in futs:
+            fut.set_result(None)
+        futs = dfk.executor.submit(4)
+        strategy.strategize([])
+        settle(dfk.executor)
+        time.sleep(0.1)
+
+    blocks = len(dfk.executor.status())
+    # 40 tasks/s * 1s = 40 slots, 20 blocks capped at maxBlocks, where the backlog
+    # of 4 tasks alone would call for 2 blocks
+    assert blocks == 10, "Expected 10 blocks, got {0}".format(blocks)
+    dfk.executor.shutdown()
+
+
+def test_queue_wait_recorded ():
+    ''' Testing the provisioner measures how long blocks wait in the queue
+    '''
+    dfk = SimDFK()
+    strategy = Strategy(dfk)
+    dfk.executor.submit(2)
+    strategy.strategize([])
+    settle(dfk.executor)
+
+    start = time.time()
+    while dfk.executor.provisioner.queue_wait is None:
+        assert time.time() - start < 5, "Queue wait was not measured"
+        dfk.executor.status()
+        time.sleep(0.05)
+    assert 0.2 <= dfk.executor.provisioner.queue_wait < 1
+    dfk.executor.shutdown()
+
+
+def test_scale_in_when_idle ():
+    ''' Testing blocks are released after max_idletime without demand, down to minBlocks
+    '''
+    dfk = SimDFK(minBlocks=1)
+    strategy = Strategy(dfk)
+    strategy.max_idletime = 0.2
+    dfk.executor.scale_out(3).result()
+
+    start = time.time()
+    while sum(1 for s in dfk.executor.status() if s in ('RUNNING', 'PENDING')) > 1:
+        assert time.time() - start < 5, "Blocks were not released"
+        strategy.strategize([])
+        settle(dfk.executor)
+        time.sleep(0.1)
+    dfk.executor.shutdown()
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_scale_ahead_of_arrivals()
+    test_queue_wait_recorded()
+    test_scale_in_when_idle()
@@ -0,0 +1,60 @@
+''' Measure the per call overhead of decorated apps, without running them
+'''
+import parsl
+from parsl import *
+
+import time
+import argparse
+from concurrent.futures import Future
+
+
+class NullExecutor(object):
+    ''' Stands in for the DataFlowKernel, every submit returns a pending future
+    '''
+
+    def __init__ (self):
+        self.tid = 0
+
+    def submit(self, func, *args, parsl_sites='all', **kwargs):
+        self.tid += 1
+        fut = Future()
+        fut.tid = self.tid
+        return fut
+
+
+def python_app(x, y=2, z=None, inputs=[], outputs=[]):
+    return x
+
+
+def bash_app(x, y=2, z=None, inputs=[], outputs=[], stdout=None, stderr=None):
+    return 'echo {0}'
+
+
+def test_app_overhead(count=100000, max_overhead=100e-6):
+    ''' Testing microseconds spent in each call of a python and a bash app, which must
+    stay under max_overhead seconds
+    '''
+    for kind, func in (("python", python_app), ("bash", bash_app)):
+        executor = NullExecutor()
+        app = App(kind, executor)(func)
+        start = time.time()
+        for i in range(count):
+            app(i, z=i)
+        delta = time.time() - start
+        print("{0:6} Calls:{1} Overhead:{2:8.2f}us/call".format(kind, count, delta * 1e6 / count))
+
+        assert executor.tid == count
+        assert delta / count < max_overhead, "{0} app calls take {1:.2f}us".format(kind, delta * 1e6 / count)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="100000", help="Count of app calls")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_app_overhead(int(args.count))
@@ -0,0 +1,64 @@
+''' Measure echo apps writing their streams to files and capturing them in memory
+'''
+import parsl
+from parsl import *
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk)
+def to_files(i, stdout=None, stderr=None):
+    return 'echo {0}'
+
+
+@App('bash', dfk)
+def captured(i, stdout=parsl.CAPTURE, stderr=parsl.CAPTURE):
+    return 'echo {0}'
+
+
+def test_bash_capture(count=1000, dirname=None):
+    ''' Testing tasks/s and files made by echo apps with files and with captured streams.
+    Captured streams must make no files and be no slower than 1.5 times files
+    '''
+    workdir = tempfile.mkdtemp(dir=dirname)
+    try:
+        runs = (("Files", lambda i: to_files(i, stdout=os.path.join(workdir, "{0}.out".format(i)),
+                                             stderr=os.path.join(workdir, "{0}.err".format(i)))),
+                ("Captured", captured))
+        times, files = {}, {}
+        for name, app in runs:
+            before = len(os.listdir(workdir))
+            start = time.time()
+            futs = [app(i) for i in range(count)]
+            assert all(fut.result() == 0 for fut in futs)
+            times[name] = delta = time.time() - start
+            files[name] = len(os.listdir(workdir)) - before
+            print("{0:10} Tasks:{1} Time:{2:8.3f}s Throughput:{3:8.1f} tasks/s Files:{4}".format(
+                name, count, delta, count / delta, files[name]))
+
+        assert files == {'Files' : 2 * count, 'Captured' : 0}, files
+        assert times['Captured'] < times['Files'] * 1.5, "Captured streams slower : {0}".format(times)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="1000", help="Count of apps to launch")
+    parser.add_argument("-p", "--path", default=None, help="Directory for the stream files, eg. on a parallel filesystem")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_bash_capture(int(args.count), args.path)
+    dfk.cleanup()
@@ -0,0 +1,77 @@
+''' Measure time to provision blocks one request at a time, in parallel and in bulk
+'''
+import parsl
+from parsl.executors.blocks import BlockProvisioner
+
+import time
+import argparse
+
+
+class DelayProvider(object):
+    ''' Provider whose every request takes delay seconds, like an sbatch round trip
+    '''
+
+    def __init__ (self, delay, bulk=False):
+        self.delay = delay
+        self.requests = 0
+        self.jobs = {}
+        if bulk:
+            self.submit_blocks = self._submit_blocks
+
+    def submit(self, cmd, blocksize):
+        time.sleep(self.delay)
+        self.requests += 1
+        job_id = "job.{0}".format(self.requests)
+        self.jobs[job_id] = "RUNNING"
+        return job_id
+
+    def _submit_blocks(self, cmd, count, blocksize, job_name="parsl.auto"):
+        time.sleep(self.delay)
+        self.requests += 1
+        job_ids = ["array.{0}_{1}".format(self.requests, i) for i in range(count)]
+        for job_id in job_ids:
+            self.jobs[job_id] = "RUNNING"
+        return job_ids
+
+    def status(self, job_ids):
+        return [self.jobs[job_id] for job_id in job_ids]
+
+    def cancel(self, job_ids):
+        return [True for job_id in job_ids]
+
+
+def test_block_submit(count=50, delay=0.05, threads=8):
+    ''' Testing time to provision count blocks serially, with threads and in one request.
+    Parallel and bulk submits must beat serial ones, bulk in a single request
+    '''
+    submits = {}
+    for name, provider, submit_threads in (("Serial", DelayProvider(delay), 1),
+                                           ("Parallel", DelayProvider(delay), threads),
+                                           ("Bulk", DelayProvider(delay, bulk=True), 1)):
+        blocks = BlockProvisioner(provider, "sleep 1", name, submit_threads=submit_threads)
+        assert len(blocks.scale_out(count).result()) == count
+        blocks.shutdown()
+        submits[name] = blocks.last_submit
+        print("{0:8} Blocks:{1} Requests:{2:4} Time:{3:8.3f}s".format(name, count,
+                                                                     blocks.last_submit['requests'],
+                                                                     blocks.last_submit['seconds']))
+
+    assert submits['Bulk']['requests'] == 1
+    for name in ("Parallel", "Bulk"):
+        assert submits[name]['seconds'] < submits['Serial']['seconds'], \
+            "{0} submits not faster than serial : {1}".format(name, submits)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="50", help="Count of blocks to provision")
+    parser.add_argument("-l", "--latency", default="0.5", help="Seconds per provider request")
+    parser.add_argument("-t", "--threads", default="8", help="Concurrent submits for the parallel run")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_block_submit(int(args.count), float(args.latency), int(args.threads))
@@ -0,0 +1,92 @@
+''' Measure bytes on the wire and submit latency with and without the function registry
+'''
+import parsl
+from parsl import *
+from parsl.executors.swift_t import TurbineExecutor
+from parsl.tests.test_zmq.local import localZMQ
+from parsl.tests.test_zmq import apps
+
+import copy
+import time
+import pickle
+import argparse
+
+
+def count_bytes(q):
+    ''' Wrap q.put to count the pickled bytes of every message posted
+    '''
+    counter = {'bytes' : 0}
+    put = q.put
+
+    def counting_put(msg):
+        counter['bytes'] += len(pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL))
+        put(msg)
+
+    q.put = counting_put
+    return counter
+
+
+def run_turbine(count, registry):
+    ''' Run count tasks on the TurbineExecutor and return (bytes, submit latency, total time)
+    '''
+    tex = TurbineExecutor(function_registry=registry)
+    counter = count_bytes(tex.outgoing_q)
+
+    start = time.time()
+    futs = [tex.submit(apps.double, i) for i in range(count)]
+    submitted = time.time()
+    [fut.result() for fut in futs]
+    delta = time.time() - start
+    tex.shutdown()
+    return counter['bytes'], (submitted - start) / count, delta
+
+
+def run_zmq(count, registry):
+    ''' Run count apps through a DFK on the ZMQExecutor and return (bytes, submit latency, total time)
+    '''
+    config = copy.deepcopy(localZMQ)
+    config["sites"][0]["execution"]["functionRegistry"] = registry
+    config["sites"][0]["execution"]["fnCacheSize"] = 128
+    dfk = DataFlowKernel(config=config)
+    double = App('python', dfk)(apps.double)
+    executor = list(dfk.executors.values())[0]
+
+    start = time.time()
+    futs = [double(i) for i in range(count)]
+    submitted = time.time()
+    [fut.result() for fut in futs]
+    delta = time.time() - start
+    sent = executor.outgoing_q.bytes_sent
+    dfk.cleanup()
+    return sent, (submitted - start) / count, delta
+
+
+def test_registry(count=1000, tolerance=1.5):
+    ''' Testing bytes sent and submit latency with the registry on and off. The registry
+    must send fewer bytes, and not submit slower than tolerance times without it
+    '''
+    for name, runner in (("Turbine", run_turbine), ("ZMQ", run_zmq)):
+        runs = {}
+        for registry in (False, True):
+            sent, latency, delta = runner(count, registry)
+            runs[registry] = (sent, latency)
+            print("{0:8} registry:{1:6} Tasks:{2} Bytes/task:{3:8.1f} Submit latency:{4:8.1f}us "
+                  "Throughput:{5:8.1f} tasks/s".format(name, str(registry), count, sent / count,
+                                                       latency * 1e6, count / delta))
+
+        assert runs[True][0] < runs[False][0], "{0} sent more bytes with the registry : {1}".format(name, runs)
+        assert runs[True][1] < runs[False][1] * tolerance, \
+            "{0} submits slower with the registry : {1}".format(name, runs)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="10000", help="Count of apps to launch")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_registry(int(args.count))
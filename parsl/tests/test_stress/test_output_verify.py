@@ -0,0 +1,59 @@
+''' Measure checking many bash app outputs, by listing their directory and by a
+stat per file
+'''
+import parsl
+from parsl.data_provider.outputs import verify_outputs
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+
+def exists_loop(paths):
+    ''' The check bash apps made before outputs were verified by listing
+    '''
+    return [i for i, path in enumerate(paths) if not os.path.exists(path)]
+
+
+def test_output_verify(count=10000, dirname=None, repeat=5):
+    ''' Testing the time to verify count outputs in one directory. Listing the directory
+    must take one request where checking each output takes a stat per output
+    '''
+    workdir = tempfile.mkdtemp(dir=dirname)
+    try:
+        paths = [os.path.join(workdir, "out.{0}".format(i)) for i in range(count)]
+        for path in paths:
+            open(path, 'w').close()
+
+        # Metadata requests made: a stat per output, or a listing per directory
+        checks = (("exists", lambda p: (exists_loop(p), len(p))),
+                  ("scandir", lambda p: verify_outputs(p)[1:]))
+        made = {}
+        for name, check in checks:
+            start = time.time()
+            for i in range(repeat):
+                missing, requests = check(paths)
+                assert missing == []
+            delta = (time.time() - start) / repeat
+            made[name] = requests
+            print("{0:8} Outputs:{1} Time:{2:8.2f}ms Stats/listings:{3}".format(name, count, delta * 1000, requests))
+
+        assert made['scandir'] == 1, "Expected one listing for the directory : {0}".format(made)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="10000", help="Count of outputs")
+    parser.add_argument("-p", "--path", default=None, help="Directory to make the outputs in, eg. on a parallel filesystem")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_output_verify(int(args.count), args.path)
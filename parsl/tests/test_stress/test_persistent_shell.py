@@ -0,0 +1,48 @@
+''' Measure throughput of trivial bash apps with and without a persistent shell
+'''
+import parsl
+from parsl import *
+
+import time
+import argparse
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+def echo(i, stdout='/dev/null'):
+    return 'echo {0}'
+
+
+spawned = App('bash', dfk)(echo)
+persistent = App('bash', dfk, persistent_shell=True)(echo)
+
+
+def test_persistent_shell(count=1000):
+    ''' Testing tasks/s of echo apps run by a new bash each and by persistent shells,
+    persistent shells must be faster
+    '''
+    times = {}
+    for name, app in (("Spawned", spawned), ("Persistent", persistent)):
+        start = time.time()
+        futs = [app(i) for i in range(count)]
+        assert all(fut.result() == 0 for fut in futs)
+        times[name] = time.time() - start
+        print("{0:10} Tasks:{1} Time:{2:8.3f}s Throughput:{3:8.1f} tasks/s".format(name, count, times[name],
+                                                                                 count / times[name]))
+
+    assert times['Persistent'] < times['Spawned'], "Persistent shells not faster : {0}".format(times)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="10000", help="Count of apps to launch")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_persistent_shell(int(args.count))
+    dfk.cleanup()
@@ -0,0 +1,58 @@
+''' Measure chains of tasks passing large objects, by value and by reference
+'''
+import parsl
+from parsl import *
+from parsl.executors.swift_t import TurbineExecutor
+from parsl.tests.test_zmq import apps
+
+import time
+import argparse
+
+
+def run_chain(size, length, by_reference):
+    ''' Run a chain of length tasks passing a size byte object along and return seconds
+    '''
+    tex = TurbineExecutor(results_by_reference=by_reference)
+    dfk = DataFlowKernel(executors=[tex])
+    make_blob = App('python', dfk)(apps.make_blob)
+    identity = App('python', dfk)(apps.identity)
+    checksum = App('python', dfk)(apps.checksum)
+
+    start = time.time()
+    x = make_blob(size)
+    for i in range(length):
+        x = identity(x)
+    result = checksum(x).result()
+    delta = time.time() - start
+    assert result[0] == size
+    tex.shutdown()
+    return delta
+
+
+def test_chain(length=10, sizes=(1, 16, 64)):
+    ''' Testing chains of tasks over objects of sizes MB, the chain over the largest
+    objects must be faster by reference
+    '''
+    for size in sizes:
+        times = {}
+        for by_reference in (False, True):
+            times[by_reference] = run_chain(size*1024*1024, length, by_reference)
+            print("Size:{0:5}MB Chain:{1} By reference:{2:6} Time:{3:8.1f}ms".format(size, length,
+                                                                                   str(by_reference),
+                                                                                   times[by_reference] * 1000))
+
+    assert times[True] < times[False], "{0}MB chain slower by reference : {1}".format(size, times)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-l", "--length", default="10", help="Length of the task chain")
+    parser.add_argument("-s", "--sizes", default="1,16,64,256", help="Comma separated object sizes in MB")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_chain(int(args.length), [int(s) for s in args.sizes.split(',')])
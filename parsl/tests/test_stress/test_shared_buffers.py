@@ -0,0 +1,50 @@
+''' Measure round trip time of large arguments with and without shared memory buffers
+'''
+import parsl
+from parsl.executors.swift_t import TurbineExecutor
+from parsl.tests.test_zmq.apps import checksum
+
+import os
+import time
+import argparse
+
+
+def run_size(size, count, shared):
+    ''' Send count blobs of size bytes and return seconds per task
+    '''
+    tex = TurbineExecutor(shared_buffers=shared)
+    blob = os.urandom(size)
+    start = time.time()
+    for i in range(count):
+        assert tex.submit(checksum, blob).result()[0] == size
+    delta = time.time() - start
+    tex.shutdown()
+    return delta / count
+
+
+def test_shared_buffers(count=5, sizes=(1, 16, 64)):
+    ''' Testing round trip time of blobs of sizes MB with and without shared buffers,
+    the largest blobs must go faster through shared buffers
+    '''
+    for size in sizes:
+        times = {}
+        for shared in (False, True):
+            times[shared] = run_size(size*1024*1024, count, shared)
+            print("Size:{0:5}MB Shared:{1:6} Time/task:{2:8.1f}ms".format(size, str(shared),
+                                                                         times[shared] * 1000))
+
+    assert times[True] < times[False], "{0}MB blobs slower through shared buffers : {1}".format(size, times)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="10", help="Count of tasks per size")
+    parser.add_argument("-s", "--sizes", default="1,16,64,256", help="Comma separated blob sizes in MB")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_shared_buffers(int(args.count), [int(s) for s in args.sizes.split(',')])
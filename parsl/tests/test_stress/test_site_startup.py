@@ -0,0 +1,71 @@
+''' Measure DFK startup time with several slow sites, one at a time and concurrently
+'''
+import parsl
+from parsl import *
+import parsl.execution_provider.provider_factory as provider_factory
+
+import time
+import argparse
+
+
+class SlowProvider(object):
+    ''' Simulates a provider that spends delay seconds connecting its channel
+    and submitting its initial blocks
+    '''
+    def __init__ (self, config, channel=None):
+        time.sleep(config["execution"]["delay"])
+
+
+def run_startup(count, delay, threads):
+    ''' Start a DFK on count slow sites and return seconds to start up
+    '''
+    config = {"sites" : [{"site" : "Slow_{0}".format(i),
+                          "auth" : {"channel" : None},
+                          "execution" : {"executor" : "threads",
+                                         "provider" : "slow",
+                                         "delay" : delay}} for i in range(count)],
+              "globals" : {"siteThreads" : threads}}
+
+    start = time.time()
+    dfk = DataFlowKernel(config=config)
+    delta = time.time() - start
+    dfk.cleanup()
+    return delta
+
+
+def test_site_startup(count=4, delay=1):
+    ''' Testing startup time serial vs concurrent site construction, sites started
+    concurrently must take about as long as the slowest one
+    '''
+    make_providers = provider_factory.ExecProviderFactory.__init__
+
+    def patched_init(self):
+        make_providers(self)
+        self.execution_providers["slow"] = SlowProvider
+
+    provider_factory.ExecProviderFactory.__init__ = patched_init
+    startup = {}
+    try:
+        for threads in (1, count):
+            startup[threads] = run_startup(count, delay, threads)
+            print("Sites:{0} Delay:{1}s Threads:{2} Startup:{3:8.3f}s".format(count, delay, threads,
+                                                                              startup[threads]))
+    finally:
+        provider_factory.ExecProviderFactory.__init__ = make_providers
+
+    assert startup[1] >= count * delay
+    assert startup[count] < delay * 2, "Sites did not start concurrently : {0}".format(startup)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="8", help="Count of sites")
+    parser.add_argument("-s", "--delay", default="1", help="Seconds each site takes to start")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_site_startup(int(args.count), float(args.delay))
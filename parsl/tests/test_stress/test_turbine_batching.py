@@ -0,0 +1,55 @@
+''' Measure TurbineExecutor throughput across batch sizes
+'''
+import parsl
+from parsl.executors.swift_t import TurbineExecutor
+
+import time
+import argparse
+
+
+def noop(i):
+    return i
+
+
+def run_batch(count, batch_size, batch_timeout=0.01):
+    ''' Run count no-op tasks with the given batch size and return tasks/s
+    '''
+    tex = TurbineExecutor(task_batch_size=batch_size,
+                          result_batch_size=batch_size,
+                          batch_timeout=batch_timeout)
+    start = time.time()
+    futs = [tex.submit(noop, i) for i in range(count)]
+    assert [fut.result() for fut in futs] == list(range(count))
+    delta = time.time() - start
+    tex.shutdown()
+    return count / delta
+
+
+def test_batch_sizes(count=1000, batch_sizes=(1, 16, 256)):
+    ''' Testing throughput of no-op tasks across batch sizes, batching must not be slower
+    than sending tasks one at a time
+    '''
+    rates = {}
+    for batch_size in batch_sizes:
+        rates[batch_size] = run_batch(count, batch_size)
+        print("Batch size:{0:6} Tasks:{1} Throughput:{2:10.1f} tasks/s".format(batch_size,
+                                                                             count,
+                                                                             rates[batch_size]))
+
+    smallest, largest = min(batch_sizes), max(batch_sizes)
+    assert rates[largest] > rates[smallest], \
+        "Batches of {0} slower than batches of {1} : {2}".format(largest, smallest, rates)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="10000", help="Count of no-op tasks to launch")
+    parser.add_argument("-b", "--batches", default="1,16,64,256,1024", help="Comma separated batch sizes")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_batch_sizes(int(args.count), [int(b) for b in args.batches.split(',')])
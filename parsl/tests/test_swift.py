@@ -1,5 +1,6 @@
 #!/usr/bin/env python3.5
 import sys
+import time
 
 import parsl
 from parsl import *
@@ -42,6 +43,145 @@ def test_except():
 
     print("done")
 
+def test_batched():
+    ''' Testing that partial and full batches are both flushed '''
+    print("Start")
+    tex = TurbineExecutor(task_batch_size=8, batch_timeout=0.05)
+    futs = [tex.submit(foo, i, 2) for i in range(20)]
+    results = [fut.result(timeout=30) for fut in futs]
+    assert results == [i*2 for i in range(20)], "Batched results mismatch : {0}".format(results)
+    tex.shutdown()
+    print("done")
+
+def test_results_not_held_back():
+    ''' Testing a long task does not hold back the results of tasks done before it '''
+    print("Start")
+    tex = TurbineExecutor(task_batch_size=8, batch_timeout=0.05)
+    shorts = [tex.submit(foo, i, 10) for i in range(2)]
+    long = tex.submit(slow_foo, 3, 1)
+    start = time.time()
+    assert [short.result(timeout=30) for short in shorts] == [0, 10]
+    assert time.time() - start < 2, "Short results were held back by the long task"
+    assert not long.done()
+    assert tex.running == 1 and tex.queued == 0
+    assert long.result(timeout=30) == 3
+    tex.shutdown()
+    print("done")
+
+def test_function_registry():
+    ''' Testing functions evicted from and resent to a small worker cache '''
+    print("Start")
+    def make_scale(k):
+        def scale(x, y):
+            return x*y*k
+        return scale
+
+    funcs = [foo, make_scale(2), make_scale(3), make_scale(5)]
+    tex = TurbineExecutor(fn_cache_size=2)
+    futs = [tex.submit(funcs[i % len(funcs)], 1, i) for i in range(12)]
+    results = [fut.result(timeout=30) for fut in futs]
+    assert results == [[1, 2, 3, 5][i % 4]*i for i in range(12)], "Registry results mismatch : {0}".format(results)
+    tex.shutdown()
+    print("done")
+
+def fail_unpickle():
+    raise ValueError("Cannot unpickle")
+
+class Unpicklable(object):
+    ''' Arg that fails to unpickle on the runner '''
+    def __reduce__(self):
+        return (fail_unpickle, ())
+
+def test_function_registry_failed_args():
+    ''' Testing a function reaches the runner's cache even if its first task's args fail '''
+    print("Start")
+    tex = TurbineExecutor(fn_cache_size=2)
+    bad = tex.submit(foo, Unpicklable(), 2)
+    try:
+        bad.result(timeout=30)
+    except ValueError as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected ValueError"
+    assert tex.submit(foo, 3, 2).result(timeout=30) == 6
+    tex.shutdown()
+    print("done")
+
+def checksum(blob, offset=0):
+    return (len(blob), sum(blob[::4096]) + offset)
+
+def test_shared_buffers():
+    ''' Testing large args passed through shared memory and released on completion '''
+    print("Start")
+    import os
+    tex = TurbineExecutor(shared_buffer_threshold=1024*1024)
+    blobs = [os.urandom(2*1024*1024 + i) for i in range(4)]
+    futs = [tex.submit(checksum, blob, offset=i) for i, blob in enumerate(blobs)]
+    results = [fut.result(timeout=30) for fut in futs]
+    assert results == [checksum(blob, i) for i, blob in enumerate(blobs)], "Shared buffer results mismatch"
+    assert tex.shared.bytes_shared >= sum(len(blob) for blob in blobs), "Buffers were not shared"
+    assert os.listdir(tex.shared.directory) == [], "Shared buffers not released"
+    tex.shutdown()
+    assert not os.path.exists(tex.shared.directory), "Shared buffer directory not removed"
+    print("done")
+
+def make_blob(n):
+    return bytes(range(256)) * (n // 256)
+
+def test_results_by_reference():
+    ''' Testing large results kept on the runner and passed by reference '''
+    print("Start")
+    from parsl.executors.object_store import ObjectRef
+    from parsl.executors.errors import ObjectEvicted
+    tex = TurbineExecutor(results_by_reference=True, ref_threshold=1024)
+
+    small = tex.submit(foo, 2, 3)
+    assert small.result(timeout=30) == 6, "Small results should come back by value"
+
+    ref = tex.submit(make_blob, 4096).result(timeout=30)
+    assert isinstance(ref, ObjectRef), "Expected an ObjectRef, got {0}".format(ref)
+    assert tex.submit(checksum, ref).result(timeout=30) == checksum(make_blob(4096))
+    assert ref.materialize(timeout=30) == make_blob(4096)
+
+    evicted = tex.submit(make_blob, 8192).result(timeout=30)
+    evicted.release()
+    try:
+        tex.submit(checksum, evicted).result(timeout=30)
+    except ObjectEvicted as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected ObjectEvicted"
+
+    tex.shutdown()
+    print("done")
+
+def test_dfk_results_by_reference():
+    ''' Testing apps chained on results held by reference '''
+    print("Start")
+    from parsl.executors.object_store import ObjectRef
+    tex = TurbineExecutor(results_by_reference=True, ref_threshold=1024)
+    dfk = DataFlowKernel(executors=[tex])
+    blob_app = App('python', dfk)(make_blob)
+    checksum_app = App('python', dfk)(checksum)
+
+    x = blob_app(4096)
+    y = checksum_app(x)
+    assert y.result(timeout=30) == checksum(make_blob(4096)), "Chained result mismatch"
+    assert isinstance(x.reference(), ObjectRef), "Expected the result to stay on the runner"
+    # The DFK releases it from the done callback, which may run just after result() returns
+    for i in range(50):
+        if x.reference().released:
+            break
+        time.sleep(0.1)
+    assert x.reference().released, "Expected release once the consumer finished"
+
+    z = blob_app(2048)
+    assert z.result(timeout=30) == make_blob(2048), "Materialized result mismatch"
+    assert z.reference().released, "Expected release once the client has the value"
+
+    tex.shutdown()
+    print("done")
+
 if __name__ == "__main__":
 
 
@@ -0,0 +1,61 @@
+''' Testing one app object serves calls from several threads
+'''
+import parsl
+from parsl import *
+
+import os
+import argparse
+import tempfile
+import threading
+
+workers = ThreadPoolExecutor(max_workers=8)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk)
+def echo(message, stdout='echo.default.out'):
+    return 'echo {0}'
+
+
+def test_defaults_unchanged():
+    ''' Testing call time kwargs do not change the app's defaults
+    '''
+    outdir = tempfile.mkdtemp()
+    stdout = os.path.join(outdir, 'echo.out')
+    assert echo("hello", stdout=stdout).result() == 0
+    assert echo.app_obj.kwargs == {'stdout' : 'echo.default.out'}, "Defaults changed : {0}".format(echo.app_obj.kwargs)
+
+
+def test_concurrent_calls(threads=8, calls=25):
+    ''' Testing calls from many threads each get their own kwargs
+    '''
+    outdir = tempfile.mkdtemp()
+    futs = {}
+
+    def submit(t):
+        for i in range(calls):
+            stdout = os.path.join(outdir, "{0}.{1}.out".format(t, i))
+            futs[stdout] = (echo("{0}.{1}".format(t, i), stdout=stdout), "{0}.{1}\n".format(t, i))
+
+    workers = [threading.Thread(target=submit, args=(t,)) for t in range(threads)]
+    [w.start() for w in workers]
+    [w.join() for w in workers]
+
+    assert len(futs) == threads * calls
+    for stdout, (fut, expected) in futs.items():
+        assert fut.result() == 0
+        with open(stdout) as f:
+            assert f.read() == expected, "{0} does not hold {1}".format(stdout, expected)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_defaults_unchanged()
+    test_concurrent_calls()
@@ -0,0 +1,125 @@
+''' Testing bash app streams captured in memory
+'''
+import parsl
+from parsl import *
+from parsl.app import capture
+from parsl.app.errors import AppFailure, AppTimeout
+
+import os
+import pickle
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=2)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk)
+def echo(message, stdout=parsl.CAPTURE, stderr=parsl.CAPTURE):
+    return 'echo {0}; echo err {0} 1>&2'
+
+
+@App('bash', dfk, persistent_shell=True)
+def echo_shell(message, stdout=parsl.CAPTURE, stderr=None):
+    return 'echo {0}'
+
+
+@App('bash', dfk)
+def fail(stderr=parsl.CAPTURE):
+    return 'echo failing 1>&2; exit 3'
+
+
+@App('bash', dfk)
+def count(n, stdout=parsl.CAPTURE):
+    return 'seq {0}'
+
+
+@App('bash', dfk)
+def sleeper(walltime=0.5, stdout=parsl.CAPTURE):
+    return 'echo started; sleep 5'
+
+
+def test_capture():
+    ''' Testing stdout and stderr are returned on the AppFuture without files
+    '''
+    before = set(os.listdir('.'))
+    fu = echo("hello")
+    assert fu.result() == 0
+    assert fu.stdout_data == "hello\n"
+    assert fu.stderr_data == "err hello\n"
+    assert fu.stdout is parsl.CAPTURE
+    assert set(os.listdir('.')) == before, "Captured streams created files"
+
+
+def test_capture_persistent_shell():
+    ''' Testing capture in a persistent shell, with stderr left alone
+    '''
+    fu = echo_shell("shell")
+    assert fu.result() == 0
+    assert fu.stdout_data == "shell\n"
+    assert fu.stderr_data is None
+
+
+def test_capture_failure():
+    ''' Testing the streams of an app that failed are kept
+    '''
+    fu = fail()
+    try:
+        fu.result()
+    except AppFailure:
+        pass
+    else:
+        assert False, "Expected AppFailure"
+    assert fu.stderr_data == "failing\n"
+
+
+def test_capture_spill():
+    ''' Testing a stream over the limit is written to a file
+    '''
+    spill_dir = tempfile.mkdtemp()
+    old_max = capture.CAPTURE_MAX_BYTES
+    capture.CAPTURE_MAX_BYTES = 64
+    os.environ[capture.CAPTURE_DIR_ENV] = spill_dir
+    try:
+        fu = count(1000)
+        fu.result()
+    finally:
+        capture.CAPTURE_MAX_BYTES = old_max
+        del os.environ[capture.CAPTURE_DIR_ENV]
+
+    assert fu.stdout_data == "".join("{0}\n".format(i) for i in range(1, 1001))
+    assert len(os.listdir(spill_dir)) == 1
+
+
+def test_capture_timeout():
+    ''' Testing an app past its walltime with captured streams times out
+    '''
+    try:
+        sleeper().result()
+    except AppTimeout:
+        pass
+    else:
+        assert False, "Expected AppTimeout"
+
+
+def test_capture_pickle():
+    ''' Testing CAPTURE is the same object once unpickled, as on a worker
+    '''
+    assert pickle.loads(pickle.dumps(parsl.CAPTURE)) is parsl.CAPTURE
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_capture()
+    test_capture_persistent_shell()
+    test_capture_failure()
+    test_capture_spill()
+    test_capture_timeout()
+    test_capture_pickle()
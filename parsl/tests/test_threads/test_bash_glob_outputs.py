@@ -0,0 +1,86 @@
+''' Testing glob and directory outputs of bash apps
+'''
+import parsl
+from parsl import *
+from parsl.app.errors import MissingOutputs
+from parsl.data_provider.outputs import verify_outputs, SCAN_THRESHOLD
+
+import os
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=2)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk)
+def split(dirname, count, outputs=[]):
+    return 'mkdir -p {0} && cd {0} && for i in $(seq {1}); do echo $i > part.$i.txt; done; touch .hidden.txt'
+
+
+def test_glob_outputs():
+    ''' Testing a glob output becomes a DataFuture per matched file
+    '''
+    workdir = tempfile.mkdtemp()
+    fu = split(workdir, 3, outputs=[os.path.join(workdir, 'part.*.txt')])
+    assert fu.result() == 0
+    paths = [df.filepath for df in fu.outputs]
+    assert paths == [os.path.join(workdir, "part.{0}.txt".format(i)) for i in (1, 2, 3)], paths
+    assert all(df.done() for df in fu.outputs)
+    assert fu.outputs[0].result() == paths[0]
+
+
+def test_directory_outputs():
+    ''' Testing a directory output becomes a DataFuture per file in it, with plain files kept
+    '''
+    workdir = tempfile.mkdtemp()
+    fu = split(workdir, 2, outputs=[workdir + '/', os.path.join(workdir, 'part.1.txt')])
+    fu.result()
+    paths = [df.filepath for df in fu.outputs]
+    assert paths == [os.path.join(workdir, 'part.1.txt'), os.path.join(workdir, 'part.2.txt'),
+                     os.path.join(workdir, 'part.1.txt')], paths
+
+
+def test_missing_outputs():
+    ''' Testing patterns matching nothing and missing directories fail the app
+    '''
+    workdir = tempfile.mkdtemp()
+    for output in (os.path.join(workdir, '*.csv'), os.path.join(workdir, 'nodir/')):
+        fu = split(workdir, 1, outputs=[output])
+        try:
+            fu.result()
+        except MissingOutputs as e:
+            assert e.outputs == [output]
+        else:
+            assert False, "Expected MissingOutputs for {0}".format(output)
+
+
+def test_batched_verification():
+    ''' Testing many outputs in one directory are checked with one listing
+    '''
+    workdir = tempfile.mkdtemp()
+    count = SCAN_THRESHOLD * 4
+    paths = [os.path.join(workdir, "f{0}".format(i)) for i in range(count)]
+    for path in paths[:-1]:
+        open(path, 'w').close()
+    os.symlink(os.path.join(workdir, 'nothing'), paths[-1])
+
+    matched, missing, scans = verify_outputs(paths)
+    assert scans == 1
+    assert missing == [count - 1], "A broken link is not an output"
+    assert matched == [None] * count
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_glob_outputs()
+    test_directory_outputs()
+    test_missing_outputs()
+    test_batched_verification()
@@ -0,0 +1,75 @@
+''' Testing bash apps log to the worker log rather than a file per task
+'''
+import parsl
+from parsl import *
+import parsl.app.bash_app as bash_app
+
+import os
+import glob
+import logging
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=2)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk)
+def echo(message, stdout='/dev/null'):
+    return 'echo {0}'
+
+
+def reset_worker_log():
+    ''' Make the next bash app read the environment again
+    '''
+    if bash_app._worker_log_handler:
+        bash_app._worker_log_handler.close()
+        bash_app.worker_logger.removeHandler(bash_app._worker_log_handler)
+        bash_app._worker_log_handler = None
+    bash_app._worker_log_pid = None
+    bash_app.worker_logger.setLevel(logging.NOTSET)
+
+
+def test_no_file_per_task(count=20):
+    ''' Testing bash apps create no /tmp/bashexec files
+    '''
+    reset_worker_log()
+    before = set(glob.glob('/tmp/bashexec.*.log'))
+    assert all(fut.result() == 0 for fut in [echo(i) for i in range(count)])
+    assert set(glob.glob('/tmp/bashexec.*.log')) == before, "Bash apps created log files"
+    assert bash_app._worker_log_handler is None
+
+
+def test_worker_log_file():
+    ''' Testing PARSL_BASH_LOG sends the records of all tasks to one file
+    '''
+    logdir = tempfile.mkdtemp()
+    os.environ[bash_app.BASH_LOG_ENV] = os.path.join(logdir, "bash.{pid}.log")
+    os.environ[bash_app.BASH_LOG_LEVEL_ENV] = "debug"
+    try:
+        reset_worker_log()
+        assert all(fut.result() == 0 for fut in [echo(i) for i in range(5)])
+        bash_app._worker_log_handler.flush()
+
+        logfile = os.path.join(logdir, "bash.{0}.log".format(os.getpid()))
+        assert os.listdir(logdir) == [os.path.basename(logfile)]
+        with open(logfile) as f:
+            completed = [line for line in f if "[echo] App completed" in line]
+        assert len(completed) == 5, "Expected 5 records, got {0}".format(len(completed))
+    finally:
+        del os.environ[bash_app.BASH_LOG_ENV]
+        del os.environ[bash_app.BASH_LOG_LEVEL_ENV]
+        reset_worker_log()
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_no_file_per_task()
+    test_worker_log_file()
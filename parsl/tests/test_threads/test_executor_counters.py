@@ -0,0 +1,71 @@
+''' Testing the outstanding, running and queued counters of the executors
+'''
+import parsl
+from parsl.executors.threads import ThreadPoolExecutor
+
+import time
+import argparse
+import threading
+
+
+def wait_for(cond, timeout=5):
+    start = time.time()
+    while not cond():
+        assert time.time() - start < timeout, "Timed out waiting for condition"
+        time.sleep(0.01)
+
+
+def test_thread_counters (workers=2, count=5):
+    ''' Testing counters follow tasks through the thread pool
+    '''
+    tex = ThreadPoolExecutor(max_workers=workers)
+    gate = threading.Event()
+
+    futs = [tex.submit(gate.wait) for i in range(count)]
+    assert tex.outstanding == count, "Expected {0} outstanding, got {1}".format(count, tex.outstanding)
+
+    wait_for(lambda: tex.running == workers)
+    assert tex.queued == count - workers, "Expected {0} queued, got {1}".format(count - workers, tex.queued)
+
+    gate.set()
+    [fut.result() for fut in futs]
+    wait_for(lambda: tex.outstanding == 0)
+    assert tex.running == 0
+    assert tex.queued == 0
+    tex.shutdown()
+
+
+def test_thread_counters_failure ():
+    ''' Testing failed and cancelled tasks are no longer outstanding
+    '''
+    tex = ThreadPoolExecutor(max_workers=1)
+    gate = threading.Event()
+
+    blocker = tex.submit(gate.wait)
+    failing = tex.submit(lambda: 1/0)
+    cancelled = tex.submit(gate.wait)
+    assert cancelled.cancel()
+
+    gate.set()
+    blocker.result()
+    try:
+        failing.result()
+    except ZeroDivisionError:
+        pass
+
+    wait_for(lambda: tex.outstanding == 0)
+    assert tex.running == 0
+    tex.shutdown()
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_thread_counters()
+    test_thread_counters_failure()
@@ -0,0 +1,85 @@
+''' Testing flow control reacts to bursts of submissions and stays idle otherwise
+'''
+from parsl import *
+import parsl
+
+import time
+import argparse
+import threading
+
+config = {
+    "sites" : [
+        { "site" : "Local_Threads",
+          "auth" : { "channel" : None },
+          "execution" : {
+              "executor" : "threads",
+              "provider" : None,
+              "maxThreads" : 4
+          }
+        }],
+    "globals" : {"lazyErrors" : True}
+}
+dfk = DataFlowKernel(config=config)
+
+
+@App('python', dfk)
+def double(x):
+    return x*2
+
+
+class Recorder(object):
+
+    def __init__ (self):
+        self.calls = []
+        self.event = threading.Event()
+
+    def __call__ (self, tasks=None, kind=None):
+        self.calls.append((time.time(), kind, len(tasks)))
+        if kind == 'event':
+            self.event.set()
+
+
+def test_burst (n=2000):
+    ''' Testing a burst of submissions triggers the callback within milliseconds,
+    with the events coalesced into few callbacks
+    '''
+    recorder = Recorder()
+    dfk.flowcontrol.callback = recorder
+
+    start = time.time()
+    futs = [double(i) for i in range(n)]
+    assert recorder.event.wait(5), "No event callback"
+    [fut.result() for fut in futs]
+    time.sleep(0.2)
+
+    first = recorder.calls[0][0]
+    events = sum(count for _, kind, count in recorder.calls)
+    print("First callback after {0:.1f}ms, {1} callbacks for {2} events".format((first - start) * 1000,
+                                                                                 len(recorder.calls), events))
+    assert first - start < 1, "Callback took {0}s".format(first - start)
+    # Each task is one submit and one completion event
+    assert len(recorder.calls) < n * 2 / dfk.flowcontrol.threshold
+    assert events >= n * 2 - dfk.flowcontrol.threshold
+
+
+def test_idle ():
+    ''' Testing no event callbacks are made without events
+    '''
+    recorder = Recorder()
+    dfk.flowcontrol.callback = recorder
+    time.sleep(1)
+    assert not [call for call in recorder.calls if call[1] == 'event']
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="2000", help="Count of apps to launch")
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_burst(int(args.count))
+    test_idle()
@@ -0,0 +1,129 @@
+''' Testing bash apps run in a persistent shell
+'''
+import parsl
+from parsl import *
+from parsl.app.errors import AppFailure, AppTimeout
+
+import os
+import argparse
+
+workers = ThreadPoolExecutor(max_workers=2)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk, persistent_shell=True)
+def echo(message, stdout=None, stderr=None):
+    return 'echo {0}; echo {0} 1>&2'
+
+
+@App('bash', dfk, persistent_shell=True)
+def fail(code):
+    return 'exit {0}'
+
+
+@App('bash', dfk, persistent_shell=True)
+def bad_syntax(stderr='shell.err'):
+    return 'echo "unterminated'
+
+
+@App('bash', dfk, persistent_shell=True)
+def set_state():
+    return 'export PARSL_SHELL_TEST=1; cd /; shopt -s nullglob; f() {{ :; }}'
+
+
+@App('bash', dfk, persistent_shell=True)
+def check_state(cwd, stdout=None):
+    return 'test -z "$PARSL_SHELL_TEST" && test "$PWD" = {0} && ! shopt -q nullglob && ! type f'
+
+
+@App('bash', dfk, persistent_shell=True)
+def sleeper(walltime=0.5):
+    return 'sleep 5'
+
+
+@App('bash', dfk, persistent_shell=True)
+def shell_pid(stdout=None):
+    return 'echo $PPID'
+
+
+def test_redirection():
+    ''' Testing stdout and stderr are written to the files given
+    '''
+    assert echo("hello", stdout='shell.out', stderr='shell.err').result() == 0
+    with open('shell.out') as f:
+        assert f.read() == "hello\n"
+    with open('shell.err') as f:
+        assert f.read() == "hello\n"
+    os.remove('shell.out')
+    os.remove('shell.err')
+
+
+def test_exit_codes():
+    ''' Testing exit codes come back and a syntax error does not break the shell
+    '''
+    for code in (3, 127):
+        try:
+            fail(code).result()
+        except AppFailure as e:
+            assert e.exitcode == code, "Expected exit code {0}, got {1}".format(code, e.exitcode)
+        else:
+            assert False, "Expected AppFailure"
+
+    try:
+        bad_syntax().result()
+    except AppFailure as e:
+        assert e.exitcode == 2, "Expected exit code 2, got {0}".format(e.exitcode)
+    else:
+        assert False, "Expected AppFailure"
+    os.remove('shell.err')
+
+    assert echo("after").result() == 0
+
+
+def test_state_reset():
+    ''' Testing variables, directory, options and functions do not leak between apps
+    '''
+    assert set_state().result() == 0
+    assert check_state(os.getcwd(), stdout='shell.out').result() == 0
+    os.remove('shell.out')
+
+
+def test_walltime():
+    ''' Testing a command past its walltime is killed and the next app gets a new shell
+    '''
+    try:
+        sleeper().result()
+    except AppTimeout:
+        pass
+    else:
+        assert False, "Expected AppTimeout"
+
+    assert echo("after").result() == 0
+
+
+def test_shell_reused():
+    ''' Testing apps on one worker thread share its shell
+    '''
+    pids = set()
+    for i in range(6):
+        shell_pid(stdout='shell.out').result()
+        with open('shell.out') as f:
+            pids.add(f.read())
+    os.remove('shell.out')
+    assert len(pids) <= 2, "Expected at most a shell per worker thread, got {0}".format(len(pids))
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_redirection()
+    test_exit_codes()
+    test_state_reset()
+    test_walltime()
+    test_shell_reused()
@@ -0,0 +1,145 @@
+''' Testing bash apps whose outputs are up to date are skipped
+'''
+import parsl
+from parsl import *
+from parsl.data_provider.files import File
+
+import os
+import time
+import argparse
+import tempfile
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('bash', dfk, skip_if_fresh=True)
+def concat(log, inputs=[], outputs=[]):
+    return 'echo ran >> {0}; cat {inputs[0]} {inputs[1]} > {outputs[0]}'
+
+
+@App('bash', dfk, skip_if_fresh='checksum')
+def concat_checked(log, inputs=[], outputs=[]):
+    return 'echo ran >> {0}; cat {inputs[0]} {inputs[1]} > {outputs[0]}'
+
+
+@App('bash', dfk, skip_if_fresh=True)
+def touch(inputs=[], outputs=[]):
+    return 'touch {outputs[0]}'
+
+
+@App('python', dfk)
+def wait(delay):
+    import time
+    time.sleep(delay)
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        f.write(data)
+    return path
+
+
+def setup():
+    workdir = tempfile.mkdtemp()
+    inputs = [write(os.path.join(workdir, name), name + "\n") for name in ('a', 'b')]
+    return workdir, inputs, os.path.join(workdir, 'runs.log'), os.path.join(workdir, 'out')
+
+
+def runs(log):
+    with open(log) as f:
+        return len(f.readlines())
+
+
+def age(path, seconds):
+    ''' Set the mtime of path seconds in the past
+    '''
+    t = time.time() - seconds
+    os.utime(path, (t, t))
+
+
+def test_skip_fresh():
+    ''' Testing an app is skipped once its outputs are newer than its inputs
+    '''
+    workdir, inputs, log, out = setup()
+    for path in inputs:
+        age(path, 60)
+
+    assert concat(log, inputs=inputs, outputs=[out]).result() == 0
+    assert runs(log) == 1
+
+    fu = concat(log, inputs=inputs, outputs=[File(out)])
+    assert fu.result() == 0
+    assert runs(log) == 1, "Up to date app was run"
+    assert dfk.tasks[fu.tid].get('fresh') is True
+    assert fu.tid in dfk.freshness.skipped
+
+
+def test_run_stale():
+    ''' Testing an app is run if an input is newer than its outputs, or an output is missing
+    '''
+    workdir, inputs, log, out = setup()
+    write(out, "old\n")
+    age(out, 60)
+
+    concat(log, inputs=inputs, outputs=[out]).result()
+    assert runs(log) == 1
+    with open(out) as f:
+        assert f.read() == "a\nb\n"
+
+    os.unlink(out)
+    concat(log, inputs=inputs, outputs=[out]).result()
+    assert runs(log) == 2
+
+
+def test_skip_checksum():
+    ''' Testing a touched but unchanged input does not rerun an app with checksums
+    '''
+    workdir, inputs, log, out = setup()
+    concat_checked(log, inputs=inputs, outputs=[out]).result()
+    assert os.path.exists(os.path.join(workdir, '.out.parsl-fresh'))
+    age(out, 60)
+
+    concat_checked(log, inputs=inputs, outputs=[out]).result()
+    assert runs(log) == 1, "App with unchanged checksums was run"
+
+    write(inputs[0], "changed\n")
+    concat_checked(log, inputs=inputs, outputs=[out]).result()
+    assert runs(log) == 2
+    with open(out) as f:
+        assert f.read() == "changed\nb\n"
+
+
+def test_batched_stats(tasks=50, files=20):
+    ''' Testing a fan in over shared inputs stats each input once per batch
+    '''
+    workdir = tempfile.mkdtemp()
+    inputs = [write(os.path.join(workdir, "in.{0}".format(i)), "") for i in range(files)]
+    for path in inputs:
+        age(path, 60)
+    outputs = [write(os.path.join(workdir, "out.{0}".format(i)), "") for i in range(tasks)]
+
+    before = dfk.freshness.stat_calls
+    # Holding every task on one future has them all launched together
+    gate = wait(0.5)
+    futs = [touch(inputs=[gate] + inputs, outputs=[out]) for out in outputs]
+    assert [fu.result() for fu in futs] == [0] * tasks
+    assert all(fu.tid in dfk.freshness.skipped for fu in futs)
+
+    stats = dfk.freshness.stat_calls - before
+    assert stats < tasks * files / 4, "{0} stats for {1} tasks".format(stats, tasks)
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_skip_fresh()
+    test_run_stale()
+    test_skip_checksum()
+    test_batched_stats()
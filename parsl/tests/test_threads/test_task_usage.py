@@ -0,0 +1,108 @@
+''' Testing the resource usage of tasks is returned with their results
+'''
+import parsl
+from parsl import *
+from parsl.app.errors import AppFailure
+
+import argparse
+
+workers = ThreadPoolExecutor(max_workers=4)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('python', dfk)
+def spin(seconds):
+    import time
+    start = time.process_time()
+    while time.process_time() - start < seconds:
+        pass
+    return seconds
+
+
+@App('python', dfk)
+def add(x, y):
+    return x + y
+
+
+@App('bash', dfk)
+def bash_spin(count):
+    return 'i=0; while [ $i -lt {0} ]; do i=$((i+1)); done'
+
+
+@App('bash', dfk)
+def bash_sleep(seconds):
+    return 'sleep {0}'
+
+
+@App('bash', dfk)
+def bash_fail():
+    return 'exit 1'
+
+
+def test_python_usage():
+    ''' Testing a python app's cpu time is measured, and its result is passed on as is
+    '''
+    fu = spin(0.2)
+    assert add(fu, 1).result() == 1.2
+    assert fu.result() == 0.2
+    usage = fu.usage
+    assert usage['user_time'] + usage['system_time'] >= 0.15, usage
+    assert usage['wall_time'] >= 0.15
+    assert usage['max_rss'] > 0
+    assert dfk.tasks[fu.tid]['usage'] is usage
+
+
+def test_usage_not_launched():
+    ''' Testing the usage of a task that has not been launched yet is None
+    '''
+    from parsl.dataflow.futures import AppFuture
+    assert AppFuture(None, tid=0).usage is None
+
+
+def test_bash_usage():
+    ''' Testing a bash app's usage counts its command only, not others running beside it
+    '''
+    busy = bash_spin(200000)
+    idle = bash_sleep(0.5)
+    assert busy.result() == 0 and idle.result() == 0
+    assert busy.usage['user_time'] + busy.usage['system_time'] > 0.1, busy.usage
+    assert idle.usage['user_time'] + idle.usage['system_time'] < 0.05, idle.usage
+    assert idle.usage['wall_time'] >= 0.5
+
+
+def test_failed_usage():
+    ''' Testing a bash app that failed still reports its usage
+    '''
+    fu = bash_fail()
+    try:
+        fu.result()
+    except AppFailure:
+        pass
+    assert fu.usage is not None and fu.usage['wall_time'] >= 0
+
+
+def test_app_usage():
+    ''' Testing usage is aggregated per app
+    '''
+    futs = [add(i, i) for i in range(5)]
+    [fu.result() for fu in futs]
+    summary = dfk.app_usage()
+    assert summary['add']['count'] >= 5
+    assert summary['add']['mean_wall_time'] >= 0
+    assert summary['add']['max_rss'] > 0
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Enable debug logging")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_python_usage()
+    test_usage_not_launched()
+    test_bash_usage()
+    test_failed_usage()
+    test_app_usage()
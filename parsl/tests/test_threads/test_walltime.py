@@ -0,0 +1,89 @@
+''' Testing bash apps are killed past their walltime and fail with AppTimeout, see
+test_zmq for python apps
+'''
+import parsl
+from parsl import *
+from parsl.app.errors import AppTimeout
+
+import os
+import time
+import argparse
+
+workers = ThreadPoolExecutor(max_workers=2)
+dfk = DataFlowKernel(executors=[workers])
+
+
+@App('python', dfk, walltime=0.2)
+def hang(seconds):
+    import time
+    time.sleep(seconds)
+    return seconds
+
+
+@App('bash', dfk, walltime=0.5)
+def bash_hang(pidfile):
+    return 'sleep 60 & echo $! > {0}; wait'
+
+
+@App('bash', dfk)
+def bash_sleep(seconds, walltime=5):
+    return 'sleep {0}'
+
+
+def expect_timeout(fu):
+    try:
+        fu.result()
+    except AppTimeout as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected AppTimeout"
+
+
+def test_python_walltime_on_threads():
+    ''' Testing python apps on threads are not killed, their walltime is not enforced
+    '''
+    fu = hang(0.5)
+    assert fu.result() == 0.5
+    assert fu.usage['wall_time'] >= 0.5
+
+
+def test_bash_walltime(pidfile='walltime.pid'):
+    ''' Testing a bash app past the walltime of its decorator is killed with what it started
+    '''
+    if os.path.exists(pidfile):
+        os.remove(pidfile)
+    expect_timeout(bash_hang(pidfile))
+
+    with open(pidfile) as f:
+        pid = int(f.read())
+    os.remove(pidfile)
+    # The killed process is reaped by init, give it a moment
+    for i in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        assert False, "Background process {0} was not killed".format(pid)
+
+
+def test_bash_kwarg_walltime():
+    ''' Testing the walltime kwarg of a bash app applies
+    '''
+    assert bash_sleep(0.1).result() == 0
+    expect_timeout(bash_sleep(60, walltime=0.5))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--debug", action='store_true', help="Count of apps to launch")
+    args = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_python_walltime_on_threads()
+    test_bash_walltime()
+    test_bash_kwarg_walltime()
@@ -0,0 +1,37 @@
+''' App functions for the ZMQ tests.
+
+The workers import the module an app function is defined in. These live apart from
+the test modules so that the import does not start a DataFlowKernel on the workers.
+'''
+
+def double(x):
+    return x*2
+
+def triple(x):
+    return x*3
+
+def square(x):
+    return x*x
+
+def checksum(blob):
+    return (len(blob), sum(blob[::4096]))
+
+def make_blob(n):
+    return bytes(range(256)) * (n // 256)
+
+def identity(x):
+    return x
+
+def fail(x):
+    raise ValueError("Failing on {0}".format(x))
+
+def sleep_pid(delay):
+    import os
+    import time
+    time.sleep(delay)
+    return os.getpid()
+
+def kill_worker(x):
+    import os
+    import signal
+    os.kill(os.getpid(), signal.SIGKILL)
@@ -0,0 +1,35 @@
+import os
+import sys
+from parsl.executors.zmq_executor import DEFAULT_LAUNCH_CMD
+
+# Launch the managers with the interpreter running the tests, and let the workers
+# import the test modules that the apps are defined in.
+tests_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+launch_cmd = "PYTHONPATH={0}:$PYTHONPATH {1}".format(tests_dir,
+                                                     DEFAULT_LAUNCH_CMD.replace("python3", sys.executable, 1))
+
+localZMQ = {
+    "sites" : [
+        { "site" : "Local_ZMQ",
+          "auth" : {
+              "channel" : None,
+          },
+          "execution" : {
+              "executor" : "zmq",
+              "provider" : "local",
+              "launchCmd" : launch_cmd,
+              "prefetch" : 2,
+              "heartbeatPeriod" : 2,
+              "heartbeatThreshold" : 10,
+              "fnCacheSize" : 2,
+              "sharedBuffers" : True,
+              "block" : {
+                  "taskBlocks" : 2,
+                  "initBlocks" : 1,
+                  "maxBlocks" : 1,
+              }
+          }
+        }],
+    "globals" : {"lazyErrors" : True,
+                 "strategy" : None}
+}
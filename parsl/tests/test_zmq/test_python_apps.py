@@ -0,0 +1,223 @@
+''' Testing python apps on the ZMQExecutor
+'''
+import parsl
+from parsl import *
+from parsl.app.errors import AppTimeout
+from parsl.executors.errors import WorkerLost
+from parsl.executors.zmq_worker import Manager, execute_task
+from parsl.executors.function_registry import LRUCache, FunctionCache, FunctionRegistry, pack_args
+from parsl.executors.shared_buffers import SharedBuffer
+
+import os
+import time
+import argparse
+
+from .local import localZMQ
+from . import apps
+
+#parsl.set_stream_logger()
+dfk = DataFlowKernel(config=localZMQ)
+
+double = App('python', dfk)(apps.double)
+triple = App('python', dfk)(apps.triple)
+square = App('python', dfk)(apps.square)
+checksum = App('python', dfk)(apps.checksum)
+fail = App('python', dfk)(apps.fail)
+timed_sleep = App('python', dfk, walltime=1)(apps.sleep_pid)
+timed_fail = App('python', dfk, walltime=5)(apps.fail)
+kill_worker = App('python', dfk)(apps.kill_worker)
+sleep_pid = App('python', dfk)(apps.sleep_pid)
+
+
+def test_simple (n=10):
+    ''' Testing a single app '''
+    x = double(n)
+    assert x.result() == n*2 , "Expected double to return:{0} instead got:{1}".format(n*2, x.result())
+
+
+def test_parallel_for (n=100):
+    ''' Testing many apps across the workers and prefetch slots '''
+    start = time.time()
+    d = [double(i) for i in range(n)]
+    results = [fut.result() for fut in d]
+    assert results == [i*2 for i in range(n)], "Results mismatch : {0}".format(results)
+    print("Duration : {0}s".format(time.time() - start))
+
+
+def test_registry_hits (n=5):
+    ''' Testing an app's function is serialized once, not on every submit '''
+    registry = dfk.executors["Local_ZMQ"].registry
+    [double(i).result() for i in range(n)]
+    hits, misses = registry.hits, registry.misses
+    [double(i).result() for i in range(n)]
+    assert registry.misses == misses, "Function serialized again, misses {0} -> {1}".format(misses, registry.misses)
+    assert registry.hits == hits + n
+
+
+def test_dependencies ():
+    ''' Testing chained apps '''
+    x = double(double(double(1)))
+    assert x.result() == 8, "Expected 8, got {0}".format(x.result())
+
+
+def test_function_registry (n=30):
+    ''' Testing more functions than fit in the function caches '''
+    funcs = [double, triple, square]
+    d = [funcs[i % 3](i) for i in range(n)]
+    results = [fut.result() for fut in d]
+    expected = [[i*2, i*3, i*i][i % 3] for i in range(n)]
+    assert results == expected, "Results mismatch : {0}".format(results)
+
+
+def test_shared_buffers ():
+    ''' Testing large args passed through shared memory '''
+    blobs = [os.urandom(2*1024*1024 + i) for i in range(4)]
+    results = [checksum(blob).result() for blob in blobs]
+    assert results == [apps.checksum(blob) for blob in blobs], "Shared buffer results mismatch"
+
+    executor = list(dfk.executors.values())[0]
+    assert executor.shared.bytes_shared >= sum(len(blob) for blob in blobs), "Buffers were not shared"
+    assert os.listdir(executor.shared.directory) == [], "Shared buffers not released"
+
+
+def test_outstanding (n=20):
+    ''' Testing the executor counts outstanding tasks without asking the interchange '''
+    executor = dfk.executors["Local_ZMQ"]
+    d = [double(i) for i in range(n)]
+    [fut.result() for fut in d]
+    start = time.time()
+    while executor.outstanding and time.time() - start < 5:
+        time.sleep(0.05)
+    assert executor.outstanding == 0, "Expected no outstanding tasks, got {0}".format(executor.outstanding)
+    assert executor.queued == 0
+    assert executor.running == 0
+
+
+def test_running (n=2):
+    ''' Testing tasks handed to the workers are counted as running '''
+    executor = dfk.executors["Local_ZMQ"]
+    d = [sleep_pid(1) for i in range(n)]
+    start = time.time()
+    while executor.running < n and time.time() - start < 5:
+        time.sleep(0.01)
+    assert executor.running == n, "Expected {0} running, got {1}".format(n, executor.running)
+    [fut.result() for fut in d]
+    start = time.time()
+    while executor.running and time.time() - start < 5:
+        time.sleep(0.05)
+    assert executor.running == 0, "Expected none running, got {0}".format(executor.running)
+
+
+def test_exception ():
+    ''' Testing that remote exceptions come back on the future '''
+    x = fail(5)
+    try:
+        x.result()
+    except ValueError as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected ValueError"
+
+
+def test_walltime (n=4):
+    ''' Testing apps past their walltime fail and give their worker slots back '''
+    start = time.time()
+    hung = [timed_sleep(60) for i in range(n)]
+    x = double(21)
+    assert x.result() == 42
+    for fu in hung:
+        try:
+            fu.result()
+        except AppTimeout as e:
+            print("Caught expected exception : ", e)
+        else:
+            assert False, "Expected AppTimeout"
+    assert time.time() - start < 20, "Hung apps were not killed"
+
+    fu = timed_sleep(0)
+    assert fu.result() > 0
+    assert fu.usage['wall_time'] < 1
+    try:
+        timed_fail(5).result()
+    except ValueError as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected ValueError"
+
+
+def test_worker_lost ():
+    ''' Testing a task whose worker process dies fails, and the pool carries on '''
+    x = kill_worker(1)
+    try:
+        x.result(timeout=30)
+    except WorkerLost as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected WorkerLost"
+    d = [double(i) for i in range(10)]
+    assert [fut.result(timeout=30) for fut in d] == [i*2 for i in range(10)]
+
+
+class FakeWorker(object):
+    def __init__ (self, fn_cache_size):
+        self.functions = LRUCache(fn_cache_size)
+
+
+def test_worker_fn_cache ():
+    ''' Testing the manager sends a function to each worker only till it holds it '''
+    manager = Manager("tcp://127.0.0.1:1", fn_cache_size=2)
+    workers = [FakeWorker(2), FakeWorker(2)]
+    task = lambda fn: {'task_id' : 0, 'fn_hash' : fn, 'fn_buffer' : [fn.encode()], 'buffer' : []}
+
+    sent = [('fn_buffer' in manager.task_message(w, task('a'))) for i in range(3) for w in workers]
+    assert sent == [True, True, False, False, False, False], sent
+    assert manager.fn_buffers_sent == 2
+
+    # Evicted from the first worker's cache, so sent again
+    manager.task_message(workers[0], task('b'))
+    manager.task_message(workers[0], task('c'))
+    assert 'fn_buffer' in manager.task_message(workers[0], task('a'))
+    assert 'fn_buffer' not in manager.task_message(workers[1], task('a'))
+
+
+def test_worker_fn_cache_failed_args ():
+    ''' Testing a function comes into the worker cache even if its task's args fail '''
+    fn_hash, fn_buffer = FunctionRegistry(1024, 64).register(apps.double)
+    fn_cache = FunctionCache(2)
+    # A shared buffer already removed fails to map
+    gone = SharedBuffer('/nonexistent/parsl_shm/buffer', 10)
+    bad = {'task_id' : 0, 'fn_hash' : fn_hash, 'fn_buffer' : fn_buffer, 'buffer' : [gone]}
+    try:
+        execute_task(bad, fn_cache)
+    except Exception as e:
+        print("Caught expected exception : ", e)
+    else:
+        assert False, "Expected the args to fail"
+
+    good = {'task_id' : 1, 'fn_hash' : fn_hash, 'buffer' : pack_args([2], {}, 1024, 64)}
+    assert execute_task(good, fn_cache) == 4
+
+
+if __name__ == '__main__' :
+
+    parser   = argparse.ArgumentParser()
+    parser.add_argument("-c", "--count", default="100", help="Count of apps to launch")
+    parser.add_argument("-d", "--debug", action='store_true', help="Count of apps to launch")
+    args   = parser.parse_args()
+
+    if args.debug:
+        parsl.set_stream_logger()
+
+    test_simple()
+    test_parallel_for(int(args.count))
+    test_registry_hits()
+    test_dependencies()
+    test_function_registry()
+    test_shared_buffers()
+    test_outstanding()
+    test_running()
+    test_exception()
+    test_walltime()
+    test_worker_lost()
+    test_worker_fn_cache()
+    test_worker_fn_cache_failed_args()
@@ -3,7 +3,8 @@ from parsl.version import VERSION
 
 install_requires = [
     'ipyparallel',
-    'libsubmit>=0.2.5'
+    'libsubmit>=0.2.5',
+    'pyzmq'
     ]
 
 tests_require = [